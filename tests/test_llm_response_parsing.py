@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Тесты разбора ответов LLM: поля анализа темы (ТЕМА/СЛОЖНОСТЬ/АУДИТОРИЯ/СТИЛЬ)
+и пакетные ответы в маркерах <<<CHUNK k>>> ... <<<END k>>>.
+
+Запуск: python -m pytest tests/test_llm_response_parsing.py
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем путь к модулям проекта
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from text_processors import smart_text_processor, summary_processor, summary_processor_refactored
+
+
+TOPIC_ANSWER = """Вот анализ фрагмента.
+
+ТЕМА: Квантовая механика и её интерпретации
+  СЛОЖНОСТЬ: Высокая
+АУДИТОРИЯ: студенты физических факультетов
+СТИЛЬ: строгий, с примерами
+Комментарий: СТИЛЬ: не поле, метка не в начале строки
+"""
+
+
+@pytest.fixture
+def summary(monkeypatch, tmp_path):
+    """SummaryProcessor без дискового кэша, с фиктивным ключом API"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    return summary_processor.SummaryProcessor(use_cache=False)
+
+
+# === Анализ темы ===
+
+@pytest.mark.parametrize("module", [summary_processor, summary_processor_refactored])
+def test_topic_field_re_matches_only_labels_at_line_start(module):
+    labels = [m.group(1) for m in module._TOPIC_FIELD_RE.finditer(TOPIC_ANSWER)]
+    assert labels == ["ТЕМА", "СЛОЖНОСТЬ", "АУДИТОРИЯ", "СТИЛЬ"]
+    assert set(labels) == set(module._TOPIC_FIELDS)
+
+
+def test_parse_topic_analysis(summary):
+    context = summary.parse_topic_analysis(TOPIC_ANSWER)
+    assert context == {
+        'topic': 'Квантовая механика и её интерпретации',
+        'complexity': 'высокая',
+        'target_audience': 'студенты физических факультетов',
+        'style': 'строгий, с примерами',
+    }
+
+
+def test_parse_topic_analysis_keeps_defaults(summary):
+    """Неизвестная сложность и отсутствующие поля оставляют значения по умолчанию"""
+    context = summary.parse_topic_analysis("ТЕМА: Алгебра\nСЛОЖНОСТЬ: запредельная")
+    assert context == {**summary.get_default_context(), 'topic': 'Алгебра'}
+
+
+def test_refactored_parse_topic_analysis():
+    # Разбор не обращается к состоянию процессора: API-клиент для него не нужен
+    parse = summary_processor_refactored.SummaryProcessor._parse_topic_analysis
+    context = parse(None, TOPIC_ANSWER)
+    assert context.topic == 'Квантовая механика и её интерпретации'
+    assert context.complexity == 'высокая'
+    assert context.target_audience == 'студенты физических факультетов'
+    assert context.style == 'строгий, с примерами'
+
+    default = summary_processor_refactored.ContextInfo()
+    assert parse(None, "СЛОЖНОСТЬ: запредельная").complexity == default.complexity
+
+
+# === Пакетные ответы ===
+
+BATCH_ANSWER = """Готово.
+<<<CHUNK 2>>>
+Второй фрагмент.
+
+С абзацем.
+<<<END 2>>>
+<<<CHUNK 1>>>Первый<<<END 1>>>
+<<<CHUNK 3>>>Незакрытый, с чужим концом<<<END 4>>>
+<<<CHUNK 5>>>   <<<END 5>>>
+"""
+
+
+@pytest.mark.parametrize("module", [smart_text_processor, summary_processor])
+def test_batch_re_extracts_chunks(module):
+    parsed = {int(number): body.strip() for number, body in module._BATCH_RE.findall(BATCH_ANSWER)}
+    assert parsed == {
+        2: "Второй фрагмент.\n\nС абзацем.",
+        1: "Первый",
+        5: "",
+    }
+
+
+@pytest.mark.parametrize("module", [smart_text_processor, summary_processor])
+def test_batch_re_does_not_cross_chunks(module):
+    """Тело части не захватывает соседние части, даже если номера идут не по порядку"""
+    answer = "<<<CHUNK 1>>>а<<<END 1>>><<<CHUNK 10>>>б<<<END 10>>>"
+    assert module._BATCH_RE.findall(answer) == [("1", "а"), ("10", "б")]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Тесты потокового разбиения текста на части: результат должен совпадать
+с разбиением всего текста целиком при любой нарезке входа на куски.
+
+Запуск: python -m pytest tests/test_text_chunking.py
+"""
+
+import re
+import sys
+from pathlib import Path
+
+# Добавляем путь к модулям проекта
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.text_splitter import _iter_split, iter_text_chunks, split_text_into_chunks
+from text_processors.text_processor import TextProcessor
+from text_processors.smart_text_processor import iter_split
+
+
+SAMPLE_TEXT = "\n\n".join(
+    f"Абзац {i}. " + " ".join(f"слово{i}_{k}" for k in range(i * 7 % 40 + 1))
+    for i in range(60)
+) + "\n\n\n\nХвост с одиночным\nпереносом.\n\n"
+
+
+def _pieces(text: str, size: int):
+    """Режет текст на куски фиксированной длины, как f.read(size)"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _reference_chunks(text: str, max_chunk_size: int):
+    """Исходный алгоритм text_processor: весь текст в памяти и text.split('\\n\\n')"""
+    chunks = []
+    current_chunk = ""
+    for paragraph in text.split('\n\n'):
+        if len(current_chunk) + len(paragraph) > max_chunk_size and current_chunk:
+            chunks.append(current_chunk.strip())
+            current_chunk = paragraph
+        else:
+            current_chunk = current_chunk + "\n\n" + paragraph if current_chunk else paragraph
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def _text_processor():
+    return TextProcessor("test-key", use_cache=False)
+
+
+# === text_processor: _iter_paragraphs / iter_chunks ===
+
+def test_iter_paragraphs_matches_split_for_any_block_size():
+    """Абзацы совпадают с text.split('\\n\\n'), даже если разделитель попал на границу кусков"""
+    for size in (1, 2, 3, 7, 64, len(SAMPLE_TEXT)):
+        assert list(TextProcessor._iter_paragraphs(_pieces(SAMPLE_TEXT, size))) == SAMPLE_TEXT.split('\n\n')
+
+
+def test_iter_paragraphs_edge_cases():
+    for text in ("", "\n", "\n\n", "\n\n\n", "а\n\nб", "\n\nа\n\n"):
+        assert list(TextProcessor._iter_paragraphs(_pieces(text, 1) or [""])) == text.split('\n\n')
+
+
+def test_iter_chunks_matches_whole_text_split():
+    processor = _text_processor()
+    try:
+        for max_chunk_size in (50, 300, 3000):
+            expected = _reference_chunks(SAMPLE_TEXT, max_chunk_size)
+            assert processor.split_text_into_chunks(SAMPLE_TEXT, max_chunk_size) == expected
+            for size in (1, 5, 1000):
+                assert list(processor.iter_chunks(_pieces(SAMPLE_TEXT, size), max_chunk_size)) == expected
+    finally:
+        processor.close()
+
+
+def test_iter_chunks_reads_file_lines(tmp_path):
+    """Открытый файл тоже подходит как источник кусков"""
+    path = tmp_path / "book.txt"
+    path.write_text(SAMPLE_TEXT, encoding="utf-8")
+    processor = _text_processor()
+    try:
+        with open(path, encoding="utf-8") as f:
+            assert list(processor.iter_chunks(f, 300)) == _reference_chunks(SAMPLE_TEXT, 300)
+    finally:
+        processor.close()
+
+
+# === utils.text_splitter: _iter_split / iter_text_chunks ===
+
+def test_iter_split_matches_re_split():
+    for pattern in (r'\n\s*\n', r'(?<=[.!?])\s+', r'(\n\n)', r'x*'):
+        for text in (SAMPLE_TEXT, "", "без разделителей", "\n\n\n"):
+            assert list(_iter_split(pattern, text)) == re.split(pattern, text)
+
+
+def test_iter_text_chunks_is_lazy_and_matches_list():
+    chunks = split_text_into_chunks(SAMPLE_TEXT, max_chars=400)
+    assert list(iter_text_chunks(SAMPLE_TEXT, max_chars=400)) == chunks
+    assert next(iter_text_chunks(SAMPLE_TEXT, max_chars=400)) == chunks[0]
+
+
+def test_iter_text_chunks_respects_max_chars():
+    for chunk in iter_text_chunks(SAMPLE_TEXT, max_chars=200):
+        assert len(chunk) <= 200
+    # Длинные абзацы режутся по предложениям, но ни одно слово не теряется
+    words = sorted(re.findall(r'\S+', SAMPLE_TEXT))
+    assert sorted(re.findall(r'\S+', " ".join(iter_text_chunks(SAMPLE_TEXT, max_chars=200)))) == words
+
+
+# === smart_text_processor: iter_split ===
+
+def test_smart_iter_split_matches_str_split():
+    for sep in ("\n\n", "\n", "ab"):
+        for text in (SAMPLE_TEXT, "", sep, "ab" * 5 + "a"):
+            for size in (1, 2, 3, 100):
+                assert list(iter_split(_pieces(text, size), sep)) == text.split(sep)
@@ -6,13 +6,28 @@
 
 import pdfplumber
 import argparse
+import logging
 import sys
 import os
-import re
 from pathlib import Path
 from datetime import datetime
 
 
+logger = logging.getLogger(__name__)
+
+
+def _normalize_text(text):
+    """
+    Схлопывает все пробельные символы в одиночные пробелы за один проход.
+    
+    Returns:
+        (текст, количество символов, количество слов)
+    """
+    words = text.split()
+    normalized = ' '.join(words)
+    return normalized, len(normalized), len(words)
+
+
 class PDFTextExtractor:
     def __init__(self, pdf_path):
         self.pdf_path = pdf_path
@@ -43,47 +58,56 @@ class PDFTextExtractor:
         if not text:
             return ""
         
-        # Удаляем лишние пробелы и переносы строк
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        
-        # Удаляем лишние пробелы в начале и конце
-        text = text.strip()
-        
-        return text
+        # Удаляем лишние пробелы и переносы строк, а также пробелы в начале и конце
+        return _normalize_text(text)[0]
     
-    def extract_page_text(self, page_num):
-        """Извлекает текст с конкретной страницы"""
+    def _read_page(self, page_num):
+        """
+        Извлекает и очищает текст страницы, не трогая статистику
+        
+        Returns:
+            (текст или None, количество символов, количество слов)
+        """
         try:
             page = self.pdf.pages[page_num]
             page_text = page.extract_text()
-            
-            if page_text:
-                cleaned_text = self.clean_text(page_text)
-                if cleaned_text:
-                    self.stats['pages_with_text'] += 1
-                    self.stats['total_characters'] += len(cleaned_text)
-                    self.stats['total_words'] += len(cleaned_text.split())
-                    return cleaned_text
-                else:
-                    self.stats['pages_without_text'] += 1
-                    return None
-            else:
-                self.stats['pages_without_text'] += 1
-                return None
-                
+            # Сбрасываем кэш разметки страницы, иначе pdfplumber держит
+            # объекты всех пройденных страниц до закрытия PDF
+            page.flush_cache()
+            del page
         except Exception as e:
             print(f"✗ Ошибка при обработке страницы {page_num + 1}: {e}")
+            return None, 0, 0
+        
+        if not page_text:
+            return None, 0, 0
+        
+        cleaned_text, char_count, word_count = _normalize_text(page_text)
+        if not cleaned_text:
+            return None, 0, 0
+        return cleaned_text, char_count, word_count
+    
+    def _add_page_stats(self, processed, with_text, characters, words):
+        """Переносит накопленные в цикле счетчики в self.stats"""
+        self.stats['processed_pages'] += processed
+        self.stats['pages_with_text'] += with_text
+        self.stats['pages_without_text'] += processed - with_text
+        self.stats['total_characters'] += characters
+        self.stats['total_words'] += words
+    
+    def extract_page_text(self, page_num):
+        """Извлекает текст с конкретной страницы"""
+        page_text, char_count, word_count = self._read_page(page_num)
+        if page_text:
+            self.stats['pages_with_text'] += 1
+            self.stats['total_characters'] += char_count
+            self.stats['total_words'] += word_count
+        else:
             self.stats['pages_without_text'] += 1
-            return None
+        return page_text
     
-    def extract_text_range(self, start_page=None, end_page=None, include_page_numbers=True):
-        """Извлекает текст из диапазона страниц"""
-        if not self.pdf:
-            print("✗ PDF файл не открыт")
-            return None
-        
-        # Определяем диапазон страниц
+    def _page_range(self, start_page=None, end_page=None):
+        """Возвращает диапазон индексов страниц (с 0, конец не включается)"""
         if start_page is None:
             start_page = 1
         if end_page is None:
@@ -92,31 +116,66 @@ class PDFTextExtractor:
         # Корректируем номера страниц (индексация с 0)
         start_idx = max(0, start_page - 1)
         end_idx = min(self.stats['total_pages'], end_page)
+        return start_idx, end_idx
+    
+    def compute_stats(self, start_page=None, end_page=None):
+        """Собирает статистику по диапазону страниц, не формируя выходной текст"""
+        if not self.pdf:
+            print("✗ PDF файл не открыт")
+            return False
+        
+        start_idx, end_idx = self._page_range(start_page, end_page)
+        print(f"📊 Подсчет статистики по страницам {start_idx + 1}–{end_idx}")
+        
+        with_text = characters = words = 0
+        read_page = self._read_page
+        for page_num in range(start_idx, end_idx):
+            page_text, char_count, word_count = read_page(page_num)
+            if page_text:
+                with_text += 1
+                characters += char_count
+                words += word_count
+        
+        self._add_page_stats(end_idx - start_idx, with_text, characters, words)
+        return True
+    
+    def extract_text_range(self, start_page=None, end_page=None, include_page_numbers=True):
+        """Извлекает текст из диапазона страниц"""
+        if not self.pdf:
+            print("✗ PDF файл не открыт")
+            return None
         
-        print(f"📖 Извлекаем текст со страниц {start_page} по {end_idx}")
+        start_idx, end_idx = self._page_range(start_page, end_page)
+        
+        print(f"📖 Извлекаем текст со страниц {start_idx + 1} по {end_idx}")
         print("=" * 50)
         
         extracted_pages = []
+        # Счетчики копятся в локальных переменных и переносятся в self.stats один раз
+        with_text = characters = words = 0
+        read_page = self._read_page
         
         for page_num in range(start_idx, end_idx):
-            self.stats['processed_pages'] += 1
-            
-            page_text = self.extract_page_text(page_num)
+            page_text, char_count, word_count = read_page(page_num)
             
             if page_text:
+                with_text += 1
+                characters += char_count
+                words += word_count
                 if include_page_numbers:
                     page_content = f"\n{'='*20} СТРАНИЦА {page_num + 1} {'='*20}\n\n{page_text}\n"
                 else:
                     page_content = page_text + "\n\n"
                 
                 extracted_pages.append(page_content)
-                print(f"✓ Страница {page_num + 1}: {len(page_text)} символов")
+                logger.info("✓ Страница %d: %d символов", page_num + 1, char_count)
             else:
                 if include_page_numbers:
                     page_content = f"\n{'='*20} СТРАНИЦА {page_num + 1} {'='*20}\n\n[Текст не найден]\n"
                     extracted_pages.append(page_content)
-                print(f"⚠ Страница {page_num + 1}: текст не найден")
+                logger.info("⚠ Страница %d: текст не найден", page_num + 1)
         
+        self._add_page_stats(end_idx - start_idx, with_text, characters, words)
         return "\n".join(extracted_pages)
     
     def save_text(self, text, output_path):
@@ -162,6 +221,7 @@ def main():
   python pdf_text_extractor_advanced.py input.pdf -o output.txt
   python pdf_text_extractor_advanced.py input.pdf -s 1 -e 10 -o output.txt
   python pdf_text_extractor_advanced.py input.pdf --no-page-numbers -o clean.txt
+  python pdf_text_extractor_advanced.py input.pdf -v -o output.txt
         """
     )
     
@@ -173,9 +233,14 @@ def main():
                        help='Не добавлять номера страниц в вывод')
     parser.add_argument('--stats-only', action='store_true',
                        help='Показать только статистику без извлечения текста')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                       help='Выводить результат по каждой странице')
     
     args = parser.parse_args()
     
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(message)s')
+    
     # Проверяем существование файла
     if not os.path.exists(args.pdf_file):
         print(f"✗ Ошибка: Файл {args.pdf_file} не найден")
@@ -190,8 +255,8 @@ def main():
     
     # Если нужна только статистика
     if args.stats_only:
-        # Обрабатываем все страницы для статистики
-        extractor.extract_text_range()
+        # Проходим страницы только ради счетчиков, без сборки текста
+        extractor.compute_stats(args.start_page, args.end_page)
         extractor.print_statistics()
         extractor.close()
         return
@@ -11,19 +11,119 @@
 import os
 import sys
 import argparse
-import time
-import json
+import io
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
+# Корень проекта в sys.path для импорта utils при запуске скрипта напрямую
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils.fast_json import json_dumps, json_loads
+from utils.text_files import read_text_prefix
+from utils.response_cache import CACHEABLE_FINISH_REASON, ResponseCache, response_cache_key
+
+
+# === ЛОГИКА ДЛЯ PIKABU ===
+_PIKABU_TMPL = """
+Ты — популярный автор на Pikabu (или Habr), который пишет увлекательные образовательные статьи и истории о решении задач.
+Твоя задача: Написать пост-лонгрид на основе предоставленного материала.
+
+ПАРАМЕТРЫ:
+- Язык: {lang}
+- Платформа: Пикабу (Pikabu)
+- Аудитория: {audience} (люди, любящие научпоп, IT, математику, студенты, гики)
+- Тональность: {tone} (используй юмор, иронию, живой язык, избегай канцеляризмов).
+
+СТРУКТУРА ПОСТА:
+1. **Заголовок**: Кликбейтный, но честный. Смешной или интригующий.
+2. **Введение (Лид)**: Опиши "боль" или проблему. Как автор столкнулся с этой задачей? Почему это сложно/интересно? Используй "Я-повествование".
+3. **Основная часть**:
+   - Краткое объяснение сути задачи (без перегруза формулами, "на пальцах").
+   - Как мы это визуализировали (упомяни, что это сделано с помощью Manim/Python, если есть в контексте).
+   - Интересные моменты решения, "подводные камни".
+4. **Заключение**: Чему мы научились? Ироничный вывод.
+5. **Призыв**: Ненавязчиво предложи посмотреть полное видео (оставь плейсхолдер [ССЫЛКА НА ВИДЕО]).
+
+ФОРМАТИРОВАНИЕ:
+- Используй Markdown (жирный шрифт, цитаты).
+- Разбивай текст на короткие абзацы.
+- Добавь места для картинок (например: [КАРТИНКА: график функции]).
+
+{title_line}
+
+КОНТЕКСТ (Материалы урока/видео):
+{context}
+
+ТЕКСТ СТАТЬИ:
+""".strip()
+
+# === СТАНДАРТНАЯ ЛОГИКА (YouTube/Rutube) ===
+_STD_TMPL = """
+Ты — опытный маркетолог и редактор видеоописаний. На основе предоставленного контекста создай сильное, цепляющее промо-описание для видео.
+
+ТРЕБОВАНИЯ:
+- Язык: {lang}
+- Платформа: {platform} (учитывай лучшие практики оформления)
+- Аудитория: {audience}
+- Тональность: {tone}
+- Длина: около 3000-5000 символов
+- Структура:
+  1) Короткий hook (1–2 предложения) — раскрывает интригу/ценность
+  2) Основные преимущества/темы выпуска — 3–6 строк кратко и по делу
+  3) Призыв к действию: подписка/лайк/комментарий
+  4) Хэштеги в строку, разделенные через пробел и начинающиеся с # (5–10, уместные и несложные)
+- Не используй сложный маркдаун (только базовый). Пиши естественно.
+- Избегай клише и воды. Максимум конкретики.
+
+{title_line}
+
+КОНТЕКСТ:
+{context}
+
+ОПИСАНИЕ:
+""".strip()
+
+
+# Шаблоны по платформам; все, что не перечислено, использует стандартный шаблон
+_PROMPT_TEMPLATES = {
+    "pikabu": _PIKABU_TMPL,
+    "youtube": _STD_TMPL,
+    "rutube": _STD_TMPL,
+}
+
+
+@lru_cache(maxsize=32)
+def _prompt_skeleton(tmpl: str, title_line: str, audience: str, tone: str,
+                     platform: str, lang: str) -> Tuple[str, str]:
+    """Заполняет шаблон всем, кроме контекста, и возвращает части до и после {context}"""
+    filled = tmpl.format_map({
+        "title_line": title_line,
+        "audience": audience,
+        "tone": tone,
+        "platform": platform,
+        "lang": lang,
+        "context": "\0",
+    })
+    head, tail = filled.split("\0", 1)
+    return head, tail
+
 
 class PromoDescriptionProcessor:
-    def __init__(self, config_file: str = None):
+    def __init__(self, config_file: str = None, use_cache: bool = True):
         """Инициализация процессора с загрузкой конфигурации"""
         self.load_config(config_file)
+        # Кэш ответов общий с другими процессорами (см. utils.response_cache). Промо-тексты
+        # генерируются с креативной температурой, при которой кэш выключен; он работает,
+        # только если DEFAULT_TEMPERATURE не выше CACHE_MAX_TEMPERATURE
+        self.cache = None
+        if use_cache:
+            self.cache = ResponseCache.open(ResponseCache.path_from_env(), self.temperature)
         if not self.api_key:
             raise ValueError("API ключ OpenRouter не найден в конфигурации")
 
@@ -35,6 +135,20 @@ class PromoDescriptionProcessor:
             "X-Title": "Promo Description Processor"
         }
 
+        # Одна сессия на процессор: TLS-соединение с OpenRouter переиспользуется между запросами.
+        # Повторы на 429/5xx выполняет urllib3 с учетом заголовка Retry-After.
+        retry = Retry(
+            total=3,
+            backoff_factor=1,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+
     def load_config(self, config_file: str = None):
         """Загружает конфигурацию из .env файла"""
         if config_file and Path(config_file).exists():
@@ -72,89 +186,33 @@ class PromoDescriptionProcessor:
 
     def build_context(self, files: List[Path]) -> str:
         """Собирает контекст из содержимого файлов"""
-        parts: List[str] = []
+        buf = io.StringIO()
         total = 0
         for fp in files:
+            header = f"\n===== ФАЙЛ: {fp.name} =====\n"
             try:
-                text = fp.read_text(encoding="utf-8", errors="ignore")
+                text = read_text_prefix(fp, self.max_context_chars - total - len(header))
             except Exception:
                 continue
-            header = f"\n===== ФАЙЛ: {fp.name} =====\n"
-            chunk = header + text.strip() + "\n"
-            if total + len(chunk) > self.max_context_chars:
+            chunk_len = len(header) + len(text) + 1
+            if total + chunk_len > self.max_context_chars:
                 remaining = max(self.max_context_chars - total, 0)
                 if remaining > 0:
-                    parts.append(chunk[:remaining])
+                    buf.write((header + text + "\n")[:remaining])
                     total += remaining
                 break
-            parts.append(chunk)
-            total += len(chunk)
-        return "".join(parts).strip()
+            buf.write(header)
+            buf.write(text)
+            buf.write("\n")
+            total += chunk_len
+        return buf.getvalue().strip()
 
     def create_prompt(self, context: str, title: Optional[str], audience: str, tone: str, platform: str, lang: str) -> str:
         """Создает промпт для генерации контента в зависимости от платформы"""
         title_line = f"Название/тема: {title}" if title else "Название/тема: (определи по контексту)"
-
-        # === ЛОГИКА ДЛЯ PIKABU ===
-        if platform.lower() == "pikabu":
-            return f"""
-Ты — популярный автор на Pikabu (или Habr), который пишет увлекательные образовательные статьи и истории о решении задач.
-Твоя задача: Написать пост-лонгрид на основе предоставленного материала.
-
-ПАРАМЕТРЫ:
-- Язык: {lang}
-- Платформа: Пикабу (Pikabu)
-- Аудитория: {audience} (люди, любящие научпоп, IT, математику, студенты, гики)
-- Тональность: {tone} (используй юмор, иронию, живой язык, избегай канцеляризмов).
-
-СТРУКТУРА ПОСТА:
-1. **Заголовок**: Кликбейтный, но честный. Смешной или интригующий.
-2. **Введение (Лид)**: Опиши "боль" или проблему. Как автор столкнулся с этой задачей? Почему это сложно/интересно? Используй "Я-повествование".
-3. **Основная часть**:
-   - Краткое объяснение сути задачи (без перегруза формулами, "на пальцах").
-   - Как мы это визуализировали (упомяни, что это сделано с помощью Manim/Python, если есть в контексте).
-   - Интересные моменты решения, "подводные камни".
-4. **Заключение**: Чему мы научились? Ироничный вывод.
-5. **Призыв**: Ненавязчиво предложи посмотреть полное видео (оставь плейсхолдер [ССЫЛКА НА ВИДЕО]).
-
-ФОРМАТИРОВАНИЕ:
-- Используй Markdown (жирный шрифт, цитаты).
-- Разбивай текст на короткие абзацы.
-- Добавь места для картинок (например: [КАРТИНКА: график функции]).
-
-{title_line}
-
-КОНТЕКСТ (Материалы урока/видео):
-{context}
-
-ТЕКСТ СТАТЬИ:
-""".strip()
-
-        # === СТАНДАРТНАЯ ЛОГИКА (YouTube/Rutube) ===
-        return f"""
-Ты — опытный маркетолог и редактор видеоописаний. На основе предоставленного контекста создай сильное, цепляющее промо-описание для видео.
-
-ТРЕБОВАНИЯ:
-- Язык: {lang}
-- Платформа: {platform} (учитывай лучшие практики оформления)
-- Аудитория: {audience}
-- Тональность: {tone}
-- Длина: около 3000-5000 символов
-- Структура:
-  1) Короткий hook (1–2 предложения) — раскрывает интригу/ценность
-  2) Основные преимущества/темы выпуска — 3–6 строк кратко и по делу
-  3) Призыв к действию: подписка/лайк/комментарий
-  4) Хэштеги в строку, разделенные через пробел и начинающиеся с # (5–10, уместные и несложные)
-- Не используй сложный маркдаун (только базовый). Пиши естественно.
-- Избегай клише и воды. Максимум конкретики.
-
-{title_line}
-
-КОНТЕКСТ:
-{context}
-
-ОПИСАНИЕ:
-""".strip()
+        tmpl = _PROMPT_TEMPLATES.get(platform.casefold(), _STD_TMPL)
+        head, tail = _prompt_skeleton(tmpl, title_line, audience, tone, platform, lang)
+        return head + context + tail
 
     def generate_description(self, context: str, model_choice: str = "default") -> Optional[str]:
         """Отправляет запрос к LLM и возвращает сгенерированное описание"""
@@ -165,7 +223,14 @@ class PromoDescriptionProcessor:
             model = self.quality_model
 
         print(f"🔍 Используемая модель: {model}")
-        
+
+        cache_key = response_cache_key(model, self.temperature, context)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("💾 Ответ взят из кэша")
+                return cached
+
         payload = {
             "model": model,
             "messages": [
@@ -175,26 +240,42 @@ class PromoDescriptionProcessor:
             "max_tokens": self.max_tokens
         }
 
-        for attempt in range(3):
-            try:
-                resp = requests.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=120
-                )
-                if resp.status_code == 200:
-                    data = resp.json()
-                    return data["choices"][0]["message"]["content"].strip()
-                else:
-                    if resp.status_code == 429:
-                        time.sleep(2 ** (attempt + 1))
-                    elif attempt < 2:
-                        time.sleep(2 ** attempt)
-            except Exception:
-                if attempt < 2:
-                    time.sleep(2 ** attempt)
-        return None
+        try:
+            resp = self.session.post(
+                f"{self.base_url}/chat/completions",
+                data=json_dumps(payload),
+                timeout=120
+            )
+        except requests.RequestException as e:
+            print(f"⚠️ Ошибка запроса к API: {e}")
+            return None
+
+        if resp.status_code != 200:
+            print(f"⚠️ Ошибка API {resp.status_code}: {resp.text[:200]}")
+            return None
+
+        try:
+            data = json_loads(resp.content)
+            choice = data["choices"][0]
+            description = choice["message"]["content"].strip()
+        except (ValueError, KeyError, IndexError) as e:
+            print(f"⚠️ Некорректный ответ API: {e}")
+            return None
+
+        # Кэшируются только ответы, которые модель закончила сама, а не обрезала по max_tokens
+        if description and self.cache is not None \
+                and choice.get("finish_reason") == CACHEABLE_FINISH_REASON:
+            self.cache.put(cache_key, model, description)
+        return description
+
+    def generate_for_platforms(self, context: str, title: Optional[str], audience: str, tone: str,
+                               platforms: List[str], lang: str,
+                               model_choice: str = "default") -> Dict[str, Optional[str]]:
+        """Параллельно генерирует контент для нескольких платформ по одному контексту"""
+        prompts = [self.create_prompt(context, title, audience, tone, platform, lang) for platform in platforms]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = executor.map(lambda prompt: self.generate_description(prompt, model_choice), prompts)
+            return dict(zip(platforms, results))
 
     def process_pipeline(self, pipeline_dir: str, output_file: Optional[str], prefix: Optional[str],
                           audience: str, tone: str, platform: str, lang: str,
@@ -222,6 +303,11 @@ class PromoDescriptionProcessor:
         context = self.build_context(txt_files)
         print(f"📊 Размер контекста: {len(context)} символов")
 
+        platforms = [p.strip() for p in platform.split(",") if p.strip()]
+        if len(platforms) > 1:
+            return self._process_platforms(context, pdir, output_file, audience, tone,
+                                           platforms, lang, model_choice, title)
+
         prompt = self.create_prompt(context, title, audience, tone, platform, lang)
         description = self.generate_description(prompt, model_choice)
         if not description:
@@ -237,6 +323,27 @@ class PromoDescriptionProcessor:
         print(f"✅ Результат сохранен: {output_path}")
         return True, output_path
 
+    def _process_platforms(self, context: str, pdir: Path, output_file: Optional[str],
+                           audience: str, tone: str, platforms: List[str], lang: str,
+                           model_choice: str, title: Optional[str]) -> Tuple[bool, Optional[Path]]:
+        """Генерирует контент сразу для нескольких платформ, каждый результат в свой файл"""
+        print(f"🚀 Параллельная генерация для платформ: {', '.join(platforms)}")
+        results = self.generate_for_platforms(context, title, audience, tone, platforms, lang, model_choice)
+
+        base_path = Path(output_file) if output_file else pdir / "promo_description.txt"
+        first_path = None
+        ok = True
+        for platform, description in results.items():
+            if not description:
+                print(f"❌ Ошибка генерации контента для платформы {platform}")
+                ok = False
+                continue
+            output_path = base_path.with_name(f"{base_path.stem}_{platform.lower()}{base_path.suffix}")
+            output_path.write_text(description, encoding="utf-8")
+            print(f"✅ Результат для {platform} сохранен: {output_path}")
+            first_path = first_path or output_path
+        return ok, first_path
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -251,15 +358,16 @@ def main():
     parser.add_argument("--model", choices=["default", "budget", "quality"], default="default", help="Выбор модели")
     parser.add_argument("--audience", default="широкая аудитория", help="Описание аудитории")
     parser.add_argument("--tone", default="дружелюбный и информативный", help="Тональность текста")
-    parser.add_argument("--platform", default="YouTube", help="Платформа (YouTube, Pikabu, VK...)")
+    parser.add_argument("--platform", default="YouTube", help="Платформа (YouTube, Pikabu, VK...); несколько через запятую генерируются параллельно")
     parser.add_argument("--lang", default="русский", help="Язык результата")
     parser.add_argument("--title", help="Название/тема видео")
     parser.add_argument("--source-file", help="Путь к конкретному исходному файлу (например, script.txt)")
+    parser.add_argument("--no-cache", action="store_true", help="Не использовать дисковый кэш ответов LLM")
 
     args = parser.parse_args()
 
     try:
-        processor = PromoDescriptionProcessor(args.config)
+        processor = PromoDescriptionProcessor(args.config, use_cache=not args.no_cache)
         ok, out = processor.process_pipeline(
             pipeline_dir=args.pipeline_dir,
             output_file=args.output,
@@ -11,104 +11,34 @@
 import os
 import sys
 import argparse
-import time
-import json
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 
-import requests
-from dotenv import load_dotenv
+# Корень проекта в sys.path для импорта utils при запуске скрипта напрямую
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils.llm_session import LLMSessionProcessor
+from utils.text_files import read_text_prefix
 
 
-class PromoExperimentalProcessor:
-    def __init__(self, config_file: str = None):
-        """Инициализация экспериментального процессора с загрузкой конфигурации"""
-        self.load_config(config_file)
-        if not self.api_key:
-            raise ValueError("API ключ OpenRouter не найден в конфигурации")
-
-        self.base_url = "https://openrouter.ai/api/v1"
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://github.com/your-repo/promo-experimental-processor",
-            "X-Title": "Promo Experimental Processor"
-        }
+# Сколько файлов контекста читать одновременно
+READ_WORKERS = 8
+# Сколько собранных контекстов держать в памяти (разные каталоги/префиксы)
+CONTEXT_CACHE_SIZE = 8
 
-    def load_config(self, config_file: str = None):
-        """Загружает конфигурацию из .env файла"""
-        if config_file and Path(config_file).exists():
-            load_dotenv(config_file)
-        else:
-            for env_file in [".env", "config.env", "settings.env"]:
-                if Path(env_file).exists():
-                    load_dotenv(env_file)
-                    break
-
-        self.api_key = os.getenv("OPENROUTER_API_KEY")
-        self.model = os.getenv("DEFAULT_MODEL", "anthropic/claude-3.5-sonnet")
-        self.temperature = float(os.getenv("DEFAULT_TEMPERATURE", "0.7")) # Чуть выше для креатива
-        self.max_tokens = int(os.getenv("DEFAULT_MAX_TOKENS", "3000"))
-        self.budget_model = os.getenv("BUDGET_MODEL", "meta-llama/llama-3.1-8b-instruct")
-        self.quality_model = os.getenv("QUALITY_MODEL", "openai/gpt-4o")
-        self.max_context_chars = int(os.getenv("PROMO_MAX_CONTEXT_CHARS", "15000"))
 
-    def find_text_files(self, pipeline_dir: Path, prefix: Optional[str]) -> List[Path]:
-        """Возвращает список .txt файлов из каталога пайплайна с учетом префикса."""
-        if not pipeline_dir.exists() or not pipeline_dir.is_dir():
-            raise FileNotFoundError(f"Каталог пайплайна не найден: {pipeline_dir}")
-
-        txt_files = [p for p in sorted(pipeline_dir.glob("*.txt"))]
-        if prefix:
-            def _matches_prefix(path: Path) -> bool:
-                stem = path.stem
-                if "_" not in stem:
-                    return False
-                last_token = stem.split("_")[-1]
-                return last_token == prefix
+EXPERIMENT_TYPES = ["creative", "poetry_promo", "song_pikabu", "storytelling", "conversational", "technical"]
 
-            txt_files = [p for p in txt_files if _matches_prefix(p)]
-        return txt_files
-
-    def build_context(self, files: List[Path]) -> str:
-        """Собирает контекст из содержимого файлов"""
-        parts: List[str] = []
-        total = 0
-        for fp in files:
-            try:
-                text = fp.read_text(encoding="utf-8", errors="ignore")
-            except Exception:
-                continue
-            header = f"\n===== ФАЙЛ: {fp.name} =====\n"
-            chunk = header + text.strip() + "\n"
-            if total + len(chunk) > self.max_context_chars:
-                remaining = max(self.max_context_chars - total, 0)
-                if remaining > 0:
-                    parts.append(chunk[:remaining])
-                    total += remaining
-                break
-            parts.append(chunk)
-            total += len(chunk)
-        return "".join(parts).strip()
-
-    def create_prompt(self, context: str, experiment_type: str) -> str:
-        """Создает экспериментальный промпт без параметров, в зависимости от типа эксперимента"""
-        if experiment_type == "creative":
-            return f"""
-Вот контекст из образовательного видео/урока:
-
-{context}
-
-Теперь создай креативное промо-описание для этого контента. Не используй шаблоны и параметры, просто напиши увлекательный текст, который заинтересует аудиторию. Сделай это в творческом, нетривиальном стиле.
-"""
-        elif experiment_type == "song_pikabu":
-            return f"""
-На основе текста песни:
-
-{context}
-
-Напиши краткое, искреннее промо-описание для Pikabu на основе моего видео. В нем песня созданная по моему видео-уроку.
+# Шаблоны экспериментальных промптов: тип -> (system-инструкции, подпись перед контекстом)
+_TEMPLATES: Dict[str, Tuple[str, str]] = {
+    "creative": (
+        "Создай креативное промо-описание для этого контента. Не используй шаблоны и параметры, просто напиши увлекательный текст, который заинтересует аудиторию. Сделай это в творческом, нетривиальном стиле.",
+        "Вот контекст из образовательного видео/урока:\n\n",
+    ),
+    "song_pikabu": (
+        """Напиши краткое, искреннее промо-описание для Pikabu на основе моего видео. В нем песня созданная по моему видео-уроку.
 
 Стиль: лаконичный, без пафоса, без клише вроде «вы в шоке!», «никто не ожидал!».
 Тональность: спокойная, немного рефлексивная, с долей самоиронии, но без излишней скромности.
@@ -121,17 +51,11 @@ class PromoExperimentalProcessor:
 
 Не рекламируй напрямую. Лучше расскажи, как будто другу, зачем ты этим занялся и что в этом оказалось неожиданно полезным или красивым.
 
-Для Pikabu — до 1500 символов, можно включить текст стихов ниже как цитату.
-
-"""
-        elif experiment_type == "poetry_promo":
-            return f"""
-Ты — опытный маркетолог и редактор видеоописаний. На основе предоставленного контекста создай сильное, цепляющее промо-описание для видео.
-
-Вот стихи песни по которой создано видео:
-
-{context}
----
+Для Pikabu — до 1500 символов, можно включить текст стихов ниже как цитату.""",
+        "На основе текста песни:\n\n",
+    ),
+    "poetry_promo": (
+        """Ты — опытный маркетолог и редактор видеоописаний. На основе предоставленного контекста создай сильное, цепляющее промо-описание для видео.
 
 ТРЕБОВАНИЯ:
 - Структура:
@@ -140,80 +64,151 @@ class PromoExperimentalProcessor:
   3) Призыв к действию: подписка/лайк/комментарий
   4) Хэштеги в строку, разделенные через пробел и начинающиеся с # (5–10, уместные и несложные)
 - Не используй маркдаун. Пиши естественно.
-- Избегай клише и воды. Максимум конкретики.
-"""
-        elif experiment_type == "storytelling":
-            return f"""
-Вот материалы урока/видео:
-
-{context}
+- Избегай клише и воды. Максимум конкретики.""",
+        "Вот стихи песни по которой создано видео:\n\n",
+    ),
+    "storytelling": (
+        "Преврати материалы урока/видео в увлекательную историю. Расскажи так, как будто это личный опыт или интересная история. Не используй формальные параметры, просто создай захватывающий повествовательный текст.",
+        "Вот материалы урока/видео:\n\n",
+    ),
+    "conversational": (
+        "Напиши промо-описание в разговорном стиле, как если бы ты объяснял это другу. Без формальных параметров, просто естественно и дружелюбно.",
+        "Контекст:\n\n",
+    ),
+    "technical": (
+        "Создай технически точное промо-описание. Сосредоточься на сути и ключевых моментах. Без параметров, но с акцентом на техническую точность.",
+        "Материалы:\n\n",
+    ),
+    "default": (
+        "Создай промо-описание для этого контента. Просто естественный, увлекательный текст.",
+        "Контекст:\n\n",
+    ),
+}
+
+
+class PromoExperimentalProcessor(LLMSessionProcessor):
+    HTTP_REFERER = "https://github.com/your-repo/promo-experimental-processor"
+    X_TITLE = "Promo Experimental Processor"
+    DEFAULT_TEMPERATURE = "0.7"  # Чуть выше для креатива
+    DEFAULT_MAX_TOKENS = "3000"
 
-Преврати это в увлекательную историю. Расскажи так, как будто это личный опыт или интересная история. Не используй формальные параметры, просто создай захватывающий повествовательный текст.
-"""
-        elif experiment_type == "conversational":
-            return f"""
-Контекст:
+    def __init__(self, config_file: str = None):
+        super().__init__(config_file)
+        self._context_lock = threading.Lock()
+        self._context_cache: Dict[tuple, str] = {}
 
-{context}
+    def load_config(self, config_file: str = None):
+        """Загружает конфигурацию из .env файла"""
+        super().load_config(config_file)
+        self.max_context_chars = int(self.env_snapshot(config_file).get("PROMO_MAX_CONTEXT_CHARS", "15000"))
 
-Напиши промо-описание в разговорном стиле, как если бы ты объяснял это другу. Без формальных параметров, просто естественно и дружелюбно.
-"""
-        elif experiment_type == "technical":
-            return f"""
-Материалы:
+    def find_text_files(self, pipeline_dir: Path, prefix: Optional[str]) -> List[Path]:
+        """Возвращает список .txt файлов из каталога пайплайна с учетом префикса."""
+        if not pipeline_dir.is_dir():
+            raise FileNotFoundError(f"Каталог пайплайна не найден: {pipeline_dir}")
 
-{context}
+        # scandir отдает имя и тип файла без отдельного stat; Path строится только для подходящих
+        with os.scandir(pipeline_dir) as it:
+            names = [e.name for e in it if e.name.endswith(".txt") and e.is_file()]
+        if prefix:
+            # Последний токен имени после "_" должен совпасть с префиксом
+            tail = f"_{prefix}.txt"
+            names = [n for n in names if n.endswith(tail)] if "_" not in prefix else []
+        return [pipeline_dir / n for n in sorted(names)]
 
-Создай технически точное промо-описание. Сосредоточься на сути и ключевых моментах. Без параметров, но с акцентом на техническую точность.
-"""
-        else:  # default
-            return f"""
-Контекст:
+    def build_context(self, files: List[Path]) -> str:
+        """
+        Собирает контекст из содержимого файлов.
+
+        Файлы читаются параллельно (ожидание ввода-вывода отпускает GIL),
+        а склеиваются в исходном порядке с прежним ограничением по размеру.
+        """
+        if len(files) > 1:
+            with ThreadPoolExecutor(max_workers=min(READ_WORKERS, len(files))) as executor:
+                texts = list(executor.map(self._read_text_safe, files))
+        else:
+            texts = [self._read_text_safe(fp) for fp in files]
 
-{context}
+        parts: List[str] = []
+        total = 0
+        for fp, text in zip(files, texts):
+            if text is None:
+                continue
+            header = f"\n===== ФАЙЛ: {fp.name} =====\n"
+            chunk = header + text + "\n"
+            if total + len(chunk) > self.max_context_chars:
+                remaining = max(self.max_context_chars - total, 0)
+                if remaining > 0:
+                    parts.append(chunk[:remaining])
+                    total += remaining
+                break
+            parts.append(chunk)
+            total += len(chunk)
+        return "".join(parts).strip()
 
-Создай промо-описание для этого контента. Просто естественный, увлекательный текст.
-"""
+    def get_context(self, files: List[Path]) -> str:
+        """
+        Возвращает контекст для набора файлов, собирая его не чаще одного раза.
+
+        Ключ — пути файлов с их mtime и размером, поэтому при изменении любого
+        файла контекст пересобирается. Несколько типов экспериментов над одним
+        каталогом читают файлы один раз.
+        """
+        signature = tuple((str(fp), *self._stat_signature(fp)) for fp in files)
+        with self._context_lock:
+            context = self._context_cache.get(signature)
+            if context is None:
+                context = self.build_context(files)
+                self._context_cache[signature] = context
+                if len(self._context_cache) > CONTEXT_CACHE_SIZE:
+                    self._context_cache.pop(next(iter(self._context_cache)))
+        return context
+
+    @staticmethod
+    def _stat_signature(fp: Path) -> Tuple[int, int]:
+        """(mtime_ns, size) файла; для недоступного файла — нули"""
+        try:
+            st = fp.stat()
+        except OSError:
+            return 0, 0
+        return st.st_mtime_ns, st.st_size
+
+    def _read_text_safe(self, fp: Path) -> Optional[str]:
+        """Читает файл не длиннее всего контекста; None, если файл прочитать не удалось"""
+        try:
+            return read_text_prefix(fp, self.max_context_chars)
+        except Exception:
+            return None
+
+    def create_prompt_parts(self, context: str, experiment_type: str) -> Tuple[str, str]:
+        """
+        Возвращает (system, user) части экспериментального промпта.
+
+        Инструкции вынесены в system-часть и не зависят от контекста, поэтому
+        провайдер может закэшировать их префикс; контекст идет последним в user-части.
+        """
+        system_text, label = _TEMPLATES.get(experiment_type, _TEMPLATES["default"])
+        return system_text, label + context
 
-    def generate_description(self, context: str, model_choice: str = "default") -> Optional[str]:
-        """Отправляет запрос к LLM и возвращает сгенерированное описание"""
-        model = self.model
-        if model_choice == "budget":
-            model = self.budget_model
-        elif model_choice == "quality":
-            model = self.quality_model
-
-        print(f"🔍 Используемая модель: {model}")
-
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "user", "content": context}
-            ],
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens
-        }
-
-        for attempt in range(3):
-            try:
-                resp = requests.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=120
-                )
-                if resp.status_code == 200:
-                    data = resp.json()
-                    return data["choices"][0]["message"]["content"].strip()
-                else:
-                    if resp.status_code == 429:
-                        time.sleep(2 ** (attempt + 1))
-                    elif attempt < 2:
-                        time.sleep(2 ** attempt)
-            except Exception:
-                if attempt < 2:
-                    time.sleep(2 ** attempt)
-        return None
+    def create_prompt(self, context: str, experiment_type: str) -> str:
+        """Создает экспериментальный промпт одним текстом (для ручного режима custom)"""
+        system_text, user_text = self.create_prompt_parts(context, experiment_type)
+        return f"{system_text}\n\n{user_text}\n"
+
+    def generate_description(self, context: str, model_choice: str = "default",
+                             system: Optional[str] = None,
+                             output_path: Optional[Path] = None) -> Optional[str]:
+        """
+        Отправляет запрос к LLM и возвращает сгенерированное описание (None при ошибке).
+
+        Если передан system, он уходит отдельным блоком с cache_control, чтобы
+        неизменные инструкции попадали в кэш промптов провайдера.
+        Если передан output_path, ответ запрашивается потоком и пишется в файл по мере генерации.
+        """
+        try:
+            return self.call_llm(context, model_choice, system=system, output_path=output_path)
+        except RuntimeError:
+            return None
 
     def process_pipeline(self, pipeline_dir: str, output_file: Optional[str], prefix: Optional[str],
                           experiment_type: str, model_choice: str = "default",
@@ -222,7 +217,7 @@ class PromoExperimentalProcessor:
         pdir = Path(pipeline_dir)
         if source_file:
             sf = Path(source_file)
-            if not sf.exists() or not sf.is_file():
+            if not sf.is_file():
                 print(f"❌ Указанный исходный файл не найден: {sf}")
                 return False, None
             txt_files = [sf]
@@ -237,13 +232,12 @@ class PromoExperimentalProcessor:
         if prefix:
             print(f"🔎 Префикс-фильтр: {prefix}")
 
-        context = self.build_context(txt_files)
+        context = self.get_context(txt_files)
         print(f"📊 Размер контекста: {len(context)} символов")
 
-        prompt = self.create_prompt(context, experiment_type)
-
         # === РЕЖИМ CUSTOM ===
         if model_choice == "custom":
+            prompt = self.create_prompt(context, experiment_type)
             print("\n" + "="*60)
             print("🎨 ЭКСПЕРИМЕНТАЛЬНЫЙ ПРОМО-ГЕНЕРАТОР")
             print("="*60)
@@ -269,20 +263,35 @@ class PromoExperimentalProcessor:
                 input("Нажмите Enter, когда сохраните файл...")
             return True, output_path
 
-        description = self.generate_description(prompt, model_choice)
-        if not description:
-            print("❌ Ошибка генерации контента")
-            return False, None
-
         if not output_file:
             output_path = pdir / f"promo_exp_{experiment_type}.txt"
         else:
             output_path = Path(output_file)
 
-        output_path.write_text(description, encoding="utf-8")
+        system_text, user_text = self.create_prompt_parts(context, experiment_type)
+        description = self.generate_description(user_text, model_choice, system=system_text,
+                                                output_path=output_path)
+        if not description:
+            print("❌ Ошибка генерации контента")
+            return False, None
+
         print(f"✅ Результат экспериментального промта '{experiment_type}' сохранен: {output_path}")
         return True, output_path
 
+    def process_many(self, jobs: List[Dict], max_workers: int = 8) -> List[Tuple[bool, Optional[Path]]]:
+        """
+        Выполняет несколько заданий process_pipeline параллельно.
+
+        Каждое задание — словарь с аргументами process_pipeline. Запросы к LLM
+        почти целиком состоят из ожидания сети, поэтому потоки перекрывают это ожидание.
+        Режим custom интерактивный и выполняется последовательно.
+        """
+        if any(job.get("model_choice") == "custom" for job in jobs) or len(jobs) < 2:
+            return [self.process_pipeline(**job) for job in jobs]
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+            return list(executor.map(lambda job: self.process_pipeline(**job), jobs))
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -295,23 +304,36 @@ def main():
     parser.add_argument("--config", help="Путь к .env файлу с конфигурацией")
     parser.add_argument("--prefix", help="Фильтр префикса для выбора .txt файлов")
     parser.add_argument("--model", choices=["default", "budget", "quality", "custom"], default="default", help="Выбор модели")
-    parser.add_argument("--experiment-type", choices=["creative", "poetry_promo", "song_pikabu", "storytelling", "conversational", "technical"],
-                       default="creative", help="Тип экспериментального промта")
+    parser.add_argument("--experiment-type", default="creative",
+                       help=f"Тип экспериментального промта ({', '.join(EXPERIMENT_TYPES)}); несколько через запятую выполняются параллельно")
     parser.add_argument("--source-file", help="Путь к конкретному исходному файлу (например, script.txt)")
 
     args = parser.parse_args()
 
-    try:
-        processor = PromoExperimentalProcessor(args.config)
-        ok, out = processor.process_pipeline(
+    experiment_types = [t.strip() for t in args.experiment_type.split(",") if t.strip()]
+    unknown = [t for t in experiment_types if t not in EXPERIMENT_TYPES]
+    if not experiment_types or unknown:
+        parser.error(f"Неизвестный тип эксперимента: {', '.join(unknown) or args.experiment_type}")
+
+    jobs = []
+    for experiment_type in experiment_types:
+        output_file = args.output
+        if output_file and len(experiment_types) > 1:
+            out = Path(output_file)
+            output_file = str(out.with_name(f"{out.stem}_{experiment_type}{out.suffix}"))
+        jobs.append(dict(
             pipeline_dir=args.pipeline_dir,
-            output_file=args.output,
+            output_file=output_file,
             prefix=args.prefix,
-            experiment_type=args.experiment_type,
+            experiment_type=experiment_type,
             model_choice=args.model,
             source_file=args.source_file
-        )
-        return 0 if ok else 1
+        ))
+
+    try:
+        with PromoExperimentalProcessor(args.config) as processor:
+            results = processor.process_many(jobs)
+        return 0 if all(ok for ok, _ in results) else 1
     except ValueError as e:
         print(f"❌ Ошибка конфигурации: {e}")
         return 1
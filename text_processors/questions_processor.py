@@ -3,50 +3,31 @@
 Процессор для генерации ответов на вопросы по тексту обсуждения.
 """
 
-import os
 import sys
 import argparse
-import time
-import requests
 import subprocess
 from pathlib import Path
-from dotenv import load_dotenv
-
-class QuestionsProcessor:
-    def __init__(self, config_file: str = None):
-        """Инициализация процессора с загрузкой конфигурации"""
-        self.load_config(config_file)
-        if not self.api_key:
-            raise ValueError("API ключ OpenRouter не найден в конфигурации")
-
-        self.base_url = "https://openrouter.ai/api/v1"
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://github.com/your-repo/video-discussion",
-            "X-Title": "Questions Processor"
-        }
-
-    def load_config(self, config_file: str = None):
-        """Загружает конфигурацию из .env файла"""
-        if config_file and Path(config_file).exists():
-            load_dotenv(config_file)
-        else:
-            for env_file in [".env", "config.env", "settings.env"]:
-                if Path(env_file).exists():
-                    load_dotenv(env_file)
-                    break
-
-        self.api_key = os.getenv("OPENROUTER_API_KEY")
-        self.model = os.getenv("DEFAULT_MODEL", "anthropic/claude-3.5-sonnet")
-        self.temperature = float(os.getenv("DEFAULT_TEMPERATURE", "0.5"))
-        self.max_tokens = int(os.getenv("DEFAULT_MAX_TOKENS", "2000"))
-        self.budget_model = os.getenv("BUDGET_MODEL", "meta-llama/llama-3.1-8b-instruct")
-        self.quality_model = os.getenv("QUALITY_MODEL", "openai/gpt-4o")
+from typing import Optional, Tuple
 
-    def create_prompt(self, discussion_text: str, questions_text: str) -> str:
-        """Создает промпт для генерации ответов"""
-        return f"""
+# Корень проекта в sys.path для импорта utils при запуске скрипта напрямую
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils.llm_session import LLMSessionProcessor
+
+
+class QuestionsProcessor(LLMSessionProcessor):
+    HTTP_REFERER = "https://github.com/your-repo/video-discussion"
+    X_TITLE = "Questions Processor"
+    DEFAULT_TEMPERATURE = "0.5"
+    DEFAULT_MAX_TOKENS = "2000"
+
+    def create_prompt_parts(self, discussion_text: str, questions_text: str) -> Tuple[str, str]:
+        """
+        Возвращает (system, user) части промпта.
+
+        Инструкции и текст обсуждения одинаковы для разных наборов вопросов,
+        поэтому идут в кэшируемый system-блок; в user-части остаются только вопросы.
+        """
+        system_text = f"""
 Ты — эксперт и внимательный собеседник. Тебе предоставлен текст обсуждения и список вопросов, возникших у читателя.
 
 ТВОЯ ЗАДАЧА:
@@ -59,54 +40,27 @@ class QuestionsProcessor:
 
 ТЕКСТ ОБСУЖДЕНИЯ:
 {discussion_text}
-
+""".strip()
+        user_text = f"""
 ВОПРОСЫ ПОЛЬЗОВАТЕЛЯ:
 {questions_text}
 
 ОТВЕТЫ:
 """.strip()
+        return system_text, user_text
 
-    def generate_answers(self, prompt: str, model_choice: str = "default") -> str:
-        """Отправляет запрос к LLM"""
-        model = self.model
-        if model_choice == "budget":
-            model = self.budget_model
-        elif model_choice == "quality":
-            model = self.quality_model
-
-        print(f"🔍 Используемая модель: {model}")
-
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens
-        }
-
-        for attempt in range(3):
-            try:
-                resp = requests.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=120
-                )
-                if resp.status_code == 200:
-                    data = resp.json()
-                    content = data["choices"][0]["message"]["content"].strip()
-                    return content
-                else:
-                    print(f"⚠️ Ошибка API {resp.status_code}: {resp.text}")
-                    if resp.status_code == 429:
-                        time.sleep(2 ** (attempt + 1))
-            except Exception as e:
-                print(f"⚠️ Ошибка соединения: {e}")
-                if attempt < 2:
-                    time.sleep(2 ** attempt)
-        
-        raise RuntimeError("Не удалось получить ответ от LLM после 3 попыток")
+    def create_prompt(self, discussion_text: str, questions_text: str) -> str:
+        """Создает промпт для генерации ответов одним текстом (для режима custom)"""
+        system_text, user_text = self.create_prompt_parts(discussion_text, questions_text)
+        return f"{system_text}\n\n{user_text}"
+
+    def generate_answers(self, prompt: str, model_choice: str = "default", system: Optional[str] = None,
+                         output_path: Optional[Path] = None) -> str:
+        """
+        Отправляет запрос к LLM; system уходит отдельным блоком с cache_control.
+        Если передан output_path, ответ запрашивается потоком и пишется в файл по мере генерации.
+        """
+        return self.call_llm(prompt, model_choice, system=system, output_path=output_path)
 
     def process(self, discussion_path: str, questions_path: str, output_path: str, model_choice: str):
         d_path = Path(discussion_path)
@@ -126,10 +80,10 @@ class QuestionsProcessor:
             return
 
         print(f"⏳ Генерация ответов на вопросы...")
-        prompt = self.create_prompt(discussion_text, questions_text)
 
         # === РЕЖИМ CUSTOM (РУЧНОЙ) ===
         if model_choice == "custom":
+            prompt = self.create_prompt(discussion_text, questions_text)
             print("\n" + "="*60)
             print("🤖 РЕЖИМ CUSTOM MODEL: ГЕНЕРАЦИЯ ОТВЕТОВ НА ВОПРОСЫ")
             print("="*60)
@@ -153,9 +107,8 @@ class QuestionsProcessor:
                 input("Нажмите Enter, когда сохраните файл...")
             return
 
-        answers = self.generate_answers(prompt, model_choice)
-
-        o_path.write_text(answers, encoding="utf-8")
+        system_text, user_text = self.create_prompt_parts(discussion_text, questions_text)
+        self.generate_answers(user_text, model_choice, system=system_text, output_path=o_path)
         print(f"✅ Ответы сохранены в: {o_path}")
 
 def main():
@@ -169,8 +122,8 @@ def main():
     args = parser.parse_args()
 
     try:
-        processor = QuestionsProcessor(args.config)
-        processor.process(args.discussion, args.questions, args.output, args.model)
+        with QuestionsProcessor(args.config) as processor:
+            processor.process(args.discussion, args.questions, args.output, args.model)
         return 0
     except Exception as e:
         print(f"❌ Ошибка: {e}")
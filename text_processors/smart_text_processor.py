@@ -6,25 +6,191 @@
 
 import os
 import sys
-import json
 import time
 import argparse
+import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 import re
 from datetime import datetime
 
+# Корень проекта в sys.path для импорта utils при запуске скрипта напрямую
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils.text_normalize import normalize_for_cache
+from utils.fast_json import json_dumps, json_loads
+from utils.sse import read_sse_stream
+from utils.rate_limiter import TokenBucketLimiter, rate_limits_from_env
+from utils.model_limits import max_output_tokens
+from utils.response_cache import CACHEABLE_FINISH_REASON, ResponseCache, response_cache_key
+from utils.progress_log import attach_progress_handler, flush_progress
+
+
+logger = logging.getLogger(__name__)
+
+# Опционально: точный подсчет токенов (pip install tiktoken); без него размер частей в символах
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+# Общий блок задач для промптов обработки (одиночных и пакетных)
+_SMART_TASKS = """ЗАДАЧИ:
+
+1. ФОРМАТИРОВАНИЕ:
+   - Убери переносы строк в середине предложений
+   - Склей разорванные слова (например: "психо-анализ" → "психоанализ")
+   - Исправь лишние пробелы и переносы
+   - Сохрани структуру абзацев
+
+2. СИНТАКСИС И ПУНКТУАЦИЯ:
+   - Исправь грамматические ошибки
+   - Добавь недостающие знаки препинания
+   - Исправь регистр букв где нужно
+   - Улучши читаемость для озвучивания
+
+3. АУДИО-ТЕГИ (добавляй умеренно и уместно):
+   - [PAUSE] - пауза между абзацами
+   - [EMPHASIS]важный текст[/EMPHASIS] - выделение ключевых концепций
+   - [SLOW]сложный текст[/SLOW] - замедление для сложных терминов
+   - [BACKGROUND_MUSIC] - где уместна фоновая музыка (в начале/конце глав)
+   - [SOUND_EFFECT]описание[/SOUND_EFFECT] - звуковые эффекты (редко)
+   - [CHAPTER_START] - начало новой главы
+   - [CHAPTER_END] - конец главы
+
+4. СТИЛЬ И СОХРАНЕНИЕ:
+   - Сохрани научный/академический тон
+   - Не меняй смысл и терминологию
+   - Сделай текст более плавным для чтения вслух
+   - Оставь нумерацию и заголовки"""
+
+# Статичные начала промптов: одинаковы для всех частей, поэтому провайдер может кэшировать
+# этот префикс; номера частей и текст идут только в конце промпта
+_SMART_PROMPT_PREFIX = f"""Ты - эксперт по подготовке текста для создания профессиональных аудиокниг. Обработай часть книги.
+
+{_SMART_TASKS}
+
+ИСХОДНЫЙ ТЕКСТ"""
+
+_SMART_BATCH_PROMPT_PREFIX = f"""Ты - эксперт по подготовке текста для создания профессиональных аудиокниг. Обработай несколько частей книги.
+
+{_SMART_TASKS}
+
+5. ФОРМАТ ОТВЕТА:
+   - Каждая часть исходного текста обрамлена маркерами <<<CHUNK k>>> и <<<END k>>>
+   - Обработай каждую часть отдельно и верни ее в тех же маркерах с тем же номером
+   - Не объединяй части и не пиши ничего вне маркеров
+
+ИСХОДНЫЙ ТЕКСТ"""
+
+# Версия промпта и ключа кэша: при изменении текста промпта или нормализации
+# (см. utils.text_normalize) старые ответы не используются
+PROMPT_VERSION = "v3"
+
+# Разбор пакетного ответа: каждая часть в маркерах <<<CHUNK k>>> ... <<<END k>>>
+_BATCH_RE = re.compile(r'<<<CHUNK (\d+)>>>(.*?)<<<END \1>>>', re.S)
+
+# Признаки текста, который нужно править: перенос с дефисом, строка с маленькой буквы
+# (разорванное предложение), двойные пробелы
+_NEEDS_LLM_RE = re.compile(r'-\n|\n[a-zа-яё]|  ')
+# Чем должен заканчиваться каждый абзац уже чистой части
+_PARAGRAPH_ENDINGS = ('.', '!', '?', '…', '»', '"', '”', ')')
+
+# Признаки сложной части для маршрутизации моделей: кавычки, дробные числа, тире
+_HARD_CHUNK_RE = re.compile(r'[«»"“”„]|\d+[.,]\d|[—–]')
+# Части короче этого порога считаются простыми при маршрутизации моделей
+EASY_CHUNK_CHARS = 600
+
+# Размер блока (в символах) при потоковом чтении входного файла
+READ_BLOCK_SIZE = 1 << 20
+
+
+def iter_split(blocks, sep: str):
+    """
+    Потоковый аналог ''.join(blocks).split(sep)
+    
+    Держит в памяти только хвост после последнего разделителя,
+    поэтому файл не нужно загружать целиком.
+    """
+    tail = ''
+    for block in blocks:
+        pieces = (tail + block).split(sep)
+        tail = pieces.pop()
+        yield from pieces
+    yield tail
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Адаптивное ограничение числа одновременных запросов (AIMD)
+    
+    Начинает с initial одновременных запросов, прибавляет один после каждых
+    increase_every успешных ответов (но не выше maximum) и вдвое уменьшает
+    лимит на 429/5xx. Так параллелизм сам подстраивается под реальную
+    пропускную способность провайдера.
+    """
+    
+    def __init__(self, initial: int, maximum: int, increase_every: int = 10):
+        self.maximum = maximum
+        self.limit = max(1, min(initial, maximum))
+        self.increase_every = increase_every
+        self._active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+    
+    def __enter__(self):
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+    
+    def on_success(self):
+        """Аддитивное увеличение лимита после серии успешных ответов"""
+        with self._cond:
+            self._successes += 1
+            if self._successes % self.increase_every == 0 and self.limit < self.maximum:
+                self.limit += 1
+                logger.info("📈 Параллельных запросов: %d", self.limit)
+                self._cond.notify()
+    
+    def on_overload(self):
+        """Мультипликативное уменьшение лимита при перегрузке (429/5xx)"""
+        with self._cond:
+            new_limit = max(1, self.limit // 2)
+            if new_limit < self.limit:
+                self.limit = new_limit
+                logger.info("📉 Параллельных запросов: %d", self.limit)
+            self._successes = 0
+
 
 class SmartTextProcessor:
-    def __init__(self, config_file: str = None):
+    # Граница предложения для разбиения длинных абзацев
+    _SENT_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+
+    def __init__(self, config_file: str = None, use_cache: bool = True):
         """
         Инициализация процессора с загрузкой конфигурации
         
         Args:
             config_file: Путь к файлу конфигурации .env
+            use_cache: Использовать дисковый кэш обработанных частей
         """
+        # Без CLI выводятся только предупреждения; прогресс — через progress_callback
+        attach_progress_handler(logger, logging.WARNING)
+        # Токенизаторы tiktoken по имени модели (None — токенизатор недоступен)
+        self._encodings: Dict[str, object] = {}
         # Загружаем конфигурацию
         self.load_config(config_file)
         
@@ -41,6 +207,12 @@ class SmartTextProcessor:
             "X-Title": "Smart Text Processor"
         }
         
+        # Одна сессия на процессор: TCP+TLS соединения с OpenRouter переиспользуются
+        # между частями; пул рассчитан на все параллельные потоки обработки
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency))
+        
         # Статистика
         self.stats = {
             'total_chunks': 0,
@@ -49,8 +221,35 @@ class SmartTextProcessor:
             'total_characters': 0,
             'total_tokens_used': 0,
             'processing_time': 0,
-            'api_calls': 0
+            'api_calls': 0,
+            'skipped_chunks': 0,
+            'model_calls': {}
         }
+        # Части обрабатываются в нескольких потоках, счетчики обновляются под блокировкой
+        self._stats_lock = threading.Lock()
+        self.rate_limiter = TokenBucketLimiter(self.rpm_limit, self.tpm_limit)
+        # MAX_CONCURRENCY — потолок; фактический параллелизм подбирается по ответам API
+        initial_concurrency = 2 if self.adaptive_concurrency else self.max_concurrency
+        self.concurrency = AdaptiveConcurrencyLimiter(initial_concurrency, self.max_concurrency)
+        
+        # Кэш обработанных частей общий с другими процессорами (см. utils.response_cache):
+        # при высокой температуре он выключен, обрезанные ответы в него не попадают
+        self.cache = None
+        if use_cache:
+            self.cache = ResponseCache.open(ResponseCache.path_from_env(), self.temperature)
+    
+    def close(self):
+        """Закрывает HTTP-сессию и кэш ответов"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
     
     def load_config(self, config_file: str = None):
         """Загружает конфигурацию из .env файла"""
@@ -69,17 +268,45 @@ class SmartTextProcessor:
         self.api_key = os.getenv('OPENROUTER_API_KEY')
         self.model = os.getenv('DEFAULT_MODEL', 'anthropic/claude-3.5-sonnet')
         self.chunk_size = int(os.getenv('DEFAULT_CHUNK_SIZE', '2500'))
+        # Размер части в токенах (нужен tiktoken); 0 — размер в символах по DEFAULT_CHUNK_SIZE
+        self.chunk_tokens = int(os.getenv('CHUNK_TOKENS', '0'))
+        # Модель для выбора токенизатора; по умолчанию имя модели без префикса провайдера
+        self.tokenizer_model = os.getenv('TOKENIZER_MODEL')
         self.temperature = float(os.getenv('DEFAULT_TEMPERATURE', '0.2'))
         self.max_tokens = int(os.getenv('DEFAULT_MAX_TOKENS', '4000'))
+        self.max_concurrency = max(1, int(os.getenv('MAX_CONCURRENCY', '4')))
+        # Подстраивать число одновременных запросов по 429/5xx (0 — всегда MAX_CONCURRENCY)
+        self.adaptive_concurrency = os.getenv('ADAPTIVE_CONCURRENCY', '1') != '0'
+        # Пропускать LLM для уже чистых частей (они не получат аудио-теги); по умолчанию выключено
+        self.skip_clean_chunks = os.getenv('SKIP_CLEAN_CHUNKS', '0') != '0'
+        # Отправлять простые части на BUDGET_MODEL, сложные — на основную модель
+        self.model_routing = os.getenv('MODEL_ROUTING', '0') != '0'
+        # Получать ответ потоком (SSE): таймаут считается между фрагментами, а не на весь ответ
+        self.stream_responses = os.getenv('STREAM_RESPONSES', '0') != '0'
+        # Сколько частей отправлять одним запросом (1 — без пакетирования)
+        self.batch_size = max(1, int(os.getenv('REQUEST_BATCH', '1')))
+        # Лимиты OpenRouter в минуту (RPM_LIMIT/TPM_LIMIT); 0 — без ограничения
+        self.rpm_limit, self.tpm_limit = rate_limits_from_env()
         
         # Альтернативные модели
         self.budget_model = os.getenv('BUDGET_MODEL', 'meta-llama/llama-3.1-8b-instruct')
         self.quality_model = os.getenv('QUALITY_MODEL', 'openai/gpt-4o')
         
+        # Ответ на пакет (max_tokens на каждую часть) должен уместиться в лимит ответа модели
+        batch_fit = max(1, max_output_tokens(self.model) // self.max_tokens)
+        if self.batch_size > batch_fit:
+            print(f"⚠️ REQUEST_BATCH уменьшен до {batch_fit}: лимит ответа {self.model} — "
+                  f"{max_output_tokens(self.model)} токенов")
+            self.batch_size = batch_fit
+        
         print(f"✅ Конфигурация загружена:")
         print(f"   Модель: {self.model}")
-        print(f"   Размер части: {self.chunk_size}")
+        if self.chunk_tokens > 0 and TIKTOKEN_AVAILABLE:
+            print(f"   Размер части: {self.chunk_tokens} токенов")
+        else:
+            print(f"   Размер части: {self.chunk_size}")
         print(f"   Температура: {self.temperature}")
+        print(f"   Параллельных запросов: {self.max_concurrency}")
     
     def create_smart_prompt(self, text_chunk: str, chunk_number: int, total_chunks: int) -> str:
         """
@@ -93,40 +320,27 @@ class SmartTextProcessor:
         Returns:
             Промпт для нейросети
         """
-        return f"""Ты - эксперт по подготовке текста для создания профессиональных аудиокниг. Обработай часть {chunk_number} из {total_chunks}.
-
-ЗАДАЧИ:
-
-1. ФОРМАТИРОВАНИЕ:
-   - Убери переносы строк в середине предложений
-   - Склей разорванные слова (например: "психо-анализ" → "психоанализ")
-   - Исправь лишние пробелы и переносы
-   - Сохрани структуру абзацев
-
-2. СИНТАКСИС И ПУНКТУАЦИЯ:
-   - Исправь грамматические ошибки
-   - Добавь недостающие знаки препинания
-   - Исправь регистр букв где нужно
-   - Улучши читаемость для озвучивания
-
-3. АУДИО-ТЕГИ (добавляй умеренно и уместно):
-   - [PAUSE] - пауза между абзацами
-   - [EMPHASIS]важный текст[/EMPHASIS] - выделение ключевых концепций
-   - [SLOW]сложный текст[/SLOW] - замедление для сложных терминов
-   - [BACKGROUND_MUSIC] - где уместна фоновая музыка (в начале/конце глав)
-   - [SOUND_EFFECT]описание[/SOUND_EFFECT] - звуковые эффекты (редко)
-   - [CHAPTER_START] - начало новой главы
-   - [CHAPTER_END] - конец главы
-
-4. СТИЛЬ И СОХРАНЕНИЕ:
-   - Сохрани научный/академический тон
-   - Не меняй смысл и терминологию
-   - Сделай текст более плавным для чтения вслух
-   - Оставь нумерацию и заголовки
-
-ИСХОДНЫЙ ТЕКСТ:
+        return f"""{_SMART_PROMPT_PREFIX} (часть {chunk_number} из {total_chunks}):
 {text_chunk}
 
+ОБРАБОТАННЫЙ ТЕКСТ:"""
+    
+    def create_smart_prompt_batch(self, batch: List[Tuple[int, str]], total_chunks: int) -> str:
+        """
+        Создает промпт для обработки нескольких частей одним запросом
+        
+        Args:
+            batch: Список пар (номер части, текст)
+            total_chunks: Общее количество частей
+            
+        Returns:
+            Промпт, в котором каждая часть обрамлена маркерами <<<CHUNK k>>> и <<<END k>>>
+        """
+        first, last = batch[0][0], batch[-1][0]
+        parts = "\n\n".join(f"<<<CHUNK {i}>>>\n{text}\n<<<END {i}>>>" for i, text in batch)
+        return f"""{_SMART_BATCH_PROMPT_PREFIX} (части {first}-{last} из {total_chunks}):
+{parts}
+
 ОБРАБОТАННЫЙ ТЕКСТ:"""
     
     def split_text_intelligently(self, text: str) -> List[str]:
@@ -139,48 +353,126 @@ class SmartTextProcessor:
         Returns:
             Список частей текста
         """
-        # Сначала разбиваем по абзацам
-        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+        return self._chunk_paragraphs(text.split('\n\n'))
+    
+    def split_file_intelligently(self, input_file: str) -> Tuple[List[str], int]:
+        """
+        Умное разбиение файла на части без загрузки всего текста в память
+        
+        Args:
+            input_file: Входной файл
+            
+        Returns:
+            Список частей текста и размер файла в символах
+        """
+        size = 0
+        
+        def blocks(f):
+            nonlocal size
+            while True:
+                block = f.read(READ_BLOCK_SIZE)
+                if not block:
+                    return
+                size += len(block)
+                yield block
+        
+        with open(input_file, 'r', encoding='utf-8') as f:
+            chunks = self._chunk_paragraphs(iter_split(blocks(f), '\n\n'))
+        return chunks, size
+    
+    def _get_encoding(self):
+        """Возвращает токенизатор tiktoken для текущей модели или None"""
+        if not TIKTOKEN_AVAILABLE:
+            return None
+        name = self.tokenizer_model or self.model.split('/')[-1]
+        if name not in self._encodings:
+            try:
+                try:
+                    encoding = tiktoken.encoding_for_model(name)
+                except KeyError:
+                    # Модели вне OpenAI: близкий по размеру токенов общий словарь
+                    encoding = tiktoken.get_encoding('cl100k_base')
+            except Exception as e:
+                logger.warning("⚠️ Токенизатор недоступен, размер считается в символах: %s", e)
+                encoding = None
+            self._encodings[name] = encoding
+        return self._encodings[name]
+    
+    def count_tokens(self, text: str) -> int:
+        """Число токенов текста (tiktoken) или оценка ~4 символа на токен"""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return len(text) // 4
+        return len(encoding.encode_ordinary(text))
+    
+    def _chunk_measure(self):
+        """
+        Лимит части, функция размера и стоимость разделителей абзацев и предложений
+        
+        При CHUNK_TOKENS > 0 и установленном tiktoken размер считается в токенах,
+        иначе в символах по DEFAULT_CHUNK_SIZE.
+        """
+        if self.chunk_tokens > 0:
+            encoding = self._get_encoding()
+            if encoding is not None:
+                encode = encoding.encode_ordinary
+                # "\n\n" — один токен, пробел перед словом входит в токен слова
+                return self.chunk_tokens, lambda text: len(encode(text)), 1, 0
+        return self.chunk_size, len, 2, 1
+    
+    def _chunk_paragraphs(self, raw_paragraphs) -> List[str]:
+        """Собирает части текста из абзацев (в том числе из потока абзацев)"""
+        # Каждый абзац обрезается один раз, пустые пропускаются
+        paragraphs = filter(None, map(str.strip, raw_paragraphs))
+        # Горячий цикл: атрибуты и методы связываются с локальными именами один раз
+        chunk_size, measure, paragraph_sep, sentence_sep = self._chunk_measure()
+        split_sentences = self._SENT_SPLIT_RE.split
         chunks = []
-        current_chunk = ""
+        add_chunk = chunks.append
+        # Части копятся в списках и склеиваются один раз при сбросе:
+        # повторное += по строке копирует ее целиком на каждом шаге
+        current_parts: List[str] = []
+        current_len = 0  # размер "\n\n".join(current_parts)
         
         for paragraph in paragraphs:
             # Если параграф слишком большой, разбиваем его по предложениям
-            if len(paragraph) > self.chunk_size:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = ""
+            paragraph_len = measure(paragraph)
+            if paragraph_len > chunk_size:
+                if current_parts:
+                    add_chunk("\n\n".join(current_parts).strip())
+                    current_parts = []
+                    current_len = 0
                 
                 # Разбиваем большой параграф
-                sentences = re.split(r'(?<=[.!?])\s+', paragraph)
-                temp_chunk = ""
+                temp_parts: List[str] = []
+                temp_len = 0  # размер " ".join(temp_parts)
                 
-                for sentence in sentences:
-                    if len(temp_chunk) + len(sentence) > self.chunk_size and temp_chunk:
-                        chunks.append(temp_chunk.strip())
-                        temp_chunk = sentence
+                for sentence in split_sentences(paragraph):
+                    sentence_len = measure(sentence)
+                    if temp_len + sentence_len > chunk_size and temp_parts:
+                        add_chunk(" ".join(temp_parts).strip())
+                        temp_parts = [sentence]
+                        temp_len = sentence_len
                     else:
-                        if temp_chunk:
-                            temp_chunk += " " + sentence
-                        else:
-                            temp_chunk = sentence
+                        temp_len += sentence_len + (sentence_sep if temp_parts else 0)
+                        temp_parts.append(sentence)
                 
-                if temp_chunk:
-                    current_chunk = temp_chunk
+                if temp_parts:
+                    current_parts = [" ".join(temp_parts)]
+                    current_len = temp_len
             else:
                 # Проверяем, не превысит ли добавление параграфа лимит
-                if len(current_chunk) + len(paragraph) > self.chunk_size and current_chunk:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = paragraph
+                if current_len + paragraph_len > chunk_size and current_parts:
+                    add_chunk("\n\n".join(current_parts).strip())
+                    current_parts = [paragraph]
+                    current_len = paragraph_len
                 else:
-                    if current_chunk:
-                        current_chunk += "\n\n" + paragraph
-                    else:
-                        current_chunk = paragraph
+                    current_len += paragraph_len + (paragraph_sep if current_parts else 0)
+                    current_parts.append(paragraph)
         
         # Добавляем последний чанк
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if current_parts:
+            add_chunk("\n\n".join(current_parts).strip())
         
         return chunks
     
@@ -198,10 +490,126 @@ class SmartTextProcessor:
         Returns:
             Обработанный текст или None
         """
+        if not self._needs_llm(text_chunk):
+            return text_chunk
+        
+        model = self._pick_model(text_chunk)
+        cached = self._cache_get(text_chunk, model)
+        if cached is not None:
+            return cached
+        
         prompt = self.create_smart_prompt(text_chunk, chunk_number, total_chunks)
+        processed_text, finish_reason = self._call_api(prompt, self.max_tokens, retry_count, model)
+        if processed_text and finish_reason == CACHEABLE_FINISH_REASON:
+            self._cache_put(text_chunk, processed_text, model)
+        return processed_text
+    
+    def process_batch_with_retry(self, batch: List[Tuple[int, str]], total_chunks: int,
+                                 retry_count: int = 3) -> Dict[int, str]:
+        """
+        Обрабатывает несколько частей одним запросом на каждую модель
+        
+        Args:
+            batch: Список пар (номер части, текст)
+            total_chunks: Общее количество частей
+            retry_count: Количество попыток
+            
+        Returns:
+            Словарь номер части -> обработанный текст (только для частей, найденных в ответе)
+        """
+        results = {}
+        # Части без кэша, сгруппированные по модели: каждая группа уходит своей модели
+        # одним запросом, поэтому часть кэшируется под тем же ключом, под которым ищется
+        pending: Dict[str, List[Tuple[int, str]]] = {}
+        for i, text in batch:
+            if not self._needs_llm(text):
+                results[i] = text
+                continue
+            model = self._pick_model(text)
+            cached = self._cache_get(text, model)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(model, []).append((i, text))
+        
+        for model, group in pending.items():
+            # Группа сокращается до числа частей, ответ на которые уместится в лимит модели;
+            # остальные части _process_batch обработает по одной
+            group = group[:max(1, max_output_tokens(model) // self.max_tokens)]
+            prompt = self.create_smart_prompt_batch(group, total_chunks)
+            response, finish_reason = self._call_api(prompt, self.max_tokens * len(group), retry_count, model)
+            if not response:
+                continue
+            
+            # Части из обрезанного ответа используются, но не кэшируются
+            cacheable = finish_reason == CACHEABLE_FINISH_REASON
+            texts = dict(group)
+            for number, body in _BATCH_RE.findall(response):
+                number = int(number)
+                if number in texts and body.strip():
+                    results[number] = body.strip()
+                    if cacheable:
+                        self._cache_put(texts[number], results[number], model)
+        return results
+    
+    def _needs_llm(self, text_chunk: str) -> bool:
+        """
+        Проверяет, нужна ли части обработка нейросетью
         
+        При SKIP_CLEAN_CHUNKS часть без разорванных строк, двойных пробелов
+        и непарных скобок, все абзацы которой заканчиваются знаком препинания,
+        передается в результат как есть, без запроса к API.
+        """
+        if not self.skip_clean_chunks:
+            return True
+        if _NEEDS_LLM_RE.search(text_chunk) or text_chunk.count('(') != text_chunk.count(')'):
+            return True
+        if not all(p.rstrip().endswith(_PARAGRAPH_ENDINGS) for p in text_chunk.split('\n\n')):
+            return True
+        with self._stats_lock:
+            self.stats['skipped_chunks'] += 1
+        return False
+    
+    def _pick_model(self, text_chunk: str) -> str:
+        """
+        Выбирает модель для части
+        
+        При MODEL_ROUTING короткие части и части без кавычек, дробных чисел
+        и тире обрабатывает дешевая BUDGET_MODEL, остальные — основная модель.
+        """
+        if not self.model_routing:
+            return self.model
+        if len(text_chunk) < EASY_CHUNK_CHARS or not _HARD_CHUNK_RE.search(text_chunk):
+            return self.budget_model
+        return self.model
+    
+    def _cache_key(self, text_chunk: str, model: str) -> str:
+        """Ключ кэша: модель, температура, версия промпта и нормализованный текст части"""
+        return response_cache_key(model, self.temperature,
+                                  f"{PROMPT_VERSION}|{normalize_for_cache(text_chunk)}")
+    
+    def _cache_get(self, text_chunk: str, model: str) -> Optional[str]:
+        """Возвращает ранее обработанный текст части из кэша или None"""
+        if self.cache is None:
+            return None
+        return self.cache.get(self._cache_key(text_chunk, model))
+    
+    def _cache_put(self, text_chunk: str, processed_text: str, model: str):
+        """Сохраняет обработанный текст части в кэш"""
+        if self.cache is not None:
+            self.cache.put(self._cache_key(text_chunk, model), model, processed_text)
+    
+    def _call_api(self, prompt: str, max_tokens: int, retry_count: int = 3,
+                  model: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Отправляет промпт в API с повторными попытками
+        
+        Returns:
+            Текст ответа (None при ошибке) и finish_reason
+        """
+        model = model or self.model
         payload = {
-            "model": self.model,
+            "model": model,
             "messages": [
                 {
                     "role": "user",
@@ -209,44 +617,71 @@ class SmartTextProcessor:
                 }
             ],
             "temperature": self.temperature,
-            "max_tokens": self.max_tokens
+            "max_tokens": max_tokens
         }
+        if self.stream_responses:
+            payload["stream"] = True
+        
+        # Оценка стоимости запроса: токены промпта плюс лимит ответа
+        estimated_tokens = self.count_tokens(prompt) + max_tokens
         
         for attempt in range(retry_count):
             try:
-                self.stats['api_calls'] += 1
+                self.rate_limiter.acquire(estimated_tokens)
+                with self._stats_lock:
+                    self.stats['api_calls'] += 1
                 
-                response = requests.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=90
-                )
+                # Слот параллелизма занят, пока модель генерирует ответ (и при потоковом чтении тоже)
+                with self.concurrency:
+                    response = self.session.post(
+                        f"{self.base_url}/chat/completions",
+                        data=json_dumps(payload),
+                        timeout=90,
+                        stream=self.stream_responses
+                    )
+                    if response.status_code == 200:
+                        if self.stream_responses:
+                            processed_text, usage, finish_reason = read_sse_stream(response)
+                        else:
+                            result = json_loads(response.content)
+                            choice = result['choices'][0]
+                            processed_text = choice['message']['content'].strip()
+                            finish_reason = choice.get('finish_reason')
+                            usage = result.get('usage')
+                    else:
+                        # Тело ошибки не читается: без close() соединение потокового запроса не вернется в пул
+                        response.close()
+                
+                if self.adaptive_concurrency:
+                    if response.status_code == 200:
+                        self.concurrency.on_success()
+                    elif response.status_code == 429 or response.status_code >= 500:
+                        self.concurrency.on_overload()
                 
                 if response.status_code == 200:
-                    result = response.json()
-                    processed_text = result['choices'][0]['message']['content'].strip()
+                    # Обновляем статистику токенов и запросов по моделям
+                    with self._stats_lock:
+                        if usage:
+                            self.stats['total_tokens_used'] += usage['total_tokens']
+                        model_calls = self.stats['model_calls']
+                        model_calls[model] = model_calls.get(model, 0) + 1
                     
-                    # Обновляем статистику токенов
-                    if 'usage' in result:
-                        self.stats['total_tokens_used'] += result['usage']['total_tokens']
-                    
-                    return processed_text
+                    return processed_text, finish_reason
                 else:
-                    print(f"❌ Ошибка API (попытка {attempt + 1}): {response.status_code}")
+                    logger.warning("❌ Ошибка API (попытка %d): %d", attempt + 1, response.status_code)
                     if response.status_code == 429:  # Rate limit
                         wait_time = 2 ** (attempt + 1)
-                        print(f"⏳ Ожидание {wait_time} секунд...")
+                        logger.warning("⏳ Ожидание %d секунд...", wait_time)
                         time.sleep(wait_time)
                     elif attempt < retry_count - 1:
                         time.sleep(2 ** attempt)
                         
             except Exception as e:
-                print(f"❌ Ошибка запроса (попытка {attempt + 1}): {e}")
+                logger.warning("❌ Ошибка запроса (попытка %d): %s", attempt + 1, e)
                 if attempt < retry_count - 1:
                     time.sleep(2 ** attempt)
         
-        return None
+        return None, None
     
     def process_text_file(self, input_file: str, output_file: str, 
                          progress_callback=None) -> bool:
@@ -264,53 +699,50 @@ class SmartTextProcessor:
         start_time = time.time()
         
         try:
-            # Читаем исходный файл
-            with open(input_file, 'r', encoding='utf-8') as f:
-                text = f.read()
+            # Читаем исходный файл блоками и сразу разбиваем на части
+            chunks, text_size = self.split_file_intelligently(input_file)
             
             print(f"📖 Загружен файл: {input_file}")
-            print(f"📊 Размер текста: {len(text):,} символов")
+            print(f"📊 Размер текста: {text_size:,} символов")
             
-            # Разбиваем на части
-            chunks = self.split_text_intelligently(text)
             self.stats['total_chunks'] = len(chunks)
             print(f"🔪 Разбито на {len(chunks)} частей")
             
-            # Обрабатываем каждую часть
-            processed_chunks = []
+            # Обрабатываем части параллельно: запросы к API почти целиком состоят
+            # из ожидания сети. Готовые части сразу пишутся в файл в исходном порядке;
+            # в памяти ждут только те, что пришли раньше предыдущих.
+            total = len(chunks)
+            workers = min(self.max_concurrency, total) or 1
             
-            for i, chunk in enumerate(chunks, 1):
-                print(f"🔄 Обрабатываю часть {i}/{len(chunks)} ({len(chunk)} символов)...")
-                
-                if progress_callback:
-                    progress_callback(i, len(chunks))
-                
-                processed_chunk = self.process_chunk_with_retry(chunk, i, len(chunks))
-                
-                if processed_chunk:
-                    processed_chunks.append(processed_chunk)
-                    self.stats['processed_chunks'] += 1
-                    self.stats['total_characters'] += len(processed_chunk)
-                    print(f"✅ Часть {i} обработана успешно")
-                else:
-                    print(f"❌ Ошибка обработки части {i}")
-                    processed_chunks.append(chunk)  # Оставляем исходный текст
-                    self.stats['failed_chunks'] += 1
-                
-                # Пауза между запросами
-                if i < len(chunks):
-                    time.sleep(1.5)
+            numbered = list(enumerate(chunks, 1))
+            batches = [numbered[k:k + self.batch_size] for k in range(0, total, self.batch_size)]
             
-            # Объединяем обработанные части
-            final_text = "\n\n[PAUSE]\n\n".join(processed_chunks)
+            separator = "\n\n[PAUSE]\n\n"
+            ready: Dict[int, str] = {}
+            next_index = 1
             
-            # Сохраняем результат
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(final_text)
+            with open(output_file, 'w', encoding='utf-8') as out, \
+                    ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._process_batch, batch, total) for batch in batches]
+                done = 0
+                for future in as_completed(futures):
+                    for i, processed in future.result():
+                        ready[i] = processed
+                        done += 1
+                    while next_index in ready:
+                        if next_index > 1:
+                            out.write(separator)
+                        out.write(ready.pop(next_index))
+                        next_index += 1
+                    if progress_callback:
+                        progress_callback(done, total)
             
             # Обновляем статистику времени
             self.stats['processing_time'] = time.time() - start_time
             
+            # Выводим накопленные сообщения о частях до статистики
+            flush_progress(logger)
+            
             # Выводим статистику
             self.print_statistics()
             
@@ -320,6 +752,55 @@ class SmartTextProcessor:
             print(f"❌ Ошибка обработки файла: {e}")
             return False
     
+    def _process_batch(self, batch: List[Tuple[int, str]], total: int) -> List[Tuple[int, str]]:
+        """
+        Обрабатывает пакет частей в рабочем потоке
+        
+        Части, которые не удалось выделить из пакетного ответа,
+        обрабатываются по одной обычным запросом.
+        """
+        if len(batch) == 1:
+            i, chunk = batch[0]
+            return [(i, self._process_chunk(chunk, i, total))]
+        
+        logger.info("🔄 Обрабатываю части %d-%d/%d одним запросом...", batch[0][0], batch[-1][0], total)
+        results = self.process_batch_with_retry(batch, total)
+        
+        processed = []
+        for i, chunk in batch:
+            if i in results:
+                with self._stats_lock:
+                    self.stats['processed_chunks'] += 1
+                    self.stats['total_characters'] += len(results[i])
+                processed.append((i, results[i]))
+            else:
+                processed.append((i, self._process_chunk(chunk, i, total)))
+        return processed
+    
+    def _process_chunk(self, chunk: str, i: int, total: int) -> str:
+        """
+        Обрабатывает одну часть в рабочем потоке и обновляет статистику
+        
+        Returns:
+            Обработанный текст или исходный текст части при ошибке
+        """
+        logger.info("🔄 Обрабатываю часть %d/%d (%d символов)...", i, total, len(chunk))
+        
+        processed_chunk = self.process_chunk_with_retry(chunk, i, total)
+        
+        if processed_chunk:
+            with self._stats_lock:
+                self.stats['processed_chunks'] += 1
+                self.stats['total_characters'] += len(processed_chunk)
+            logger.info("✅ Часть %d обработана успешно", i)
+        else:
+            logger.error("❌ Ошибка обработки части %d", i)
+            processed_chunk = chunk  # Оставляем исходный текст
+            with self._stats_lock:
+                self.stats['failed_chunks'] += 1
+        
+        return processed_chunk
+    
     def print_statistics(self):
         """Выводит статистику обработки"""
         print("\n" + "="*50)
@@ -329,6 +810,11 @@ class SmartTextProcessor:
         print(f"Обработано успешно: {self.stats['processed_chunks']}")
         print(f"Ошибок: {self.stats['failed_chunks']}")
         print(f"API вызовов: {self.stats['api_calls']}")
+        if self.stats['skipped_chunks']:
+            print(f"Пропущено чистых частей: {self.stats['skipped_chunks']}")
+        if len(self.stats['model_calls']) > 1:
+            for model, calls in self.stats['model_calls'].items():
+                print(f"   {model}: {calls} запросов")
         print(f"Использовано токенов: {self.stats['total_tokens_used']:,}")
         print(f"Время обработки: {self.stats['processing_time']:.1f} сек")
         print(f"Размер результата: {self.stats['total_characters']:,} символов")
@@ -338,6 +824,33 @@ class SmartTextProcessor:
             print(f"Процент успешного извлечения: {success_rate:.1f}%")
 
 
+def setup_logging(verbose: bool = False) -> logging.Handler:
+    """
+    Настраивает вывод сообщений о частях
+    
+    Сообщения копятся и выводятся пачками (utils.progress_log), предупреждения
+    и ошибки — сразу. Без verbose сообщения об отдельных частях не выводятся.
+    """
+    handler = attach_progress_handler(logger)
+    logger.setLevel(logging.INFO if verbose else logging.WARNING)
+    return handler
+
+
+def make_progress_printer():
+    """Возвращает progress_callback, который обновляет одну строку только при смене процента"""
+    last_percent = -1
+    
+    def print_progress(done: int, total: int):
+        nonlocal last_percent
+        percent = done * 100 // total
+        if percent != last_percent or done == total:
+            last_percent = percent
+            end = '\n' if done == total else ''
+            print(f"\r📈 Обработано частей: {done}/{total} ({percent}%)", end=end, flush=True)
+    
+    return print_progress
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Умный процессор текста для создания аудиокниг",
@@ -355,12 +868,17 @@ def main():
     parser.add_argument('--config', help='Файл конфигурации .env')
     parser.add_argument('--model', choices=['default', 'budget', 'quality'], 
                        default='default', help='Модель для использования')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Не использовать кэш обработанных частей')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                       help='Выводить сообщения о каждой части')
     
     args = parser.parse_args()
+    log_handler = setup_logging(args.verbose)
     
     try:
         # Создаем процессор
-        processor = SmartTextProcessor(args.config)
+        processor = SmartTextProcessor(args.config, use_cache=not args.no_cache)
         
         # Выбираем модель если указана
         if args.model == 'budget':
@@ -376,7 +894,9 @@ def main():
             return 1
         
         # Обрабатываем файл
-        success = processor.process_text_file(args.input_file, args.output)
+        success = processor.process_text_file(args.input_file, args.output,
+                                              progress_callback=None if args.verbose else make_progress_printer())
+        log_handler.flush()
         
         if success:
             print(f"\n✅ Обработка завершена!")
@@ -394,6 +914,8 @@ def main():
     except Exception as e:
         print(f"❌ Неожиданная ошибка: {e}")
         return 1
+    finally:
+        log_handler.flush()
 
 
 if __name__ == "__main__":
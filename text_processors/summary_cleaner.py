@@ -3,12 +3,38 @@
 Скрипт для очистки summary файлов от символов # для совместимости с озвучивателями
 """
 
+import os
 import re
 import argparse
+import multiprocessing
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+# Опционально: движок RE2 (pip install google-re2) работает за линейное время без
+# бэктрекинга, что заметно на больших markdown-файлах с множеством звездочек
+try:
+    import re2 as _re
+    RE2_AVAILABLE = True
+except ImportError:
+    _re = re
+    RE2_AVAILABLE = False
+
+# Пробельные символы в точности как \s в re для str; в RE2 \s покрывает только ASCII
+_WS = "\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000"
+
+# Параллельная очистка: строки раздаются процессам пачками, маленькие файлы чистятся в одном процессе
+SHARD_LINES = 20000
+PARALLEL_MIN_BYTES = 8 << 20
 
 
 class SummaryCleaner:
+    # Шаблоны очистки компилируются один раз при загрузке модуля
+    _BOLD_RE = _re.compile(r'\*\*(.*?)\*\*')
+    _ITALIC_RE = _re.compile(r'\*(.*?)\*')
+    # Одним проходом: все # и любые пробелы/# в начале строк (включая пустые строки)
+    _HASH_AND_LEAD_WS_RE = _re.compile('(?m)^[' + _WS + '#]+|#')
+
     def __init__(self):
         self.replacements = {
             '#': '',  # Убираем все #
@@ -16,39 +42,59 @@ class SummaryCleaner:
             '*': '',   # Убираем курсив
         }
     
-    def clean_summary(self, input_file: str, output_file: str = None) -> bool:
+    def clean_summary(self, input_file: str, output_file: str = None,
+                      processes: Optional[int] = None) -> bool:
         """
         Очищает summary файл от символов форматирования
         
         Args:
             input_file: Входной файл summary
             output_file: Выходной файл (если не указан, создается автоматически)
+            processes: Число процессов очистки (по умолчанию все ядра для файлов
+                       от PARALLEL_MIN_BYTES, иначе один)
             
         Returns:
             True если очистка успешна
         """
         try:
-            # Читаем исходный файл
-            with open(input_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            print(f"📖 Загружен файл: {input_file}")
-            print(f"📊 Размер: {len(content):,} символов")
-            
-            # Очищаем контент
-            cleaned_content = self.clean_content(content)
-            
             # Определяем выходной файл
             if not output_file:
                 input_path = Path(input_file)
                 output_file = str(input_path.parent / f"{input_path.stem}_clean{input_path.suffix}")
             
-            # Сохраняем результат
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(cleaned_content)
+            print(f"📖 Загружен файл: {input_file}")
+            
+            if processes is None:
+                large = os.path.getsize(input_file) >= PARALLEL_MIN_BYTES
+                processes = (os.cpu_count() or 1) if large else 1
             
+            if Path(output_file).resolve() == Path(input_file).resolve():
+                # Перезапись на месте: файл нужно прочитать целиком до записи
+                with open(input_file, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                cleaned_content = self.clean_content(content)
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(cleaned_content)
+                input_size, output_size = len(content), len(cleaned_content)
+            else:
+                # Файл читается и пишется построчно, без копии всего текста в памяти
+                input_size = output_size = 0
+                
+                def counted(lines):
+                    nonlocal input_size
+                    for line in lines:
+                        input_size += len(line)
+                        yield line
+                
+                with open(input_file, 'r', encoding='utf-8') as src, \
+                        open(output_file, 'w', encoding='utf-8') as dst:
+                    for piece in self.clean_lines(counted(src), processes):
+                        dst.write(piece)
+                        output_size += len(piece)
+            
+            print(f"📊 Размер: {input_size:,} символов")
             print(f"✅ Очищенный файл сохранен: {output_file}")
-            print(f"📊 Новый размер: {len(cleaned_content):,} символов")
+            print(f"📊 Новый размер: {output_size:,} символов")
             
             return True
             
@@ -66,25 +112,73 @@ class SummaryCleaner:
         Returns:
             Очищенный контент
         """
-        # Убираем заголовки с #
-        content = re.sub(r'^#+\s*', '', content, flags=re.MULTILINE)
-        
         # Убираем жирный текст
-        content = re.sub(r'\*\*(.*?)\*\*', r'\1', content)
+        content = self._BOLD_RE.sub(r'\1', content)
         
         # Убираем курсив
-        content = re.sub(r'\*(.*?)\*', r'\1', content)
+        content = self._ITALIC_RE.sub(r'\1', content)
         
-        # Убираем оставшиеся #
-        content = content.replace('#', '')
+        # Убираем заголовки, оставшиеся #, пустые строки и пробелы в начале строк.
+        # Прежние отдельные проходы давали тот же результат: пробелы в начале строки
+        # (\s захватывает и переводы строк) съедали и пустые строки, и остаток заголовков.
+        content = self._HASH_AND_LEAD_WS_RE.sub('', content)
         
-        # Убираем лишние пустые строки
-        content = re.sub(r'\n\s*\n\s*\n', '\n\n', content)
+        return content.strip()
+    
+    def clean_lines(self, lines: Iterable[str], processes: int = 1) -> Iterator[str]:
+        """
+        Построчная версия clean_content для потоковой обработки файлов
         
-        # Убираем лишние пробелы в начале строк
-        content = re.sub(r'^\s+', '', content, flags=re.MULTILINE)
+        Все шаблоны очистки действуют в пределах строки, кроме удаления пробелов
+        в начале строк, которое съедает строки из одних пробелов и #; такие строки
+        здесь просто пропускаются. Результат совпадает с clean_content для того же текста.
         
-        return content.strip()
+        Поскольку строки независимы, при processes > 1 пачки по SHARD_LINES строк
+        чистятся в пуле процессов; порядок строк сохраняется.
+        
+        Args:
+            lines: Строки текста (с завершающими '\n' или без)
+            processes: Число процессов очистки
+            
+        Yields:
+            Фрагменты очищенного текста
+        """
+        lines = iter(lines)
+        shards = iter(lambda: list(islice(lines, SHARD_LINES)), [])
+        
+        pool = multiprocessing.Pool(processes) if processes > 1 else None
+        try:
+            cleaned_shards = pool.imap(_clean_shard, shards) if pool else map(_clean_shard, shards)
+            pending = None
+            for cleaned in cleaned_shards:
+                for line in cleaned:
+                    if pending is not None:
+                        yield pending + '\n'
+                    pending = line
+            if pending is not None:
+                yield pending.rstrip()
+        finally:
+            if pool:
+                pool.terminate()
+
+
+def _clean_shard(lines: List[str]) -> List[str]:
+    """
+    Очищает пачку строк и возвращает непустые результаты без '\n'
+    
+    Функция уровня модуля, чтобы ее можно было передать в multiprocessing.Pool.
+    """
+    bold_sub = SummaryCleaner._BOLD_RE.sub
+    italic_sub = SummaryCleaner._ITALIC_RE.sub
+    hash_sub = SummaryCleaner._HASH_AND_LEAD_WS_RE.sub
+    cleaned = []
+    for line in lines:
+        if line.endswith('\n'):
+            line = line[:-1]
+        line = hash_sub('', italic_sub(r'\1', bold_sub(r'\1', line)))
+        if line:
+            cleaned.append(line)
+    return cleaned
 
 
 def main():
@@ -101,6 +195,8 @@ def main():
     
     parser.add_argument('input_file', help='Входной summary файл')
     parser.add_argument('-o', '--output', help='Выходной файл (опционально)')
+    parser.add_argument('-j', '--processes', type=int,
+                        help='Число процессов очистки (по умолчанию все ядра для больших файлов)')
     
     args = parser.parse_args()
     
@@ -114,7 +210,7 @@ def main():
         cleaner = SummaryCleaner()
         
         # Очищаем файл
-        success = cleaner.clean_summary(args.input_file, args.output)
+        success = cleaner.clean_summary(args.input_file, args.output, args.processes)
         
         if success:
             print("✅ Очистка завершена успешно!")
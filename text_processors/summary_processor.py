@@ -6,10 +6,15 @@
 
 import os
 import sys
-import json
 import time
+import logging
+import random
 import argparse
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
@@ -17,6 +22,163 @@ import re
 from datetime import datetime
 import locale
 
+# Корень проекта в sys.path для импорта utils при запуске скрипта напрямую
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils.text_normalize import normalize_for_cache
+from utils.fast_json import json_dumps, json_loads
+from utils.sse import read_sse_stream
+from utils.rate_limiter import TokenBucketLimiter, rate_limits_from_env
+from utils.model_limits import max_output_tokens
+from utils.response_cache import CACHEABLE_FINISH_REASON, ResponseCache, response_cache_key
+from utils.progress_log import attach_progress_handler, flush_progress
+
+# Опционально: точный подсчет токенов (pip install tiktoken); без него размер фрагментов в символах
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Сообщения рабочих потоков о фрагментах (вывод — utils.progress_log)
+logger = logging.getLogger(__name__)
+
+
+# Верхняя граница паузы между повторами запроса к API (секунды)
+RETRY_MAX_WAIT = 60
+
+# Разбор пакетного ответа: каждый пересказ в маркерах <<<CHUNK k>>> ... <<<END k>>>
+_BATCH_RE = re.compile(r'<<<CHUNK (\d+)>>>(.*?)<<<END \1>>>', re.S)
+
+# Инструкции по стилю изложения для промпта пересказа
+_STYLE_INSTRUCTIONS = {
+    'educational': """
+СТИЛЬ ИЗЛОЖЕНИЯ:
+- Используй простой, понятный язык
+- Объясняй сложные термины простыми словами
+- Структурируй информацию логично
+- Добавляй примеры и аналогии
+- Делай акцент на практическом применении
+- Используй активный залог и короткие предложения""",
+
+    'simple': """
+СТИЛЬ ИЗЛОЖЕНИЯ:
+- Максимально простой язык
+- Избегай сложных терминов
+- Короткие предложения
+- Четкая структура
+- Основные факты и выводы""",
+
+    'detailed': """
+СТИЛЬ ИЗЛОЖЕНИЯ:
+- Подробное объяснение концепций
+- Сохранение научной точности
+- Детальные примеры
+- Исторический контекст
+- Связи с другими теориями"""
+}
+
+_SUMMARY_ROLE = "Ты - эксперт по созданию понятных пересказов сложных текстов."
+
+# Контекст — единственная часть инструкций пересказа, зависящая от текста
+_SUMMARY_CONTEXT_TEMPLATE = """КОНТЕКСТ:
+- Тема: {topic}
+- Сложность исходного текста: {complexity}
+- Целевая аудитория: {target_audience}"""
+
+_SUMMARY_TASKS_HEAD = """
+
+ЗАДАЧИ:
+
+1. ВЫДЕЛЕНИЕ ГЛАВНОГО:
+   - Определи ключевые идеи и концепции
+   - Выдели основные факты и аргументы
+   - Найди центральную мысль фрагмента
+   - Исключи второстепенную информацию
+
+2. УПРОЩЕНИЕ:
+   - Переведи сложные термины на простой язык
+   - Объясни абстрактные концепции через конкретные примеры
+   - Разбей сложные предложения на простые
+   - Используй активный залог
+
+3. СТРУКТУРИРОВАНИЕ:
+   - Создай логичную структуру изложения
+   - Группируй связанные идеи
+   - Добавь переходы между частями
+
+4. ОБУЧАЮЩИЙ ПОДХОД:
+   - Объясни "почему" и "как"
+   - Добавь практические примеры
+   - Свяжи с повседневной жизнью
+   - Сделай материал запоминающимся
+
+"""
+
+_SUMMARY_FORMAT_TAIL = """
+
+5. ФОРМАТ ВЫВОДА:
+   - Начни с краткого введения к теме
+   - Основная часть с ключевыми идеями
+   - Практические выводы
+   - Длина: примерно 1/3 от исходного текста
+   - Отделяй заголовки пустой строкой
+   - Используй маркдаун разметку"""
+
+# Статичная часть инструкций (задачи, стиль, формат) собирается один раз для каждого стиля
+_SUMMARY_TASKS_BY_STYLE = {
+    name: _SUMMARY_TASKS_HEAD + block + _SUMMARY_FORMAT_TAIL
+    for name, block in _STYLE_INSTRUCTIONS.items()
+}
+
+_TOPIC_PROMPT_TEMPLATE = """Проанализируй следующий фрагмент текста и определи его тему и характеристики.
+
+ЗАДАЧИ:
+1. Определи основную тему текста (1-2 предложения)
+2. Оцени сложность изложения (низкая/средняя/высокая)
+3. Определи целевую аудиторию
+4. Предложи стиль изложения для пересказа
+
+ФРАГМЕНТ ТЕКСТА:
+{sample}...
+
+ОТВЕТЬ В СЛЕДУЮЩЕМ ФОРМАТЕ:
+ТЕМА: [краткое описание основной темы]
+СЛОЖНОСТЬ: [низкая/средняя/высокая]
+АУДИТОРИЯ: [описание целевой аудитории]
+СТИЛЬ: [рекомендуемый стиль изложения]"""
+
+# Поля ответа об анализе темы: метка в начале строки -> ключ context_info
+_TOPIC_FIELDS = {
+    'ТЕМА': 'topic',
+    'СЛОЖНОСТЬ': 'complexity',
+    'АУДИТОРИЯ': 'target_audience',
+    'СТИЛЬ': 'style',
+}
+_TOPIC_FIELD_RE = re.compile(r'^[^\S\n]*(ТЕМА|СЛОЖНОСТЬ|АУДИТОРИЯ|СТИЛЬ):(.*)$', re.M)
+
+# Итоговый документ: шапка перед пересказами фрагментов и подпись после них
+_DOCUMENT_HEADER_TEMPLATE = """# {title}
+
+**Тема:** {topic}  
+**Стиль изложения:** {style}  
+**Количество фрагментов:** {fragments}  
+**Дата создания:** {date}
+
+**Распознавание текста** из сканов книги, **Пересказ** и **описания иллюстраций** созданы моделью: {summary_model}
+Иллюстрации созданы моделью: {image_model}
+
+---
+
+"""
+
+_DOCUMENT_FOOTER = """
+
+---
+
+*Пересказ создан нейросетевыми моделями ИИ.*
+*Подпишитесь чтобы не пропустить новые выпуски.*
+"""
+
 # Устанавливаем русскую локаль для форматирования дат
 try:
     locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
@@ -28,14 +190,18 @@ except:
 
 
 class SummaryProcessor:
-    def __init__(self, config_file: str = None, book_title: str = None):
+    def __init__(self, config_file: str = None, book_title: str = None, use_cache: bool = True):
         """
         Инициализация процессора с загрузкой конфигурации
         
         Args:
             config_file: Путь к файлу конфигурации .env
             book_title: Название книги для использования в документах
+            use_cache: Использовать дисковый кэш пересказов фрагментов
         """
+        # Сообщения о фрагментах видны и при вызове процессора из другого кода
+        attach_progress_handler(logger)
+        
         # Сначала загружаем базовую конфигурацию
         self.load_config(config_file)
         
@@ -51,6 +217,7 @@ class SummaryProcessor:
         
         # Настройка API
         self.base_url = "https://openrouter.ai/api/v1"
+        self.chat_url = f"{self.base_url}/chat/completions"
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -58,6 +225,12 @@ class SummaryProcessor:
             "X-Title": "Summary Processor"
         }
         
+        # Одна сессия на процессор: TCP+TLS соединения с OpenRouter переиспользуются
+        # между запросами; пул рассчитан на все параллельные потоки обработки
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency))
+        
         # Статистика
         self.stats = {
             'total_chunks': 0,
@@ -67,9 +240,35 @@ class SummaryProcessor:
             'total_tokens_used': 0,
             'processing_time': 0,
             'api_calls': 0,
-            'topic_detection_calls': 0,
-            'summaries_created': 0
+            'topic_detection_calls': 0
         }
+        # Фрагменты обрабатываются в нескольких потоках, счетчики обновляются под блокировкой
+        self._stats_lock = threading.Lock()
+        
+        # Кэш пересказов общий с другими процессорами (см. utils.response_cache):
+        # при высокой температуре он выключен, обрезанные ответы в него не попадают
+        self.cache = None
+        if use_cache:
+            self.cache = ResponseCache.open(ResponseCache.path_from_env(), self.temperature)
+        
+        # Токенизаторы tiktoken по имени модели (None — токенизатор недоступен)
+        self._encodings: Dict[str, object] = {}
+        
+        # Общий для всех потоков ограничитель по лимитам RPM/TPM модели
+        self.rate_limiter = TokenBucketLimiter(self.rate_limit_rpm, self.rate_limit_tpm)
+    
+    def close(self):
+        """Закрывает HTTP-сессию и кэш пересказов"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
     
     def load_config(self, config_file: str = None):
         """Загружает конфигурацию из .env файла"""
@@ -88,8 +287,19 @@ class SummaryProcessor:
         self.api_key = os.getenv('OPENROUTER_API_KEY')
         self.model = os.getenv('DEFAULT_MODEL', 'anthropic/claude-3.5-sonnet')
         self.chunk_size = int(os.getenv('DEFAULT_CHUNK_SIZE', '10000'))
+        # Размер фрагмента в токенах (нужен tiktoken); 0 — размер в символах по DEFAULT_CHUNK_SIZE
+        self.chunk_tokens = int(os.getenv('CHUNK_TOKENS', '0'))
+        # Модель для выбора токенизатора; по умолчанию имя модели без префикса провайдера
+        self.tokenizer_model = os.getenv('TOKENIZER_MODEL')
         self.temperature = float(os.getenv('DEFAULT_TEMPERATURE', '0.3'))
         self.max_tokens = int(os.getenv('DEFAULT_MAX_TOKENS', '4000'))
+        self.max_concurrency = max(1, int(os.getenv('MAX_CONCURRENCY', '4')))
+        # Сколько фрагментов отправлять одним запросом (1 — без пакетирования)
+        self.batch_size = max(1, int(os.getenv('REQUEST_BATCH', '1')))
+        # Получать пересказы потоком (SSE): таймаут считается между фрагментами ответа
+        self.stream_responses = os.getenv('STREAM_RESPONSES', '0') != '0'
+        # Лимиты провайдера: запросов и токенов в минуту (RPM_LIMIT/TPM_LIMIT; 0 — без ограничения)
+        self.rate_limit_rpm, self.rate_limit_tpm = rate_limits_from_env()
         
         # Альтернативные модели
         self.budget_model = os.getenv('BUDGET_MODEL', 'meta-llama/llama-3.1-8b-instruct')
@@ -104,8 +314,14 @@ class SummaryProcessor:
         print(f"   Модель: {self.model}")
         print(f"   Модель для пересказа: {self.summary_model}")
         print(f"   Модель для изображений: {self.image_model}")
-        print(f"   Размер фрагмента: {self.chunk_size}")
+        if self.chunk_tokens > 0 and TIKTOKEN_AVAILABLE:
+            print(f"   Размер фрагмента: {self.chunk_tokens} токенов")
+        else:
+            print(f"   Размер фрагмента: {self.chunk_size}")
         print(f"   Температура: {self.temperature}")
+        print(f"   Параллельных запросов: {self.max_concurrency}")
+        if self.rate_limit_rpm or self.rate_limit_tpm:
+            print(f"   Лимиты: {self.rate_limit_rpm or '∞'} запросов/мин, {self.rate_limit_tpm or '∞'} токенов/мин")
     
     def load_task_config(self):
         """Загружает переменные конфига задания из окружения"""
@@ -128,32 +344,18 @@ class SummaryProcessor:
             self.image_model = task_image_model
             print(f"   Модель изображений переопределена конфигом задания: {task_image_model}")
     
-    def detect_topic_with_llm(self, text_sample: str) -> Dict[str, str]:
+    def detect_topic_with_llm(self, text_sample: str, retry_count: int = 3) -> Dict[str, str]:
         """
         Определяет тему и контекст текста с помощью LLM
         
         Args:
             text_sample: Образец текста для анализа (первый фрагмент)
+            retry_count: Количество попыток запроса
             
         Returns:
             Словарь с информацией о теме и контексте
         """
-        prompt = f"""Проанализируй следующий фрагмент текста и определи его тему и характеристики.
-
-ЗАДАЧИ:
-1. Определи основную тему текста (1-2 предложения)
-2. Оцени сложность изложения (низкая/средняя/высокая)
-3. Определи целевую аудиторию
-4. Предложи стиль изложения для пересказа
-
-ФРАГМЕНТ ТЕКСТА:
-{text_sample[:2000]}...
-
-ОТВЕТЬ В СЛЕДУЮЩЕМ ФОРМАТЕ:
-ТЕМА: [краткое описание основной темы]
-СЛОЖНОСТЬ: [низкая/средняя/высокая]
-АУДИТОРИЯ: [описание целевой аудитории]
-СТИЛЬ: [рекомендуемый стиль изложения]"""
+        prompt = _TOPIC_PROMPT_TEMPLATE.format(sample=text_sample[:2000])
 
         # Используем бюджетную модель для определения темы
         topic_model = self.budget_model if hasattr(self, 'budget_model') else self.model
@@ -170,35 +372,44 @@ class SummaryProcessor:
             "max_tokens": 500
         }
         
-        try:
-            self.stats['api_calls'] += 1
-            self.stats['topic_detection_calls'] += 1
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                analysis = result['choices'][0]['message']['content'].strip()
-                
-                # Обновляем статистику токенов
-                if 'usage' in result:
-                    self.stats['total_tokens_used'] += result['usage']['total_tokens']
+        est_tokens = self.count_tokens(prompt) + payload['max_tokens'] if self.rate_limit_tpm else 0
+        
+        for attempt in range(retry_count):
+            try:
+                self.rate_limiter.acquire(est_tokens)
+                with self._stats_lock:
+                    self.stats['api_calls'] += 1
+                    self.stats['topic_detection_calls'] += 1
                 
-                # Парсим ответ
-                context_info = self.parse_topic_analysis(analysis)
-                return context_info
-            else:
-                print(f"❌ Ошибка определения темы: {response.status_code}")
-                return self.get_default_context()
+                response = self.session.post(
+                    self.chat_url,
+                    data=json_dumps(payload),
+                    timeout=60
+                )
                 
-        except Exception as e:
-            print(f"❌ Ошибка при определении темы: {e}")
-            return self.get_default_context()
+                if response.status_code == 200:
+                    result = json_loads(response.content)
+                    analysis = result['choices'][0]['message']['content'].strip()
+                    
+                    # Обновляем статистику токенов
+                    if 'usage' in result:
+                        with self._stats_lock:
+                            self.stats['total_tokens_used'] += result['usage']['total_tokens']
+                    
+                    # Парсим ответ
+                    context_info = self.parse_topic_analysis(analysis)
+                    return context_info
+                else:
+                    print(f"❌ Ошибка определения темы (попытка {attempt + 1}): {response.status_code}")
+                    if attempt < retry_count - 1:
+                        time.sleep(self._retry_delay(attempt, response))
+                    
+            except Exception as e:
+                print(f"❌ Ошибка при определении темы (попытка {attempt + 1}): {e}")
+                if attempt < retry_count - 1:
+                    time.sleep(self._retry_delay(attempt))
+        
+        return self.get_default_context()
     
     def parse_topic_analysis(self, analysis: str) -> Dict[str, str]:
         """
@@ -217,19 +428,15 @@ class SummaryProcessor:
             'style': 'обучающий'
         }
         
-        lines = analysis.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith('ТЕМА:'):
-                context_info['topic'] = line.replace('ТЕМА:', '').strip()
-            elif line.startswith('СЛОЖНОСТЬ:'):
-                complexity = line.replace('СЛОЖНОСТЬ:', '').strip().lower()
-                if complexity in ['низкая', 'средняя', 'высокая']:
-                    context_info['complexity'] = complexity
-            elif line.startswith('АУДИТОРИЯ:'):
-                context_info['target_audience'] = line.replace('АУДИТОРИЯ:', '').strip()
-            elif line.startswith('СТИЛЬ:'):
-                context_info['style'] = line.replace('СТИЛЬ:', '').strip()
+        for match in _TOPIC_FIELD_RE.finditer(analysis):
+            label, value = match.groups()
+            value = value.replace(f'{label}:', '').strip()
+            field = _TOPIC_FIELDS[label]
+            if field == 'complexity':
+                value = value.lower()
+                if value not in ('низкая', 'средняя', 'высокая'):
+                    continue
+            context_info[field] = value
         
         return context_info
     
@@ -264,12 +471,13 @@ class SummaryProcessor:
         }
         return style_mapping.get(style, style)
 
-    def detect_topic_and_context(self, text: str) -> Dict[str, str]:
+    def detect_topic_and_context(self, text: str, chunks: Optional[List[str]] = None) -> Dict[str, str]:
         """
         Автоматически определяет тему и контекст фрагмента
         
         Args:
             text: Исходный текст
+            chunks: Уже разбитый на фрагменты текст (чтобы не разбивать его повторно)
             
         Returns:
             Словарь с информацией о теме и контексте
@@ -277,7 +485,8 @@ class SummaryProcessor:
         print("🔍 Определяю тему текста с помощью LLM...")
         
         # Берем первый фрагмент для анализа темы
-        chunks = self.split_text_into_chunks(text)
+        if chunks is None:
+            chunks = self.split_text_into_chunks(text)
         if chunks:
             sample_text = chunks[0]
             context_info = self.detect_topic_with_llm(sample_text)
@@ -288,7 +497,7 @@ class SummaryProcessor:
         return context_info
     
     def create_summary_prompt(self, text_chunk: str, chunk_number: int, total_chunks: int, 
-                             context_info: Dict[str, str], style: str = 'educational') -> str:
+                             context_info: Dict[str, str], style: str = 'educational') -> Tuple[str, str]:
         """
         Создает промпт для создания пересказа
         
@@ -300,81 +509,102 @@ class SummaryProcessor:
             style: Стиль изложения ('educational', 'simple', 'detailed')
             
         Returns:
-            Промпт для нейросети
+            Пара (system, user): system одинаков для всех фрагментов книги и кэшируется
+            провайдером, user содержит только номер и текст фрагмента
         """
-        style_instructions = {
-            'educational': """
-СТИЛЬ ИЗЛОЖЕНИЯ:
-- Используй простой, понятный язык
-- Объясняй сложные термины простыми словами
-- Структурируй информацию логично
-- Добавляй примеры и аналогии
-- Делай акцент на практическом применении
-- Используй активный залог и короткие предложения""",
-            
-            'simple': """
-СТИЛЬ ИЗЛОЖЕНИЯ:
-- Максимально простой язык
-- Избегай сложных терминов
-- Короткие предложения
-- Четкая структура
-- Основные факты и выводы""",
-            
-            'detailed': """
-СТИЛЬ ИЗЛОЖЕНИЯ:
-- Подробное объяснение концепций
-- Сохранение научной точности
-- Детальные примеры
-- Исторический контекст
-- Связи с другими теориями"""
-        }
-        
-        return f"""Ты - эксперт по созданию понятных пересказов сложных текстов. Создай пересказ фрагмента {chunk_number} из {total_chunks}.
-
-КОНТЕКСТ:
-- Тема: {context_info['topic']}
-- Сложность исходного текста: {context_info['complexity']}
-- Целевая аудитория: {context_info['target_audience']}
-
-ЗАДАЧИ:
-
-1. ВЫДЕЛЕНИЕ ГЛАВНОГО:
-   - Определи ключевые идеи и концепции
-   - Выдели основные факты и аргументы
-   - Найди центральную мысль фрагмента
-   - Исключи второстепенную информацию
+        system = self._summary_system(context_info, style)
+        user = f"""Создай пересказ фрагмента {chunk_number} из {total_chunks}.
 
-2. УПРОЩЕНИЕ:
-   - Переведи сложные термины на простой язык
-   - Объясни абстрактные концепции через конкретные примеры
-   - Разбей сложные предложения на простые
-   - Используй активный залог
-
-3. СТРУКТУРИРОВАНИЕ:
-   - Создай логичную структуру изложения
-   - Группируй связанные идеи
-   - Добавь переходы между частями
+ИСХОДНЫЙ ФРАГМЕНТ:
+{text_chunk}
 
-4. ОБУЧАЮЩИЙ ПОДХОД:
-   - Объясни "почему" и "как"
-   - Добавь практические примеры
-   - Свяжи с повседневной жизнью
-   - Сделай материал запоминающимся
+ПЕРЕСКАЗ:"""
+        return system, user
+    
+    def create_summary_prompt_batch(self, batch: List[Tuple[int, str]], total_chunks: int,
+                                    context_info: Dict[str, str], style: str = 'educational') -> Tuple[str, str]:
+        """
+        Создает промпт для пересказа нескольких фрагментов одним запросом
+        
+        Args:
+            batch: Список пар (номер фрагмента, текст)
+            total_chunks: Общее количество фрагментов
+            context_info: Информация о контексте
+            style: Стиль изложения
+            
+        Returns:
+            Пара (system, user); в user каждый фрагмент обрамлен маркерами <<<CHUNK k>>> и <<<END k>>>
+        """
+        first, last = batch[0][0], batch[-1][0]
+        parts = "\n\n".join(f"<<<CHUNK {i}>>>\n{text}\n<<<END {i}>>>" for i, text in batch)
+        system = f"""{self._summary_system(context_info, style)}
 
-{style_instructions.get(style, style_instructions['educational'])}
+6. ФОРМАТ ОТВЕТА:
+   - Каждый исходный фрагмент обрамлен маркерами <<<CHUNK k>>> и <<<END k>>>
+   - Перескажи каждый фрагмент отдельно и верни пересказ в тех же маркерах с тем же номером
+   - Не объединяй фрагменты и не пиши ничего вне маркеров"""
+        user = f"""Создай пересказы фрагментов {first}-{last} из {total_chunks}.
 
-5. ФОРМАТ ВЫВОДА:
-   - Начни с краткого введения к теме
-   - Основная часть с ключевыми идеями
-   - Практические выводы
-   - Длина: примерно 1/3 от исходного текста
-   - Отделяй заголовки пустой строкой
-   - Используй маркдаун разметку
+ИСХОДНЫЕ ФРАГМЕНТЫ:
+{parts}
 
-ИСХОДНЫЙ ФРАГМЕНТ:
-{text_chunk}
+ПЕРЕСКАЗЫ:"""
+        return system, user
+    
+    def _summary_system(self, context_info: Dict[str, str], style: str) -> str:
+        """Системное сообщение пересказа: роль и инструкции, общие для всех фрагментов книги"""
+        return f"""{_SUMMARY_ROLE}
 
-ПЕРЕСКАЗ:"""
+{self._summary_instructions(context_info, style)}"""
+    
+    def _summary_instructions(self, context_info: Dict[str, str], style: str) -> str:
+        """Общая часть промпта пересказа: контекст, задачи, стиль и формат вывода"""
+        context = _SUMMARY_CONTEXT_TEMPLATE.format(
+            topic=context_info['topic'],
+            complexity=context_info['complexity'],
+            target_audience=context_info['target_audience']
+        )
+        return context + _SUMMARY_TASKS_BY_STYLE.get(style, _SUMMARY_TASKS_BY_STYLE['educational'])
+    
+    def _get_encoding(self):
+        """Возвращает токенизатор tiktoken для текущей модели или None"""
+        if not TIKTOKEN_AVAILABLE:
+            return None
+        name = self.tokenizer_model or self.model.split('/')[-1]
+        if name not in self._encodings:
+            try:
+                try:
+                    encoding = tiktoken.encoding_for_model(name)
+                except KeyError:
+                    # Модели вне OpenAI: близкий по размеру токенов общий словарь
+                    encoding = tiktoken.get_encoding('cl100k_base')
+            except Exception as e:
+                print(f"⚠️ Токенизатор недоступен, размер считается в символах: {e}")
+                encoding = None
+            self._encodings[name] = encoding
+        return self._encodings[name]
+    
+    def count_tokens(self, text: str) -> int:
+        """Число токенов текста (tiktoken) или оценка ~4 символа на токен"""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return len(text) // 4
+        return len(encoding.encode_ordinary(text))
+    
+    def _chunk_measure(self):
+        """
+        Лимит фрагмента, функция размера и стоимость разделителя абзацев
+        
+        При CHUNK_TOKENS > 0 и установленном tiktoken размер считается в токенах,
+        иначе в символах по DEFAULT_CHUNK_SIZE.
+        """
+        if self.chunk_tokens > 0:
+            encoding = self._get_encoding()
+            if encoding is not None:
+                encode = encoding.encode_ordinary
+                # "\n\n" — один токен
+                return self.chunk_tokens, lambda text: len(encode(text)), 1
+        return self.chunk_size, len, 2
     
     def split_text_into_chunks(self, text: str) -> List[str]:
         """
@@ -386,25 +616,30 @@ class SummaryProcessor:
         Returns:
             Список фрагментов текста
         """
-        # Разбиваем по абзацам
-        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+        # Разбиваем по абзацам; каждый абзац обрезается один раз, пустые пропускаются
+        paragraphs = filter(None, map(str.strip, text.split('\n\n')))
+        chunk_size, measure, paragraph_sep = self._chunk_measure()
         chunks = []
-        current_chunk = ""
+        # Абзацы копятся в списке и склеиваются один раз при сбросе:
+        # повторное += по строке копирует ее целиком на каждом шаге
+        current_parts: List[str] = []
+        current_len = 0  # размер "\n\n".join(current_parts)
         
         for paragraph in paragraphs:
+            # Размер абзаца считается один раз (в токенах это полный проход токенизатора)
+            paragraph_len = measure(paragraph)
             # Если добавление параграфа превысит лимит
-            if len(current_chunk) + len(paragraph) > self.chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = paragraph
+            if current_len + paragraph_len > chunk_size and current_parts:
+                chunks.append("\n\n".join(current_parts))
+                current_parts = [paragraph]
+                current_len = paragraph_len
             else:
-                if current_chunk:
-                    current_chunk += "\n\n" + paragraph
-                else:
-                    current_chunk = paragraph
+                current_len += paragraph_len + (paragraph_sep if current_parts else 0)
+                current_parts.append(paragraph)
         
         # Добавляем последний чанк
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if current_parts:
+            chunks.append("\n\n".join(current_parts))
         
         return chunks
     
@@ -425,55 +660,186 @@ class SummaryProcessor:
         Returns:
             Пересказ текста или None
         """
-        prompt = self.create_summary_prompt(text_chunk, chunk_number, total_chunks, context_info, style)
+        cache_key = self._cache_key(text_chunk, context_info, style)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        system, prompt = self.create_summary_prompt(text_chunk, chunk_number, total_chunks, context_info, style)
+        summary, finish_reason = self._call_api(prompt, self.max_tokens, retry_count, system)
+        if summary and finish_reason == CACHEABLE_FINISH_REASON:
+            self._cache_put(cache_key, summary)
+        return summary
+    
+    def process_batch_with_retry(self, batch: List[Tuple[int, str]], total_chunks: int,
+                                 context_info: Dict[str, str], style: str = 'educational',
+                                 retry_count: int = 3) -> Dict[int, str]:
+        """
+        Создает пересказы нескольких фрагментов одним запросом
+        
+        Args:
+            batch: Список пар (номер фрагмента, текст)
+            total_chunks: Общее количество фрагментов
+            context_info: Информация о контексте
+            style: Стиль изложения
+            retry_count: Количество попыток
+            
+        Returns:
+            Словарь номер фрагмента -> пересказ (только для фрагментов, найденных в ответе)
+        """
+        results = {}
+        pending = []
+        keys = {}
+        for i, text in batch:
+            keys[i] = self._cache_key(text, context_info, style)
+            cached = self._cache_get(keys[i])
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append((i, text))
+        if not pending:
+            return results
+        
+        # Остальные фрагменты _process_batch перескажет по одному
+        pending = pending[:self._batch_fit()]
+        system, prompt = self.create_summary_prompt_batch(pending, total_chunks, context_info, style)
+        response, finish_reason = self._call_api(prompt, self.max_tokens * len(pending), retry_count, system)
+        if not response:
+            return results
+        
+        # Пересказы из обрезанного ответа используются, но не кэшируются
+        cacheable = finish_reason == CACHEABLE_FINISH_REASON
+        numbers = {i for i, _ in pending}
+        for number, body in _BATCH_RE.findall(response):
+            number = int(number)
+            if number in numbers and body.strip():
+                results[number] = body.strip()
+                if cacheable:
+                    self._cache_put(keys[number], results[number])
+        return results
+    
+    def _batch_fit(self) -> int:
+        """Сколько фрагментов помещается в пакет: ответ (max_tokens на каждый) не превышает лимит модели"""
+        return max(1, max_output_tokens(self.model) // self.max_tokens)
+    
+    def _cache_key(self, text_chunk: str, context_info: Dict[str, str], style: str) -> str:
+        """
+        Ключ кэша: модель, температура, системное сообщение и нормализованный текст фрагмента
+        
+        Номер фрагмента в ключ не входит, поэтому после правки книги
+        неизмененные фрагменты находятся в кэше и при сдвиге нумерации,
+        а нормализация сводит к одному ключу фрагменты, отличающиеся только
+        версткой и типографикой: пересказ не воспроизводит ни разбивку
+        на строки, ни вид кавычек и тире исходного текста.
+        """
+        system = self._summary_system(context_info, style)
+        normalized = normalize_for_cache(text_chunk, keep_line_breaks=False, fold_typography=True)
+        return response_cache_key(self.model, self.temperature, f"{system}|{normalized}")
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Возвращает сохраненный пересказ фрагмента или None"""
+        if self.cache is None:
+            return None
+        return self.cache.get(key)
+    
+    def _cache_put(self, key: str, summary: str):
+        """Сохраняет пересказ фрагмента в дисковый кэш"""
+        if self.cache is not None:
+            self.cache.put(key, self.model, summary)
+    
+    def _call_api(self, prompt: str, max_tokens: int, retry_count: int = 3,
+                  system: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Отправляет промпт в API с повторными попытками
+        
+        system уходит первым сообщением с cache_control: он одинаков для всех
+        фрагментов книги, и провайдер переиспользует его префикс между запросами.
         
+        Returns:
+            Текст ответа (None при ошибке) и finish_reason
+        """
+        messages = []
+        if system:
+            messages.append({
+                "role": "system",
+                "content": [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+            })
+        messages.append({"role": "user", "content": prompt})
         payload = {
             "model": self.model,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            "messages": messages,
             "temperature": self.temperature,
-            "max_tokens": self.max_tokens
+            "max_tokens": max_tokens
         }
+        if self.stream_responses:
+            payload["stream"] = True
+        
+        # Оценка расхода для лимита TPM: токены входа плюс весь бюджет ответа
+        est_tokens = 0
+        if self.rate_limit_tpm:
+            est_tokens = self.count_tokens(prompt) + self.count_tokens(system or '') + max_tokens
         
         for attempt in range(retry_count):
             try:
-                self.stats['api_calls'] += 1
+                self.rate_limiter.acquire(est_tokens)
+                with self._stats_lock:
+                    self.stats['api_calls'] += 1
                 
-                response = requests.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=120
+                response = self.session.post(
+                    self.chat_url,
+                    data=json_dumps(payload),
+                    timeout=120,
+                    stream=self.stream_responses
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
-                    summary = result['choices'][0]['message']['content'].strip()
+                    if self.stream_responses:
+                        summary, usage, finish_reason = read_sse_stream(response)
+                    else:
+                        result = json_loads(response.content)
+                        choice = result['choices'][0]
+                        summary = choice['message']['content'].strip()
+                        finish_reason = choice.get('finish_reason')
+                        usage = result.get('usage')
                     
                     # Обновляем статистику токенов
-                    if 'usage' in result:
-                        self.stats['total_tokens_used'] += result['usage']['total_tokens']
+                    if usage:
+                        with self._stats_lock:
+                            self.stats['total_tokens_used'] += usage['total_tokens']
                     
-                    return summary
+                    return summary, finish_reason
                 else:
-                    print(f"❌ Ошибка API (попытка {attempt + 1}): {response.status_code}")
-                    if response.status_code == 429:  # Rate limit
-                        wait_time = 2 ** (attempt + 1)
-                        print(f"⏳ Ожидание {wait_time} секунд...")
+                    # Тело ошибки не читается: без close() соединение потокового запроса не вернется в пул
+                    response.close()
+                    logger.warning("❌ Ошибка API (попытка %d): %d", attempt + 1, response.status_code)
+                    if attempt < retry_count - 1:
+                        wait_time = self._retry_delay(attempt, response)
+                        logger.warning("⏳ Ожидание %.1f секунд...", wait_time)
                         time.sleep(wait_time)
-                    elif attempt < retry_count - 1:
-                        time.sleep(2 ** attempt)
                         
             except Exception as e:
-                print(f"❌ Ошибка запроса (попытка {attempt + 1}): {e}")
+                logger.warning("❌ Ошибка запроса (попытка %d): %s", attempt + 1, e)
                 if attempt < retry_count - 1:
-                    time.sleep(2 ** attempt)
+                    time.sleep(self._retry_delay(attempt))
+        
+        return None, None
+    
+    @staticmethod
+    def _retry_delay(attempt: int, response=None) -> float:
+        """
+        Пауза перед повтором: Retry-After из ответа, иначе экспоненциальная с джиттером
         
-        return None
+        Джиттер разводит во времени повторы параллельных потоков, чтобы они
+        не били в API одновременно после общего 429.
+        """
+        headers = getattr(response, 'headers', None) or {}
+        retry_after = headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), RETRY_MAX_WAIT)
+            except ValueError:
+                pass  # HTTP-дата вместо секунд: считаем паузу сами
+        return min((2 ** attempt) * random.uniform(0.5, 1.5), RETRY_MAX_WAIT)
     
     def process_text_file(self, input_file: str, output_file: str, 
                          style: str = 'educational', chunk_size: int = None) -> bool:
@@ -492,51 +858,32 @@ class SummaryProcessor:
         start_time = time.time()
         
         try:
-            # Читаем исходный файл
-            with open(input_file, 'r', encoding='utf-8') as f:
-                text = f.read()
+            # Читаем исходный файл целиком одним вызовом; текстовый режим сохраняет
+            # перевод CRLF в \n, без которого не нашлись бы границы абзацев
+            text = Path(input_file).read_text(encoding='utf-8')
             
             print(f"📖 Загружен файл: {input_file}")
             print(f"📊 Размер текста: {len(text):,} символов")
             
+            # Устанавливаем размер фрагмента
+            # Явно заданный размер в символах важнее CHUNK_TOKENS
+            if chunk_size:
+                self.chunk_size = chunk_size
+                self.chunk_tokens = 0
+            
+            # Разбиваем на фрагменты один раз: первый фрагмент служит и образцом для темы
+            chunks = self.split_text_into_chunks(text)
+            
             # Определяем контекст
-            context_info = self.detect_topic_and_context(text)
+            context_info = self.detect_topic_and_context(text, chunks)
             print(f"🎯 Контекст:")
             print(f"   Тема: {context_info['topic']}")
             print(f"   Сложность: {context_info['complexity']}")
             print(f"   Стиль: {style}")
             
-            # Устанавливаем размер фрагмента
-            if chunk_size:
-                self.chunk_size = chunk_size
-            
-            # Разбиваем на фрагменты
-            chunks = self.split_text_into_chunks(text)
             self.stats['total_chunks'] = len(chunks)
             print(f"🔪 Разбито на {len(chunks)} фрагментов")
             
-            # Обрабатываем каждый фрагмент
-            summaries = []
-            
-            for i, chunk in enumerate(chunks, 1):
-                print(f"🔄 Обрабатываю фрагмент {i}/{len(chunks)} ({len(chunk)} символов)...")
-                
-                summary = self.process_chunk_with_retry(chunk, i, len(chunks), context_info, style)
-                
-                if summary:
-                    summaries.append(f"## Фрагмент {i}\n\n{summary}")
-                    self.stats['processed_chunks'] += 1
-                    self.stats['total_characters'] += len(summary)
-                    self.stats['summaries_created'] += 1
-                    print(f"✅ Фрагмент {i} обработан успешно")
-                else:
-                    print(f"❌ Ошибка обработки фрагмента {i}")
-                    self.stats['failed_chunks'] += 1
-                
-                # Пауза между запросами
-                if i < len(chunks):
-                    time.sleep(2)
-            
             # Форматируем дату по-русски
             now = datetime.now()
             try:
@@ -554,48 +901,115 @@ class SummaryProcessor:
             # Получаем русское название стиля
             style_russian = self.get_style_russian_name(style)
             
-            # Создаем блок с моделями
-            models_block = f"**Распознавание текста** из сканов книги, **Пересказ** и **описания иллюстраций** созданы моделью: {self.summary_model}\nИллюстрации созданы моделью: {self.image_model}"
-            
             # Определяем заголовок документа
             document_title = self.book_title if self.book_title else "Пересказ основных идей"
             
-            # Создаем итоговый документ
-            final_content = f"""# {document_title}
-
-**Тема:** {context_info['topic']}  
-**Стиль изложения:** {style_russian}  
-**Количество фрагментов:** {len(chunks)}  
-**Дата создания:** {russian_date}
-
-{models_block}
-
----
-
-{chr(10).join(summaries)}
-
----
-
-*Пересказ создан нейросетевыми моделями ИИ.*
-*Подпишитесь чтобы не пропустить новые выпуски.*
-"""
+            header = _DOCUMENT_HEADER_TEMPLATE.format_map({
+                'title': document_title,
+                'topic': context_info['topic'],
+                'style': style_russian,
+                'fragments': len(chunks),
+                'date': russian_date,
+                'summary_model': self.summary_model,
+                'image_model': self.image_model,
+            })
             
-            # Сохраняем результат
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(final_content)
+            # Пересказы пишутся на диск по мере готовности: в памяти держится только
+            # текущий, а при сбое готовые фрагменты остаются во временном .part файле,
+            # который заменяет итоговый только после успешного завершения
+            part_file = f"{output_file}.part"
+            
+            # Обрабатываем фрагменты параллельно: запросы к API почти целиком состоят
+            # из ожидания сети; map возвращает результаты в исходном порядке
+            total = len(chunks)
+            numbered = list(enumerate(chunks, 1))
+            batch_size = min(self.batch_size, self._batch_fit())
+            batches = [numbered[k:k + batch_size] for k in range(0, total, batch_size)]
+            workers = min(self.max_concurrency, len(batches)) or 1
+            with open(part_file, 'w', encoding='utf-8') as out, \
+                    ThreadPoolExecutor(max_workers=workers) as executor:
+                out.write(header)
+                separator = ""
+                for batch_results in executor.map(self._process_batch, batches, repeat(total),
+                                                  repeat(context_info), repeat(style)):
+                    for i, summary in batch_results:
+                        if summary:
+                            out.write(f"{separator}## Фрагмент {i}\n\n{summary}")
+                            separator = "\n"
+                    out.flush()
+                out.write(_DOCUMENT_FOOTER)
+            os.replace(part_file, output_file)
             
             # Обновляем статистику времени
             self.stats['processing_time'] = time.time() - start_time
             
-            # Выводим статистику
+            # Выводим статистику после всех сообщений о фрагментах
+            flush_progress(logger)
             self.print_statistics()
             
             return True
             
         except Exception as e:
+            flush_progress(logger)
             print(f"❌ Ошибка обработки файла: {e}")
+            if Path(f"{output_file}.part").exists():
+                print(f"💾 Готовые пересказы сохранены в: {output_file}.part")
             return False
     
+    def _process_batch(self, batch: List[Tuple[int, str]], total: int, context_info: Dict[str, str],
+                       style: str) -> List[Tuple[int, Optional[str]]]:
+        """
+        Обрабатывает пакет фрагментов в рабочем потоке
+        
+        Фрагменты, которые не удалось выделить из пакетного ответа,
+        обрабатываются по одному обычным запросом.
+        """
+        if len(batch) == 1:
+            i, chunk = batch[0]
+            return [(i, self._process_chunk(chunk, i, total, context_info, style))]
+        
+        logger.info("🔄 Обрабатываю фрагменты %d-%d/%d одним запросом...", batch[0][0], batch[-1][0], total)
+        results = self.process_batch_with_retry(batch, total, context_info, style)
+        
+        # Статистика по выделенным из ответа пересказам обновляется одним захватом блокировки
+        with self._stats_lock:
+            self.stats['processed_chunks'] += len(results)
+            self.stats['total_characters'] += sum(map(len, results.values()))
+        
+        processed = []
+        for i, chunk in batch:
+            if i in results:
+                processed.append((i, results[i]))
+            else:
+                processed.append((i, self._process_chunk(chunk, i, total, context_info, style)))
+        return processed
+    
+    def _process_chunk(self, chunk: str, i: int, total: int, context_info: Dict[str, str],
+                       style: str) -> Optional[str]:
+        """
+        Обрабатывает один фрагмент в рабочем потоке и обновляет статистику
+        
+        Returns:
+            Пересказ фрагмента или None при ошибке
+        """
+        logger.info("🔄 Обрабатываю фрагмент %d/%d (%d символов)...", i, total, len(chunk))
+        
+        summary = self.process_chunk_with_retry(chunk, i, total, context_info, style)
+        
+        with self._stats_lock:
+            if summary:
+                self.stats['processed_chunks'] += 1
+                self.stats['total_characters'] += len(summary)
+            else:
+                self.stats['failed_chunks'] += 1
+        
+        if summary:
+            logger.info("✅ Фрагмент %d обработан успешно", i)
+        else:
+            logger.error("❌ Ошибка обработки фрагмента %d", i)
+        
+        return summary
+    
     def print_statistics(self):
         """Выводит статистику обработки"""
         print("\n" + "="*50)
@@ -604,7 +1018,8 @@ class SummaryProcessor:
         print(f"Всего фрагментов: {self.stats['total_chunks']}")
         print(f"Обработано успешно: {self.stats['processed_chunks']}")
         print(f"Ошибок: {self.stats['failed_chunks']}")
-        print(f"Создано пересказов: {self.stats['summaries_created']}")
+        # Каждый успешно обработанный фрагмент дает ровно один пересказ
+        print(f"Создано пересказов: {self.stats['processed_chunks']}")
         print(f"API вызовов (всего): {self.stats['api_calls']}")
         print(f"  - Определение темы: {self.stats['topic_detection_calls']}")
         print(f"  - Создание пересказов: {self.stats['api_calls'] - self.stats['topic_detection_calls']}")
@@ -639,12 +1054,19 @@ def main():
     parser.add_argument('--chunk-size', type=int, help='Размер фрагмента в символах')
     parser.add_argument('--model', choices=['default', 'budget', 'quality'], 
                        default='default', help='Модель для использования')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Не использовать кэш пересказов фрагментов')
+    parser.add_argument('--stream', action='store_true',
+                       help='Получать пересказы потоком (SSE)')
     
     args = parser.parse_args()
     
     try:
         # Создаем процессор
-        processor = SummaryProcessor(args.config, book_title=args.title)
+        processor = SummaryProcessor(args.config, book_title=args.title, use_cache=not args.no_cache)
+        
+        if args.stream:
+            processor.stream_responses = True
         
         # Выбираем модель если указана
         if args.model == 'budget':
@@ -683,6 +1105,8 @@ def main():
     except Exception as e:
         print(f"❌ Неожиданная ошибка: {e}")
         return 1
+    finally:
+        flush_progress(logger)
 
 
 if __name__ == "__main__":
@@ -13,30 +13,126 @@
 import os
 import sys
 import json
-import time
 import argparse
+import hashlib
+import tempfile
 import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
-from dataclasses import dataclass
-import locale
+from dataclasses import dataclass, asdict
 
 # Импортируем унифицированные модули
 from utils.config_loader import ConfigLoader, get_config
 from utils.openrouter_client import OpenRouterClient, get_client
-from utils.text_splitter import split_text_into_chunks, get_chunk_stats
+from utils.text_splitter import split_text_into_chunks, iter_text_chunks, get_chunk_stats
 from utils.base_processor import BaseProcessor, ProcessingReport, create_arg_parser
 
 
-# Устанавливаем русскую локаль для форматирования дат
-try:
-    locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
-except:
-    try:
-        locale.setlocale(locale.LC_TIME, 'ru_RU')
-    except:
-        pass
+# Инструкции по стилю изложения пересказа
+_STYLE_INSTRUCTIONS = {
+    'educational': """
+СТИЛЬ ИЗЛОЖЕНИЯ:
+- Используй простой, понятный язык
+- Объясняй сложные термины простыми словами
+- Структурируй информацию логично
+- Добавляй примеры и аналогии
+- Делай акцент на практическом применении
+- Используй активный залог и короткие предложения""",
+    
+    'simple': """
+СТИЛЬ ИЗЛОЖЕНИЯ:
+- Максимально простой язык
+- Избегай сложных терминов
+- Короткие предложения
+- Четкая структура
+- Основные факты и выводы""",
+    
+    'detailed': """
+СТИЛЬ ИЗЛОЖЕНИЯ:
+- Подробное объяснение концепций
+- Сохранение научной точности
+- Детальные примеры
+- Исторический контекст
+- Связи с другими теориями"""
+}
+
+
+# Русские названия стилей для шапки документа
+_STYLE_NAMES_RU = {
+    'educational': 'познавательный',
+    'simple': 'простой',
+    'detailed': 'подробный'
+}
+
+# Месяцы в родительном падеже для даты в шапке документа (без зависимости от локали)
+_RU_MONTHS = {
+    1: 'января', 2: 'февраля', 3: 'марта', 4: 'апреля',
+    5: 'мая', 6: 'июня', 7: 'июля', 8: 'августа',
+    9: 'сентября', 10: 'октября', 11: 'ноября', 12: 'декабря'
+}
+
+# Строки ответа анализа темы вида "ПОЛЕ: значение" и поля ContextInfo, в которые они попадают
+_TOPIC_FIELD_RE = re.compile(r'^[^\S\n]*(ТЕМА|СЛОЖНОСТЬ|АУДИТОРИЯ|СТИЛЬ):(.*?)[^\S\n]*$', re.M)
+_TOPIC_FIELDS = {
+    'ТЕМА': 'topic',
+    'СЛОЖНОСТЬ': 'complexity',
+    'АУДИТОРИЯ': 'target_audience',
+    'СТИЛЬ': 'style'
+}
+_COMPLEXITY_LEVELS = ('низкая', 'средняя', 'высокая')
+
+# Образец для определения темы: первый чанк из начала текста. Разбиваем только окно
+# с запасом на длинный первый абзац, а не всю книгу
+_TOPIC_SAMPLE_CHARS = 2000
+_TOPIC_SAMPLE_WINDOW = _TOPIC_SAMPLE_CHARS * 4
+
+# Системное сообщение пересказа не зависит от номера и текста фрагмента:
+# провайдер кэширует его как общий префикс запросов одной книги
+_SUMMARY_SYSTEM_TEMPLATE = """Ты - эксперт по созданию понятных пересказов сложных текстов.
+
+КОНТЕКСТ:
+- Тема: {topic}
+- Сложность исходного текста: {complexity}
+- Целевая аудитория: {target_audience}
+
+ЗАДАЧИ:
+
+1. ВЫДЕЛЕНИЕ ГЛАВНОГО:
+   - Определи ключевые идеи и концепции
+   - Выдели основные факты и аргументы
+   - Найди центральную мысль фрагмента
+   - Исключи второстепенную информацию
+
+2. УПРОЩЕНИЕ:
+   - Переведи сложные термины на простой язык
+   - Объясни абстрактные концепции через конкретные примеры
+   - Разбей сложные предложения на простые
+   - Используй активный залог
+
+3. СТРУКТУРИРОВАНИЕ:
+   - Создай логичную структуру изложения
+   - Группируй связанные идеи
+   - Добавь переходы между частями
+
+{style_instructions}
+
+5. ФОРМАТ ВЫВОДА:
+   - Начни с краткого введения к теме
+   - Основная часть с ключевыми идеями
+   - Практические выводы
+   - Длина: примерно 1/3 от исходного текста
+   - Используй маркдаун разметку"""
+
+# Пользовательская часть запроса: единственное, что меняется от фрагмента к фрагменту
+_SUMMARY_USER_TEMPLATE = """Создай пересказ фрагмента {chunk_number} из {total_chunks}.
+
+ИСХОДНЫЙ ФРАГМЕНТ:
+{text_chunk}
+
+ПЕРЕСКАЗ:"""
 
 
 @dataclass
@@ -64,7 +160,8 @@ class SummaryProcessor(BaseProcessor):
         self,
         config_file: Optional[str] = None,
         book_title: Optional[str] = None,
-        model_preset: str = 'default'
+        model_preset: str = 'default',
+        use_cache: bool = True
     ):
         """
         Инициализация процессора.
@@ -73,6 +170,7 @@ class SummaryProcessor(BaseProcessor):
             config_file: Путь к файлу конфигурации
             book_title: Название книги для документа
             model_preset: Пресет модели ('default', 'budget', 'quality')
+            use_cache: Использовать дисковый кэш определения темы
         """
         # Инициализируем базовый класс
         super().__init__(
@@ -89,8 +187,21 @@ class SummaryProcessor(BaseProcessor):
         self.image_model = self.config.get('IMAGE_MODEL', default='FLUX')
         self.vision_model = self.config.get('VISION_MODEL', default='')
         
+        # Кэш определения темы: повторный запуск по той же книге (например, с другим
+        # стилем) берет тему с диска без запроса к LLM
+        self.topic_cache_dir = None
+        if use_cache:
+            self.topic_cache_dir = Path(
+                self.config.get('TOPIC_CACHE_DIR', default='~/.cache/creator/topic')
+            ).expanduser()
+        
+        # Сколько фрагментов отправлять в API одновременно
+        self.concurrency = max(1, self.config.get_int('MAX_CONCURRENCY', default=4))
+        
         # Контекст текста
         self.context = ContextInfo()
+        # Системные сообщения пересказа по стилю и контексту
+        self._system_prompts: Dict[Tuple[str, str, str, str], str] = {}
         
         self.logger.info(f"Модель для пересказа: {self.summary_model}")
         self.logger.info(f"Модель для изображений: {self.image_model}")
@@ -126,12 +237,12 @@ class SummaryProcessor(BaseProcessor):
 
         try:
             # Используем budget модель для определения темы
-            response = self.client.chat_with_system(
+            response = self._request(
+                prompt,
                 system="Ты аналитик текстов. Отвечай кратко и точно в указанном формате.",
-                user=prompt,
-                model=self.config.get_model('budget').name,
                 max_tokens=500,
-                temperature=0.1
+                temperature=0.1,
+                model=self.config.get_model('budget').name
             )
             
             return self._parse_topic_analysis(response)
@@ -144,18 +255,15 @@ class SummaryProcessor(BaseProcessor):
         """Парсит ответ LLM для извлечения информации о теме."""
         context = ContextInfo()
         
-        for line in analysis.split('\n'):
-            line = line.strip()
-            if line.startswith('ТЕМА:'):
-                context.topic = line.replace('ТЕМА:', '').strip()
-            elif line.startswith('СЛОЖНОСТЬ:'):
-                complexity = line.replace('СЛОЖНОСТЬ:', '').strip().lower()
-                if complexity in ['низкая', 'средняя', 'высокая']:
-                    context.complexity = complexity
-            elif line.startswith('АУДИТОРИЯ:'):
-                context.target_audience = line.replace('АУДИТОРИЯ:', '').strip()
-            elif line.startswith('СТИЛЬ:'):
-                context.style = line.replace('СТИЛЬ:', '').strip()
+        for match in _TOPIC_FIELD_RE.finditer(analysis):
+            field = _TOPIC_FIELDS[match.group(1)]
+            value = match.group(2).strip()
+            if field == 'complexity':
+                # Неизвестную сложность игнорируем, оставляя предыдущее значение
+                value = value.lower()
+                if value not in _COMPLEXITY_LEVELS:
+                    continue
+            setattr(context, field, value)
         
         return context
     
@@ -163,16 +271,57 @@ class SummaryProcessor(BaseProcessor):
         """Автоматически определяет тему и контекст текста."""
         self.logger.info("Определение темы текста...")
         
-        # Берем первый чанк для анализа
-        chunks = self.split_text(text, max_chars=2000)
-        if chunks:
-            self.context = self.detect_topic_with_llm(chunks[0])
+        # Берем первый чанк для анализа: остальной текст для этого не разбирается
+        sample = next(iter_text_chunks(text[:_TOPIC_SAMPLE_WINDOW], max_chars=_TOPIC_SAMPLE_CHARS), None)
+        if sample:
+            cache_path = self._topic_cache_path(sample)
+            cached = self._load_topic(cache_path)
+            if cached is not None:
+                self.context = cached
+                self.logger.info(f"Тема взята из кэша: {self.context.topic}")
+                return self.context
+            
+            self.context = self.detect_topic_with_llm(sample)
             self.logger.info(f"Тема определена: {self.context.topic}")
+            # Контекст по умолчанию означает ошибку определения — такой не кэшируем
+            if self.context != ContextInfo():
+                self._save_topic(cache_path, self.context)
         else:
             self.context = ContextInfo()
         
         return self.context
     
+    def _topic_cache_path(self, sample: str) -> Optional[Path]:
+        """Путь к файлу кэша темы для образца текста и модели определения темы."""
+        if self.topic_cache_dir is None:
+            return None
+        model = self.config.get_model('budget').name
+        key = hashlib.sha256(f"{model}|{sample}".encode('utf-8')).hexdigest()
+        return self.topic_cache_dir / f"{key}.json"
+    
+    def _load_topic(self, cache_path: Optional[Path]) -> Optional[ContextInfo]:
+        """Читает тему из кэша; поврежденный или устаревший файл считается промахом."""
+        if cache_path is None or not cache_path.exists():
+            return None
+        try:
+            return ContextInfo(**json.loads(cache_path.read_text(encoding='utf-8')))
+        except (OSError, ValueError, TypeError) as e:
+            self.logger.warning(f"Не удалось прочитать кэш темы {cache_path}: {e}")
+            return None
+    
+    def _save_topic(self, cache_path: Optional[Path], context: ContextInfo) -> None:
+        """Атомарно сохраняет тему в кэш: временный файл заменяет итоговый целиком."""
+        if cache_path is None:
+            return
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=cache_path.parent,
+                                             suffix='.part', delete=False) as f:
+                json.dump(asdict(context), f, ensure_ascii=False)
+            os.replace(f.name, cache_path)
+        except OSError as e:
+            self.logger.warning(f"Не удалось сохранить тему в кэш: {e}")
+    
     # === Основные методы обработки ===
     
     def create_summary_prompt(
@@ -181,75 +330,34 @@ class SummaryProcessor(BaseProcessor):
         chunk_number: int,
         total_chunks: int,
         style: str = 'educational'
-    ) -> str:
-        """Создает промпт для пересказа."""
-        
-        style_instructions = {
-            'educational': """
-СТИЛЬ ИЗЛОЖЕНИЯ:
-- Используй простой, понятный язык
-- Объясняй сложные термины простыми словами
-- Структурируй информацию логично
-- Добавляй примеры и аналогии
-- Делай акцент на практическом применении
-- Используй активный залог и короткие предложения""",
-            
-            'simple': """
-СТИЛЬ ИЗЛОЖЕНИЯ:
-- Максимально простой язык
-- Избегай сложных терминов
-- Короткие предложения
-- Четкая структура
-- Основные факты и выводы""",
-            
-            'detailed': """
-СТИЛЬ ИЗЛОЖЕНИЯ:
-- Подробное объяснение концепций
-- Сохранение научной точности
-- Детальные примеры
-- Исторический контекст
-- Связи с другими теориями"""
-        }
+    ) -> Tuple[str, str]:
+        """
+        Создает промпт для пересказа.
         
-        return f"""Ты - эксперт по созданию понятных пересказов сложных текстов. Создай пересказ фрагмента {chunk_number} из {total_chunks}.
-
-КОНТЕКСТ:
-- Тема: {self.context.topic}
-- Сложность исходного текста: {self.context.complexity}
-- Целевая аудитория: {self.context.target_audience}
-
-ЗАДАЧИ:
-
-1. ВЫДЕЛЕНИЕ ГЛАВНОГО:
-   - Определи ключевые идеи и концепции
-   - Выдели основные факты и аргументы
-   - Найди центральную мысль фрагмента
-   - Исключи второстепенную информацию
-
-2. УПРОЩЕНИЕ:
-   - Переведи сложные термины на простой язык
-   - Объясни абстрактные концепции через конкретные примеры
-   - Разбей сложные предложения на простые
-   - Используй активный залог
-
-3. СТРУКТУРИРОВАНИЕ:
-   - Создай логичную структуру изложения
-   - Группируй связанные идеи
-   - Добавь переходы между частями
-
-{style_instructions.get(style, style_instructions['educational'])}
-
-5. ФОРМАТ ВЫВОДА:
-   - Начни с краткого введения к теме
-   - Основная часть с ключевыми идеями
-   - Практические выводы
-   - Длина: примерно 1/3 от исходного текста
-   - Используй маркдаун разметку
-
-ИСХОДНЫЙ ФРАГМЕНТ:
-{text_chunk}
-
-ПЕРЕСКАЗ:"""
+        Returns:
+            Пара (system, user): system одинаков для всех фрагментов книги и кэшируется
+            провайдером как префикс, user содержит только номер и текст фрагмента
+        """
+        user = _SUMMARY_USER_TEMPLATE.format(
+            chunk_number=chunk_number,
+            total_chunks=total_chunks,
+            text_chunk=text_chunk
+        )
+        return self._summary_system(style), user
+    
+    def _summary_system(self, style: str) -> str:
+        """Системное сообщение пересказа: роль, контекст, задачи, стиль и формат вывода."""
+        key = (style, self.context.topic, self.context.complexity, self.context.target_audience)
+        system = self._system_prompts.get(key)
+        if system is None:
+            system = _SUMMARY_SYSTEM_TEMPLATE.format(
+                topic=self.context.topic,
+                complexity=self.context.complexity,
+                target_audience=self.context.target_audience,
+                style_instructions=_STYLE_INSTRUCTIONS.get(style, _STYLE_INSTRUCTIONS['educational'])
+            )
+            self._system_prompts[key] = system
+        return system
     
     def process(self, text: str, style: str = 'educational') -> str:
         """
@@ -262,46 +370,63 @@ class SummaryProcessor(BaseProcessor):
         Returns:
             Пересказ текста
         """
+        return "\n\n".join(self.summarize_fragments(text, style))
+    
+    def summarize_fragments(self, text: str, style: str = 'educational') -> Iterator[str]:
+        """
+        Определяет контекст и создаёт пересказы фрагментов.
+        
+        Контекст определяется сразу, а разделы выдаются по мере готовности:
+        запись уже готовых пересказов идёт, пока остальные ещё ждут ответа API.
+        
+        Returns:
+            Итератор разделов "## Фрагмент i" в исходном порядке (без фрагментов с ошибкой)
+        """
         # Определяем контекст
         self.detect_topic_and_context(text)
         
         # Разбиваем на чанки
         chunks = self.split_text(text)
-        self._report.chunks_processed = len(chunks)
         
         self.logger.info(f"Разбито на {len(chunks)} фрагментов")
         
-        # Обрабатываем каждый чанк
-        summaries = []
+        return self._iter_summaries(chunks, style)
+    
+    def _iter_summaries(self, chunks: List[str], style: str) -> Iterator[str]:
+        """Выдаёт разделы пересказа по порядку, пока остальные фрагменты обрабатываются."""
+        total = len(chunks)
+        # Фрагменты обрабатываются параллельно: запросы почти целиком состоят
+        # из ожидания сети; map возвращает результаты в исходном порядке
+        workers = min(self.concurrency, total) or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(self._summarize_chunk, range(1, total + 1), chunks,
+                                   repeat(total), repeat(style))
+            for i, summary in enumerate(results, 1):
+                if summary is not None:
+                    self._report.chunks_processed += 1
+                    yield f"## Фрагмент {i}\n\n{summary}"
+    
+    def _summarize_chunk(self, i: int, chunk: str, total: int, style: str) -> Optional[str]:
+        """Создает пересказ одного фрагмента в рабочем потоке; при ошибке возвращает None."""
+        self.logger.info(f"Обработка фрагмента {i}/{total} ({len(chunk)} символов)...")
         
-        for i, chunk in enumerate(chunks, 1):
-            self.logger.info(f"Обработка фрагмента {i}/{len(chunks)} ({len(chunk)} символов)...")
-            
-            prompt = self.create_summary_prompt(chunk, i, len(chunks), style)
-            
-            try:
-                summary = self.call_api(
-                    prompt=prompt,
-                    model=self.summary_model,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature
-                )
-                
-                summaries.append(f"## Фрагмент {i}\n\n{summary}")
-                self._report.chunks_processed += 1
-                self._report.api_calls += 1
-                
-                self.logger.info(f"Фрагмент {i} обработан")
-                
-            except Exception as e:
-                self.logger.error(f"Ошибка обработки фрагмента {i}: {e}")
-                self._report.errors.append(f"Фрагмент {i}: {e}")
-            
-            # Пауза между запросами
-            if i < len(chunks):
-                time.sleep(1)
+        system, prompt = self.create_summary_prompt(chunk, i, total, style)
         
-        return "\n\n".join(summaries)
+        try:
+            summary = self.call_api(
+                prompt=prompt,
+                system=system,
+                model=self.summary_model,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature
+            )
+        except Exception as e:
+            self.logger.error(f"Ошибка обработки фрагмента {i}: {e}")
+            self._report.errors.append(f"Фрагмент {i}: {e}")
+            return None
+        
+        self.logger.info(f"Фрагмент {i} обработан")
+        return summary
     
     def process_file(
         self,
@@ -328,47 +453,29 @@ class SummaryProcessor(BaseProcessor):
         text = self.read_file(input_file)
         
         # Обрабатываем
-        summaries = self.process(text, style)
-        
-        # Формируем документ
-        final_content = self._format_output(summaries, style)
+        summaries = self.summarize_fragments(text, style)
         
-        # Записываем
-        self.write_file(output_file, final_content)
+        # Записываем документ по частям, не склеивая его в одну строку
+        self.write_file(output_file, self._format_output(summaries, style))
         
         # Отчёт
         self._report.end_time = datetime.now()
-        self._report.tokens_used = self.client.total_tokens
         self.print_report()
         
         return self._report
     
-    def _format_output(self, summaries: str, style: str) -> str:
-        """Форматирует итоговый документ."""
+    def _format_output(self, summaries: Iterable[str], style: str) -> Iterator[str]:
+        """Форматирует итоговый документ: выдаёт шапку, разделы фрагментов и подпись по очереди."""
         now = datetime.now()
+        russian_date = f"{now.day} {_RU_MONTHS[now.month]} {now.year} года"
         
-        try:
-            russian_date = now.strftime('%d %B %Y года')
-        except:
-            months_ru = {
-                1: 'января', 2: 'февраля', 3: 'марта', 4: 'апреля',
-                5: 'мая', 6: 'июня', 7: 'июля', 8: 'августа',
-                9: 'сентября', 10: 'октября', 11: 'ноября', 12: 'декабря'
-            }
-            month_name = months_ru.get(now.month, 'месяца')
-            russian_date = f"{now.day} {month_name} {now.year} года"
-        
-        style_russian = {
-            'educational': 'познавательный',
-            'simple': 'простой',
-            'detailed': 'подробный'
-        }.get(style, style)
+        style_russian = _STYLE_NAMES_RU.get(style, style)
         
         document_title = self.book_title or "Пересказ основных идей"
         
         models_block = f"**Распознавание текста** из сканов книги, **Пересказ** и **описания иллюстраций** созданы моделью: {self.summary_model}\nИллюстрации созданы моделью: {self.image_model}"
         
-        return f"""# {document_title}
+        yield f"""# {document_title}
 
 **Тема:** {self.context.topic}  
 **Стиль изложения:** {style_russian}  
@@ -378,7 +485,13 @@ class SummaryProcessor(BaseProcessor):
 
 ---
 
-{summaries}
+"""
+        for i, summary in enumerate(summaries):
+            if i:
+                yield "\n\n"
+            yield summary
+        
+        yield """
 
 ---
 
@@ -389,6 +502,10 @@ class SummaryProcessor(BaseProcessor):
 
 # === CLI ===
 
+# Сколько книг обрабатывать одновременно, если -j не задан
+DEFAULT_PARALLEL_BOOKS = 2
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Процессор для создания пересказа основных идей из фрагментов текста",
@@ -398,11 +515,13 @@ def main():
   python summary_processor.py input.txt -o summary.txt
   python summary_processor.py input.txt -o summary.txt --style simple
   python summary_processor.py input.txt -o summary.txt --model quality --config config.env
+  python summary_processor.py books/*.txt -o summaries/ -j 4
         """
     )
     
-    parser.add_argument('input_file', help='Входной текстовый файл')
-    parser.add_argument('-o', '--output', required=True, help='Выходной файл')
+    parser.add_argument('input_files', nargs='+', help='Входной текстовый файл (или несколько)')
+    parser.add_argument('-o', '--output', required=True,
+                       help='Выходной файл; для нескольких входных файлов — каталог')
     parser.add_argument('--config', help='Файл конфигурации .env')
     parser.add_argument('--title', help='Название для заголовка документа')
     parser.add_argument('--style', choices=['educational', 'simple', 'detailed'], 
@@ -410,25 +529,38 @@ def main():
     parser.add_argument('--model', choices=['default', 'budget', 'quality'], 
                        default='default', help='Модель для использования')
     parser.add_argument('--verbose', '-v', action='store_true', help='Подробный вывод')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Не использовать кэш определения темы')
+    parser.add_argument('-j', '--jobs', type=int,
+                       help=f'Сколько книг обрабатывать параллельно (по умолчанию {DEFAULT_PARALLEL_BOOKS})')
     
     args = parser.parse_args()
+    if len(args.input_files) > 1 and args.title:
+        parser.error("--title задаётся только для одного входного файла")
     
+    # Проверяем входные файлы
+    missing = [f for f in args.input_files if not Path(f).exists()]
+    if missing:
+        for input_file in missing:
+            print(f"❌ Файл не найден: {input_file}")
+        return 1
+    
+    if len(args.input_files) > 1:
+        return _summarize_books(args)
+    
+    input_file = args.input_files[0]
     try:
         # Создаём процессор
         processor = SummaryProcessor(
             config_file=args.config,
             book_title=args.title,
-            model_preset=args.model
+            model_preset=args.model,
+            use_cache=not args.no_cache
         )
         
-        # Проверяем входной файл
-        if not Path(args.input_file).exists():
-            print(f"❌ Файл не найден: {args.input_file}")
-            return 1
-        
         # Обрабатываем
         report = processor.process_file(
-            args.input_file,
+            input_file,
             args.output,
             args.style
         )
@@ -447,5 +579,59 @@ def main():
         return 1
 
 
+def _summarize_books(args: argparse.Namespace) -> int:
+    """
+    Обрабатывает несколько книг параллельно в потоках одного процесса.
+    
+    Процессоры всех книг делят один клиент OpenRouter и его лимитер RPM_LIMIT/TPM_LIMIT,
+    а MAX_CONCURRENCY делится между одновременно обрабатываемыми книгами, поэтому
+    нагрузка на API та же, что и при обработке одной книги.
+    Пересказы сохраняются в каталог args.output как <имя>_summary_<стиль>.txt.
+    """
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    workers = max(1, min(args.jobs or DEFAULT_PARALLEL_BOOKS, len(args.input_files)))
+    
+    # Процессоры создаются заранее в основном потоке: так все они получают
+    # один глобальный клиент (get_client), а ошибки конфигурации видны сразу
+    jobs = []
+    try:
+        for input_file in args.input_files:
+            processor = SummaryProcessor(
+                config_file=args.config,
+                model_preset=args.model,
+                use_cache=not args.no_cache
+            )
+            processor.concurrency = max(1, processor.concurrency // workers)
+            output_file = str(output_dir / f"{Path(input_file).stem}_summary_{args.style}.txt")
+            jobs.append((processor, input_file, output_file))
+    except ValueError as e:
+        print(f"❌ Ошибка конфигурации: {e}")
+        return 1
+    print(f"📚 Книг: {len(jobs)}, параллельно: {workers}")
+    
+    def summarize(job) -> Tuple[Optional[str], int]:
+        """Возвращает (текст ошибки или None, число ошибок фрагментов)"""
+        processor, input_file, output_file = job
+        try:
+            report = processor.process_file(input_file, output_file, args.style)
+            return None, len(report.errors)
+        except Exception as e:
+            return str(e), 0
+    
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (error, fragment_errors), (_, input_file, output_file) in zip(executor.map(summarize, jobs), jobs):
+            if error:
+                failed += 1
+                print(f"❌ {input_file}: {error}")
+            elif fragment_errors:
+                print(f"⚠️ {input_file}: пересказ сохранён в {output_file}, ошибок: {fragment_errors}")
+            else:
+                print(f"✅ {input_file}: пересказ сохранён в {output_file}")
+    
+    return 1 if failed else 0
+
+
 if __name__ == "__main__":
     exit(main())
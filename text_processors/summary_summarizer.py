@@ -12,7 +12,12 @@ import os
 import re
 import argparse
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
+
+
+# Заголовок фрагмента "Фрагмент N" в тексте и отдельной строкой
+_FRAGMENT_RE = re.compile(r'Фрагмент\s+\d+')
+_FRAGMENT_LINE_RE = re.compile(r'\s*Фрагмент\s+\d+\s*$')
 
 
 class SummarySummarizer:
@@ -20,51 +25,53 @@ class SummarySummarizer:
         self.summary_file_path = Path(summary_file_path)
         self.content = ""
         self.fragments = []
+        # Позиции заголовков фрагментов в self.content (None — текст еще не просмотрен)
+        self._fragment_starts: Optional[List[int]] = None
         
     def load_summary(self) -> bool:
         """Загружает содержимое summary файла"""
         try:
             with open(self.summary_file_path, 'r', encoding='utf-8') as f:
                 self.content = f.read()
+            self._fragment_starts = None
             return True
         except Exception as e:
             print(f"Ошибка при чтении файла {self.summary_file_path}: {e}")
             return False
     
+    def _scan(self) -> List[int]:
+        """Находит позиции всех заголовков "Фрагмент N" за один проход по тексту"""
+        if self._fragment_starts is None:
+            self._fragment_starts = [m.start() for m in _FRAGMENT_RE.finditer(self.content)]
+        return self._fragment_starts
+    
     def extract_introduction(self) -> str:
         """Извлекает введение до первого слова 'Фрагмент'"""
-        # Ищем первое вхождение "Фрагмент" (с номером)
-        fragment_match = re.search(r'Фрагмент\s+\d+', self.content)
+        starts = self._scan()
         
-        if fragment_match:
+        if starts:
             # Берем текст до первого фрагмента
-            introduction = self.content[:fragment_match.start()].strip()
-            return introduction
+            return self.content[:starts[0]].strip()
         else:
             # Если фрагменты не найдены, возвращаем весь текст
             return self.content.strip()
     
+    def iter_fragments(self) -> Iterator[Tuple[int, int, str]]:
+        """
+        Перебирает фрагменты и их позиции, вырезая текст фрагмента только при переходе к нему
+        
+        В памяти одновременно находятся исходный текст и один фрагмент,
+        а не копии всех фрагментов сразу.
+        """
+        starts = self._scan()
+        # Фрагмент длится до начала следующего или до конца файла
+        ends = starts[1:] + [len(self.content)]
+        for start, end in zip(starts, ends):
+            yield start, end, self.content[start:end].strip()
+    
     def find_fragments(self) -> List[Tuple[int, int, str]]:
         """Находит все фрагменты и их позиции"""
-        fragments = []
-        
-        # Ищем все вхождения "Фрагмент N"
-        fragment_pattern = r'Фрагмент\s+\d+'
-        matches = list(re.finditer(fragment_pattern, self.content))
-        
-        for i, match in enumerate(matches):
-            start_pos = match.start()
-            
-            # Определяем конец фрагмента (начало следующего или конец файла)
-            if i + 1 < len(matches):
-                end_pos = matches[i + 1].start()
-            else:
-                end_pos = len(self.content)
-            
-            fragment_text = self.content[start_pos:end_pos].strip()
-            fragments.append((start_pos, end_pos, fragment_text))
-        
-        return fragments
+        return list(self.iter_fragments())
     
     def extract_fragment_summary(self, fragment_text: str, lines_count: int = 5) -> str:
         """Извлекает краткую сводку из фрагмента (первые несколько строк)"""
@@ -75,7 +82,7 @@ class SummarySummarizer:
             lines.pop(0)
         
         # Убираем заголовок "Фрагмент N" если он есть
-        if lines and re.match(r'^\s*Фрагмент\s+\d+\s*$', lines[0].strip()):
+        if lines and _FRAGMENT_LINE_RE.match(lines[0].strip()):
             lines.pop(0)
         
         # Берем первые несколько непустых строк
@@ -93,36 +100,28 @@ class SummarySummarizer:
         
         return '\n'.join(summary_lines)
     
-    def create_summary(self, output_file: str = None, lines_per_fragment: int = 5) -> str:
-        """Создает сводку из summary"""
-        if not self.load_summary():
-            return ""
-        
-        # Извлекаем введение
-        introduction = self.extract_introduction()
-        
-        # Находим все фрагменты
-        fragments = self.find_fragments()
-        
-        # Создаем сводку
-        summary_lines = []
-        
-        # Добавляем введение
-        summary_lines.append(introduction)
-        summary_lines.append("Содержание")
-        summary_lines.append("\n")
+    def _iter_summary(self, lines_per_fragment: int = 5) -> Iterator[str]:
+        """Выдает сводку по частям: введение, оглавление и краткое содержание каждого фрагмента"""
+        yield self.extract_introduction()
+        yield "\nСодержание"
+        yield "\n\n"
         
         # Добавляем краткую информацию по каждому фрагменту
-        for i, (start, end, fragment_text) in enumerate(fragments, 1):
-            summary_lines.append(f"\n--- Фрагмент {i} ---")
+        for i, (start, end, fragment_text) in enumerate(self.iter_fragments(), 1):
+            yield f"\n\n--- Фрагмент {i} ---"
             
             # Извлекаем краткую сводку из фрагмента
-            fragment_summary = self.extract_fragment_summary(fragment_text, lines_per_fragment)
-            summary_lines.append(fragment_summary)
-            
+            yield "\n" + self.extract_fragment_summary(fragment_text, lines_per_fragment)
+    
+    def create_summary(self, output_file: str = None, lines_per_fragment: int = 5) -> int:
+        """
+        Создает сводку из summary и пишет ее в файл по фрагментам
         
-        # Объединяем все строки
-        full_summary = '\n'.join(summary_lines)
+        Сводка не собирается в одну строку: в памяти одновременно находится
+        только текущий фрагмент. Возвращает число записанных символов (0 при ошибке).
+        """
+        if not self.load_summary():
+            return 0
         
         # Определяем имя выходного файла
         if output_file is None:
@@ -130,15 +129,17 @@ class SummarySummarizer:
             output_file = self.summary_file_path.parent / f"{base_name}_summary.txt"
         
         # Сохраняем файл
+        written = 0
         try:
             with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(full_summary)
+                for part in self._iter_summary(lines_per_fragment):
+                    written += f.write(part)
             print(f"Сводка сохранена в файл: {output_file}")
         except Exception as e:
             print(f"Ошибка при сохранении файла {output_file}: {e}")
-            return ""
+            return 0
         
-        return full_summary
+        return written
     
     def get_statistics(self) -> dict:
         """Возвращает статистику по summary файлу"""
@@ -146,16 +147,14 @@ class SummarySummarizer:
             if not self.load_summary():
                 return {}
         
-        fragments = self.find_fragments()
-        
         stats = {
-            'total_fragments': len(fragments),
+            'total_fragments': len(self._scan()),
             'total_length': len(self.content),
             'introduction_length': len(self.extract_introduction()),
             'fragments_info': []
         }
         
-        for i, (start, end, fragment_text) in enumerate(fragments, 1):
+        for i, (start, end, fragment_text) in enumerate(self.iter_fragments(), 1):
             fragment_stats = {
                 'fragment_number': i,
                 'start_position': start,
@@ -203,10 +202,10 @@ def main():
     print(f"\nСоздание сводки из файла: {args.summary_file}")
     print(f"Строк на фрагмент: {args.lines}")
     
-    summary = summarizer.create_summary(args.output, args.lines)
+    summary_length = summarizer.create_summary(args.output, args.lines)
     
-    if summary:
-        print(f"Сводка успешно создана! Длина: {len(summary)} символов")
+    if summary_length:
+        print(f"Сводка успешно создана! Длина: {summary_length} символов")
 
 
 if __name__ == "__main__":
@@ -8,26 +8,93 @@
 """
 
 import os
-import json
+import sys
 import time
 import argparse
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 import re
+from functools import partial
+
+# Корень проекта в sys.path для импорта utils при запуске скрипта напрямую
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils.fast_json import json_dumps, json_loads
+from utils.model_limits import max_output_tokens
+from utils.response_cache import CACHEABLE_FINISH_REASON, ResponseCache, response_cache_key
+
+
+# Размер блока при потоковом чтении входного файла (символов)
+READ_BLOCK_CHARS = 1 << 20
+
+# Обработанный текст примерно равен исходному по длине, поэтому размер части
+# ограничен лимитом ответа модели (utils.model_limits), а не ее контекстным окном.
+# Символов исходного текста на токен ответа: прежние 3000 символов на 4000 токенов,
+# запас на теги аудиоэффектов и более дорогую токенизацию кириллицы
+CHARS_PER_OUTPUT_TOKEN = 0.75
+
+# Ответ приходит целиком, поэтому таймаут чтения покрывает всю генерацию:
+# запас на очередь провайдера плюс max_tokens при скорости не ниже указанной
+REQUEST_TIMEOUT_BASE = 30
+MIN_OUTPUT_TOKENS_PER_SECOND = 40
+
+# Инструкции промпта не зависят от части текста: собираются один раз при импорте
+_PROMPT_PREFIX = """Ты - эксперт по обработке текста для создания аудиокниг. Обработай следующий текст:
+
+1. ИСПРАВЬ ФОРМАТИРОВАНИЕ:
+   - Убери неправильные переносы строк в середине предложений
+   - Объедини разорванные слова
+   - Сохрани правильную структуру абзацев
+
+2. КОРРЕКТИРУЙ СИНТАКСИС И ПУНКТУАЦИЮ:
+   - Исправь грамматические ошибки
+   - Добавь недостающие знаки препинания
+   - Исправь регистр букв где нужно
+
+3. ДОБАВЬ ТЕГИ ДЛЯ АУДИОЭФФЕКТОВ:
+   - [PAUSE] - для пауз между абзацами
+   - [EMPHASIS]текст[/EMPHASIS] - для выделения важных моментов
+   - [SLOW]текст[/SLOW] - для замедления речи
+   - [BACKGROUND_MUSIC] - где может звучать фоновая музыка
+   - [SOUND_EFFECT]описание[/SOUND_EFFECT] - для звуковых эффектов
+
+4. СОХРАНИ СТРУКТУРУ:
+   - Не меняй смысл текста
+   - Сохрани научный/академический стиль
+   - Оставь нумерацию и заголовки
+
+ИСХОДНЫЙ ТЕКСТ:
+"""
+_PROMPT_SUFFIX = "\n\nОБРАБОТАННЫЙ ТЕКСТ:"
 
 
 class TextProcessor:
-    def __init__(self, api_key: str, model: str = "anthropic/claude-3.5-sonnet"):
+    def __init__(self, api_key: str, model: str = "anthropic/claude-3.5-sonnet", max_concurrency: int = 4,
+                 use_cache: bool = True):
         """
         Инициализация процессора текста
         
         Args:
             api_key: API ключ для OpenRouter
             model: Модель для использования
+            max_concurrency: Сколько частей отправлять в API одновременно
+            use_cache: Использовать дисковый кэш обработанных частей
         """
         self.api_key = api_key
         self.model = model
+        self.max_tokens = max_output_tokens(model)
+        self.temperature = 0.3
+        self.request_timeout = REQUEST_TIMEOUT_BASE + self.max_tokens / MIN_OUTPUT_TOKENS_PER_SECOND
+        self.max_concurrency = max(1, max_concurrency)
+        
+        # Кэш ответов по содержимому части: повторный запуск (например, после сбоя
+        # на одной из частей) берет уже обработанные части с диска без запроса к LLM
+        # (общий с другими процессорами кэш в рабочем каталоге, см. utils.response_cache)
+        self.cache = None
+        if use_cache:
+            self.cache = ResponseCache.open(ResponseCache.path_from_env(), self.temperature)
         self.base_url = "https://openrouter.ai/api/v1"
         self.headers = {
             "Authorization": f"Bearer {api_key}",
@@ -35,6 +102,25 @@ class TextProcessor:
             "HTTP-Referer": "https://github.com/your-repo/text-processor",
             "X-Title": "PDF Text Processor"
         }
+        
+        # Одна сессия на процессор: TCP+TLS соединения с OpenRouter переиспользуются
+        # между запросами; пул рассчитан на все параллельные потоки обработки
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency))
+    
+    def close(self):
+        """Закрывает HTTP-сессию и кэш ответов"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
     
     def split_text_into_chunks(self, text: str, max_chunk_size: int = 3000) -> List[str]:
         """
@@ -47,15 +133,46 @@ class TextProcessor:
         Returns:
             Список частей текста
         """
-        # Разбиваем по абзацам
-        paragraphs = text.split('\n\n')
-        chunks = []
+        return list(self.iter_chunks([text], max_chunk_size))
+    
+    @staticmethod
+    def _iter_paragraphs(lines: Iterable[str]) -> Iterator[str]:
+        """
+        Выдает абзацы по мере чтения строк — то же, что text.split('\n\n'),
+        но без загрузки всего текста в память
+        """
+        pending = ""
+        for line in lines:
+            # Разделитель мог начаться в конце прошлого остатка
+            start = max(len(pending) - 1, 0)
+            pending += line
+            pos = 0
+            while True:
+                sep = pending.find('\n\n', max(start, pos))
+                if sep < 0:
+                    break
+                yield pending[pos:sep]
+                pos = sep + 2
+            pending = pending[pos:]
+        yield pending
+    
+    def iter_chunks(self, lines: Iterable[str], max_chunk_size: int = 3000) -> Iterator[str]:
+        """
+        Выдает части текста по одной, читая его по кускам (строки или блоки файла)
+        
+        Args:
+            lines: Куски текста подряд (открытый файл, блоки f.read(n) или [text])
+            max_chunk_size: Максимальный размер части в символах
+            
+        Yields:
+            Части текста, те же, что вернул бы split_text_into_chunks
+        """
         current_chunk = ""
         
-        for paragraph in paragraphs:
+        for paragraph in self._iter_paragraphs(lines):
             # Если добавление параграфа превысит лимит
             if len(current_chunk) + len(paragraph) > max_chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
+                yield current_chunk.strip()
                 current_chunk = paragraph
             else:
                 if current_chunk:
@@ -65,9 +182,14 @@ class TextProcessor:
         
         # Добавляем последний чанк
         if current_chunk:
-            chunks.append(current_chunk.strip())
-        
-        return chunks
+            yield current_chunk.strip()
+    
+    def default_chunk_size(self) -> int:
+        """
+        Размер части под лимит ответа модели: чем больше модель может вернуть,
+        тем меньше частей и запросов к API
+        """
+        return int(self.max_tokens * CHARS_PER_OUTPUT_TOKEN)
     
     def create_processing_prompt(self, text_chunk: str) -> str:
         """
@@ -79,34 +201,7 @@ class TextProcessor:
         Returns:
             Промпт для нейросети
         """
-        return f"""Ты - эксперт по обработке текста для создания аудиокниг. Обработай следующий текст:
-
-1. ИСПРАВЬ ФОРМАТИРОВАНИЕ:
-   - Убери неправильные переносы строк в середине предложений
-   - Объедини разорванные слова
-   - Сохрани правильную структуру абзацев
-
-2. КОРРЕКТИРУЙ СИНТАКСИС И ПУНКТУАЦИЮ:
-   - Исправь грамматические ошибки
-   - Добавь недостающие знаки препинания
-   - Исправь регистр букв где нужно
-
-3. ДОБАВЬ ТЕГИ ДЛЯ АУДИОЭФФЕКТОВ:
-   - [PAUSE] - для пауз между абзацами
-   - [EMPHASIS]текст[/EMPHASIS] - для выделения важных моментов
-   - [SLOW]текст[/SLOW] - для замедления речи
-   - [BACKGROUND_MUSIC] - где может звучать фоновая музыка
-   - [SOUND_EFFECT]описание[/SOUND_EFFECT] - для звуковых эффектов
-
-4. СОХРАНИ СТРУКТУРУ:
-   - Не меняй смысл текста
-   - Сохрани научный/академический стиль
-   - Оставь нумерацию и заголовки
-
-ИСХОДНЫЙ ТЕКСТ:
-{text_chunk}
-
-ОБРАБОТАННЫЙ ТЕКСТ:"""
+        return _PROMPT_PREFIX + text_chunk + _PROMPT_SUFFIX
     
     def process_chunk_with_ai(self, text_chunk: str, retry_count: int = 3) -> Optional[str]:
         """
@@ -121,6 +216,12 @@ class TextProcessor:
         """
         prompt = self.create_processing_prompt(text_chunk)
         
+        cache_key = response_cache_key(self.model, self.temperature, prompt)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         payload = {
             "model": self.model,
             "messages": [
@@ -129,22 +230,34 @@ class TextProcessor:
                     "content": prompt
                 }
             ],
-            "temperature": 0.3,
-            "max_tokens": 4000
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
         }
         
+        # Тело сериализуется один раз и переиспользуется во всех повторах
+        body = json_dumps(payload)
+        
         for attempt in range(retry_count):
             try:
-                response = requests.post(
+                response = self.session.post(
                     f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=60
+                    data=body,
+                    timeout=self.request_timeout
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
-                    return result['choices'][0]['message']['content'].strip()
+                    result = json_loads(response.content)
+                    choice = result['choices'][0]
+                    if choice.get('finish_reason') == 'length':
+                        # Ответ обрезан по max_tokens: повтор даст то же, берем исходный текст части
+                        print(f"⚠️ Ответ обрезан по лимиту {self.max_tokens} токенов, уменьшите --chunk-size")
+                        return None
+                    content = choice['message']['content'].strip()
+                    # Кэшируются только ответы, которые модель закончила сама
+                    if content and self.cache is not None \
+                            and choice.get('finish_reason') == CACHEABLE_FINISH_REASON:
+                        self.cache.put(cache_key, self.model, content)
+                    return content
                 else:
                     print(f"Ошибка API (попытка {attempt + 1}): {response.status_code}")
                     if attempt < retry_count - 1:
@@ -157,49 +270,51 @@ class TextProcessor:
         
         return None
     
-    def process_text_file(self, input_file: str, output_file: str, chunk_size: int = 3000) -> bool:
+    def process_text_file(self, input_file: str, output_file: str, chunk_size: Optional[int] = None) -> bool:
         """
         Обрабатывает весь текстовый файл
         
         Args:
             input_file: Путь к входному файлу
             output_file: Путь к выходному файлу
-            chunk_size: Размер части для обработки
+            chunk_size: Размер части для обработки (по умолчанию — по лимиту ответа модели)
             
         Returns:
             True если обработка прошла успешно
         """
         try:
-            # Читаем исходный файл
+            chunk_size = chunk_size or self.default_chunk_size()
+            
+            # Читаем исходный файл блоками и сразу режем на части:
+            # весь текст целиком в памяти не держим
             with open(input_file, 'r', encoding='utf-8') as f:
-                text = f.read()
+                chunks = list(self.iter_chunks(iter(partial(f.read, READ_BLOCK_CHARS), ''), chunk_size))
             
             print(f"📖 Загружен файл: {input_file}")
-            print(f"📊 Размер текста: {len(text):,} символов")
-            
-            # Разбиваем на части
-            chunks = self.split_text_into_chunks(text, chunk_size)
-            print(f"🔪 Разбито на {len(chunks)} частей")
+            print(f"📊 Размер файла: {os.path.getsize(input_file):,} байт")
+            print(f"🔪 Разбито на {len(chunks)} частей (до {chunk_size:,} символов, max_tokens {self.max_tokens})")
             
-            # Обрабатываем каждую часть
+            # Обрабатываем части параллельно: запросы почти целиком состоят из ожидания
+            # сети, а map возвращает результаты в исходном порядке
             processed_chunks = []
+            workers = min(self.max_concurrency, len(chunks)) or 1
+            print(f"⚡ Параллельных запросов: {workers}")
             
-            for i, chunk in enumerate(chunks, 1):
+            def process(numbered_chunk):
+                i, chunk = numbered_chunk
                 print(f"🔄 Обрабатываю часть {i}/{len(chunks)} ({len(chunk)} символов)...")
-                
-                processed_chunk = self.process_chunk_with_ai(chunk)
-                
-                if processed_chunk:
-                    processed_chunks.append(processed_chunk)
-                    print(f"✅ Часть {i} обработана успешно")
-                else:
-                    print(f"❌ Ошибка обработки части {i}")
-                    # Добавляем исходный текст если обработка не удалась
-                    processed_chunks.append(chunk)
-                
-                # Пауза между запросами
-                if i < len(chunks):
-                    time.sleep(1)
+                return self.process_chunk_with_ai(chunk)
+            
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(process, enumerate(chunks, 1))
+                for i, (chunk, processed_chunk) in enumerate(zip(chunks, results), 1):
+                    if processed_chunk:
+                        processed_chunks.append(processed_chunk)
+                        print(f"✅ Часть {i} обработана успешно")
+                    else:
+                        print(f"❌ Ошибка обработки части {i}")
+                        # Добавляем исходный текст если обработка не удалась
+                        processed_chunks.append(chunk)
             
             # Объединяем обработанные части
             final_text = "\n\n[PAUSE]\n\n".join(processed_chunks)
@@ -236,8 +351,12 @@ def main():
     parser.add_argument('--api-key', help='API ключ OpenRouter (или переменная OPENROUTER_API_KEY)')
     parser.add_argument('--model', default='anthropic/claude-3.5-sonnet', 
                        help='Модель для использования')
-    parser.add_argument('--chunk-size', type=int, default=3000,
-                       help='Размер части текста для обработки')
+    parser.add_argument('--chunk-size', type=int,
+                       help='Размер части текста для обработки (по умолчанию — по лимиту ответа модели)')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('MAX_CONCURRENCY', '4')),
+                       help='Сколько частей обрабатывать одновременно (или переменная MAX_CONCURRENCY)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Не использовать кэш обработанных частей')
     
     args = parser.parse_args()
     
@@ -254,13 +373,12 @@ def main():
         return 1
     
     # Создаем процессор и обрабатываем
-    processor = TextProcessor(api_key, args.model)
-    
-    success = processor.process_text_file(
-        args.input_file, 
-        args.output, 
-        args.chunk_size
-    )
+    with TextProcessor(api_key, args.model, args.concurrency, not args.no_cache) as processor:
+        success = processor.process_text_file(
+            args.input_file, 
+            args.output, 
+            args.chunk_size
+        )
     
     return 0 if success else 1
 
@@ -3,6 +3,7 @@
 
 from .text_splitter import (
     split_text_into_chunks,
+    iter_text_chunks,
     split_by_sentences,
     get_chunk_stats,
     SplitConfig,
@@ -12,6 +13,8 @@ from .text_splitter import (
 from .config_loader import (
     ConfigLoader,
     ModelConfig,
+    EnvConfigMixin,
+    find_env_file,
     get_config,
 )
 
@@ -22,6 +25,12 @@ from .openrouter_client import (
     get_client,
 )
 
+from .text_normalize import normalize_for_cache
+
+from .rate_limiter import TokenBucketLimiter, rate_limits_from_env
+
+from .llm_session import LLMSessionProcessor
+
 from .base_processor import (
     BaseProcessor,
     ProcessingReport,
@@ -31,6 +40,7 @@ from .base_processor import (
 __all__ = [
     # Text splitting
     'split_text_into_chunks',
+    'iter_text_chunks',
     'split_by_sentences',
     'get_chunk_stats',
     'SplitConfig',
@@ -39,6 +49,8 @@ __all__ = [
     # Configuration
     'ConfigLoader',
     'ModelConfig',
+    'EnvConfigMixin',
+    'find_env_file',
     'get_config',
     
     # OpenRouter API
@@ -47,6 +59,16 @@ __all__ = [
     'ChatResponse',
     'get_client',
     
+    # Rate limiting
+    'TokenBucketLimiter',
+    'rate_limits_from_env',
+    
+    # Cache keys
+    'normalize_for_cache',
+    
+    # Session-based LLM processor
+    'LLMSessionProcessor',
+
     # Base processor
     'BaseProcessor',
     'ProcessingReport',
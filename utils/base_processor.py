@@ -26,8 +26,9 @@ import os
 import sys
 import time
 import logging
+import threading
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Callable
+from typing import Optional, List, Dict, Any, Callable, Iterable, Union
 from dataclasses import dataclass, field
 from datetime import datetime
 from abc import ABC, abstractmethod
@@ -138,8 +139,9 @@ class BaseProcessor(ABC):
         # Логирование
         self.logger = self._setup_logging(log_level)
 
-        # Статистика
+        # Статистика; call_api может вызываться из нескольких потоков
         self._report = ProcessingReport()
+        self._report_lock = threading.Lock()
 
     def _setup_logging(self, level: int) -> logging.Logger:
         """Настраивает логирование."""
@@ -195,15 +197,32 @@ class BaseProcessor(ABC):
 
         return text
 
-    def write_file(self, file_path: str, content: str) -> None:
-        """Записывает текст в файл."""
+    def write_file(self, file_path: str, content: Union[str, Iterable[str]]) -> None:
+        """
+        Записывает текст в файл.
+
+        content может быть строкой или последовательностью частей текста:
+        части пишутся по очереди, без склейки документа в одну строку.
+        Части пишутся во временный .part файл, который заменяет итоговый
+        только после записи последней части.
+        """
         path = Path(file_path)
         path.parent.mkdir(parents=True, exist_ok=True)
 
         self.logger.info(f"💾 Запись файла: {file_path}")
-        path.write_text(content, encoding='utf-8')
+        if isinstance(content, str):
+            path.write_text(content, encoding='utf-8')
+            size = len(content)
+        else:
+            size = 0
+            part_path = path.with_name(path.name + '.part')
+            with open(part_path, 'w', encoding='utf-8') as f:
+                for part in content:
+                    f.write(part)
+                    size += len(part)
+            os.replace(part_path, path)
         self._report.output_file = str(path)
-        self._report.output_size = len(content)
+        self._report.output_size = size
 
     # === Методы для API-вызовов ===
 
@@ -213,7 +232,8 @@ class BaseProcessor(ABC):
         system: Optional[str] = None,
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
-        retry_count: int = 3
+        retry_count: int = 3,
+        model: Optional[str] = None
     ) -> str:
         """
         Выполняет API-вызов с retry-логикой.
@@ -224,6 +244,7 @@ class BaseProcessor(ABC):
             max_tokens: Максимум токенов
             temperature: Температура
             retry_count: Количество попыток
+            model: Модель (по умолчанию модель клиента)
 
         Returns:
             Текст ответа
@@ -235,21 +256,10 @@ class BaseProcessor(ABC):
 
         for attempt in range(retry_count):
             try:
-                if system:
-                    result = self.client.chat_with_system(
-                        system=system,
-                        user=prompt,
-                        max_tokens=max_tokens,
-                        temperature=temperature
-                    )
-                else:
-                    result = self.client.chat(
-                        user_message=prompt,
-                        max_tokens=max_tokens,
-                        temperature=temperature
-                    )
-
-                self._report.api_calls += 1
+                result = self._request(prompt, system, max_tokens, temperature, model)
+
+                with self._report_lock:
+                    self._report.api_calls += 1
                 return result
 
             except Exception as e:
@@ -264,6 +274,39 @@ class BaseProcessor(ABC):
         self._report.errors.append(str(last_error))
         raise last_error
 
+    def _request(
+        self,
+        prompt: str,
+        system: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str] = None
+    ) -> str:
+        """
+        Один запрос к API без повторов; токены ответа добавляются в отчёт процессора.
+
+        Клиент (get_client) общий для всех процессоров, поэтому его total_tokens
+        не годится для отчёта: при параллельной работе в нём и чужие запросы.
+        """
+        messages = []
+        if system:
+            # Системный промпт с cache_control, как в OpenRouterClient.chat_with_system
+            messages.append({
+                "role": "system",
+                "content": [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+            })
+        messages.append({"role": "user", "content": prompt})
+
+        response = self.client.chat_messages(
+            messages,
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        with self._report_lock:
+            self._report.tokens_used += response.usage.get('total_tokens', 0)
+        return response.content
+
     def process_chunks(
         self,
         chunks: List[str],
@@ -318,7 +361,6 @@ class BaseProcessor(ABC):
     ) -> ProcessingReport:
         """Создаёт отчёт о выполнении."""
         self._report.end_time = datetime.now()
-        self._report.tokens_used = self.client.total_tokens
 
         if input_file:
             self._report.input_file = input_file
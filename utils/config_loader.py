@@ -14,8 +14,9 @@
 """
 
 import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Optional, Dict, List
+from typing import Any, Optional, Dict, List, Mapping, Set, Tuple
 from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
@@ -324,6 +325,51 @@ def get_config(config_file: Optional[str] = None, reload: bool = False) -> Confi
     return _global_config
 
 
+# Файлы, которые ищут процессоры со своим load_config (порядок как в их коде)
+PROCESSOR_ENV_FILES = ('.env', 'config.env', 'settings.env')
+
+
+@lru_cache(maxsize=8)
+def find_env_file(
+    config_file: Optional[str] = None,
+    candidates: Tuple[str, ...] = PROCESSOR_ENV_FILES
+) -> Optional[str]:
+    """
+    Находит файл конфигурации: указанный явно или первый существующий из candidates.
+
+    Результат кэшируется на процесс, чтобы не проверять файловую систему
+    при создании каждого нового процессора.
+    """
+    if config_file and Path(config_file).exists():
+        return config_file
+    for env_file in candidates:
+        if Path(env_file).exists():
+            return env_file
+    return None
+
+
+class EnvConfigMixin:
+    """
+    Миксин для процессоров, читающих настройки через os.getenv.
+
+    .env файл разбирается один раз на процесс; значения всегда читаются
+    из текущего os.environ, поэтому последующие изменения окружения
+    (full_pipeline, тесты) видны новым экземплярам.
+    """
+
+    # Пути .env файлов, уже загруженных в os.environ
+    _LOADED_ENV_FILES: Set[Optional[str]] = set()
+
+    def env_snapshot(self, config_file: Optional[str] = None) -> Mapping[str, str]:
+        """Загружает .env один раз (load_dotenv без override) и возвращает os.environ."""
+        env_file = find_env_file(config_file)
+        if env_file not in EnvConfigMixin._LOADED_ENV_FILES:
+            if env_file:
+                load_dotenv(env_file)
+            EnvConfigMixin._LOADED_ENV_FILES.add(env_file)
+        return os.environ
+
+
 # === CLI интерфейс для отладки ===
 if __name__ == "__main__":
     import argparse
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Быстрая сериализация JSON для запросов к LLM API.
+
+Использует orjson, если он установлен (pip install orjson), иначе стандартный json.
+Тело запроса всегда кодируется в UTF-8 без \\u-экранирования кириллицы.
+
+Использование:
+    from utils.fast_json import json_dumps, json_loads
+
+    body = json_dumps(payload)            # bytes для data=
+    result = json_loads(response.content)
+"""
+
+import json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def json_dumps(obj) -> bytes:
+    """Сериализует тело запроса в байты UTF-8 (orjson, если установлен)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def json_loads(data):
+    """Разбирает тело ответа или строку SSE (orjson, если установлен)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
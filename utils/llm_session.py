@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Общая основа для процессоров, которые сами ходят в OpenRouter через requests.Session.
+
+Предоставляет:
+- Загрузку настроек из .env (один разбор на процесс, см. EnvConfigMixin)
+- HTTP-сессию с пулом соединений и повторами urllib3 на 429/5xx
+- Кэш ответов: LRU в памяти на время запуска и SQLite на диске
+- Потоковую запись ответа в файл
+
+Использование:
+    from utils.llm_session import LLMSessionProcessor
+
+    class MyProcessor(LLMSessionProcessor):
+        X_TITLE = "My Processor"
+
+        def run(self, text: str) -> str:
+            return self.call_llm(text, system="Инструкции...")
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config_loader import EnvConfigMixin
+from .fast_json import json_dumps, json_loads
+from .sse import iter_sse_chunks, delta_content
+from .response_cache import CACHEABLE_FINISH_REASON, ResponseCache, response_cache_key
+
+
+# Кэш ответов в памяти на время одного запуска (работает при любой температуре)
+MEMORY_CACHE_SIZE = 128
+
+
+class LLMSessionProcessor(EnvConfigMixin):
+    """
+    Базовый класс процессора с собственной сессией OpenRouter и кэшем ответов.
+
+    Наследники задают заголовки и умолчания через атрибуты класса
+    и при необходимости дополняют load_config.
+    """
+
+    BASE_URL = "https://openrouter.ai/api/v1"
+    HTTP_REFERER = "https://github.com/NikasAl/creator"
+    X_TITLE = "Creator Processor"
+    DEFAULT_TEMPERATURE = "0.7"
+    DEFAULT_MAX_TOKENS = "3000"
+
+    def __init__(self, config_file: str = None):
+        """Инициализация процессора с загрузкой конфигурации"""
+        self.load_config(config_file)
+        if not self.api_key:
+            raise ValueError("API ключ OpenRouter не найден в конфигурации")
+
+        self.base_url = self.BASE_URL
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": self.HTTP_REFERER,
+            "X-Title": self.X_TITLE
+        }
+
+        # Одна сессия на процессор: TLS-соединение с OpenRouter переиспользуется между запросами.
+        # Повторы на 429/5xx выполняет urllib3 с учетом заголовка Retry-After.
+        retry = Retry(
+            total=3,
+            backoff_factor=1,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+
+        # Неизменная часть тела запроса; на каждый вызов добавляются только model и messages
+        self._payload_base = {"temperature": self.temperature, "max_tokens": self.max_tokens}
+
+        self._cache_lock = threading.Lock()
+        self._memory_cache: "OrderedDict[str, str]" = OrderedDict()
+        # Дисковый кэш общий с другими процессорами (политика и путь — в utils.response_cache)
+        self.cache = ResponseCache.open(self.cache_path, self.temperature)
+
+    def close(self):
+        """Закрывает HTTP-сессию и кэш ответов"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def load_config(self, config_file: str = None):
+        """Загружает конфигурацию из .env файла (разбирается один раз на процесс)"""
+        env = self.env_snapshot(config_file)
+        self.api_key = env.get("OPENROUTER_API_KEY")
+        self.model = env.get("DEFAULT_MODEL", "anthropic/claude-3.5-sonnet")
+        self.temperature = float(env.get("DEFAULT_TEMPERATURE", self.DEFAULT_TEMPERATURE))
+        self.max_tokens = int(env.get("DEFAULT_MAX_TOKENS", self.DEFAULT_MAX_TOKENS))
+        self.budget_model = env.get("BUDGET_MODEL", "meta-llama/llama-3.1-8b-instruct")
+        self.quality_model = env.get("QUALITY_MODEL", "openai/gpt-4o")
+        self.cache_path = ResponseCache.path_from_env(env.get)
+
+    def select_model(self, model_choice: str = "default") -> str:
+        """Возвращает имя модели для выбора default/budget/quality"""
+        if model_choice == "budget":
+            return self.budget_model
+        if model_choice == "quality":
+            return self.quality_model
+        return self.model
+
+    def _cache_key(self, model: str, prompt: str) -> str:
+        """Ключ кэша: sha256 от модели, температуры и полного текста промпта"""
+        return response_cache_key(model, self.temperature, prompt)
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Возвращает ответ из памяти или из дискового кэша, если он есть и не устарел"""
+        with self._cache_lock:
+            response = self._memory_cache.get(key)
+            if response is not None:
+                self._memory_cache.move_to_end(key)
+                return response
+        if self.cache is None:
+            return None
+        response = self.cache.get(key)
+        if response is not None:
+            self._remember(key, response)
+        return response
+
+    def _remember(self, key: str, response: str):
+        """Кладет ответ в LRU-кэш в памяти, вытесняя самый старый"""
+        with self._cache_lock:
+            self._memory_cache[key] = response
+            self._memory_cache.move_to_end(key)
+            if len(self._memory_cache) > MEMORY_CACHE_SIZE:
+                self._memory_cache.popitem(last=False)
+
+    def _cache_put(self, key: str, model: str, response: str):
+        """Сохраняет ответ в память и в дисковый кэш"""
+        self._remember(key, response)
+        if self.cache is not None:
+            self.cache.put(key, model, response)
+
+    @staticmethod
+    def _build_messages(user_text: str, system: Optional[str] = None) -> List[Dict]:
+        """Собирает messages: стабильный system-блок (кэшируемый) и динамическая user-часть"""
+        messages = []
+        if system:
+            messages.append({
+                "role": "system",
+                "content": [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}],
+            })
+        messages.append({"role": "user", "content": user_text})
+        return messages
+
+    @staticmethod
+    def _write_stream(resp: requests.Response, output_path: Path) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Читает SSE-поток ответа и пишет токены в файл по мере поступления.
+
+        Запись идет во временный .part файл, который заменяет итоговый только
+        при непустом результате, поэтому оборванный поток не портит прошлый результат.
+
+        Returns:
+            Текст ответа (None, если он пуст) и finish_reason из последнего фрагмента
+        """
+        tmp_path = output_path.with_name(output_path.name + ".part")
+        parts: List[str] = []
+        finish_reason = None
+        with resp, open(tmp_path, "w", encoding="utf-8") as out:
+            for chunk in iter_sse_chunks(resp):
+                choices = chunk.get("choices") or []
+                if choices:
+                    finish_reason = choices[0].get("finish_reason") or finish_reason
+                delta = delta_content(chunk)
+                if not delta:
+                    continue
+                if not parts:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                out.write(delta)
+                parts.append(delta)
+
+        content = "".join(parts).strip()
+        if not content:
+            tmp_path.unlink(missing_ok=True)
+            return None, finish_reason
+        os.replace(tmp_path, output_path)
+        return content, finish_reason
+
+    def call_llm(self, user_text: str, model_choice: str = "default", system: Optional[str] = None,
+                 output_path: Optional[Path] = None) -> str:
+        """
+        Отправляет запрос к LLM и возвращает текст ответа.
+
+        system уходит отдельным блоком с cache_control. Если передан output_path,
+        ответ запрашивается потоком и пишется в файл по мере генерации.
+        При ошибке API или пустом ответе бросает RuntimeError.
+        """
+        model = self.select_model(model_choice)
+        print(f"🔍 Используемая модель: {model}")
+
+        cache_key = self._cache_key(model, f"{system or ''}\n{user_text}")
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            print("💾 Ответ взят из кэша")
+            if output_path:
+                output_path.write_text(cached, encoding="utf-8")
+            return cached
+
+        payload = {
+            **self._payload_base,
+            "model": model,
+            "messages": self._build_messages(user_text, system),
+        }
+        if output_path:
+            payload["stream"] = True
+
+        try:
+            resp = self.session.post(
+                f"{self.base_url}/chat/completions",
+                data=json_dumps(payload),
+                timeout=120,
+                stream=bool(output_path)
+            )
+        except requests.RequestException as e:
+            raise RuntimeError(f"Не удалось получить ответ от LLM: {e}") from e
+
+        if resp.status_code != 200:
+            raise RuntimeError(f"Ошибка API {resp.status_code}: {resp.text}")
+
+        try:
+            if output_path:
+                content, finish_reason = self._write_stream(resp, output_path)
+            else:
+                choice = json_loads(resp.content)["choices"][0]
+                content = choice["message"]["content"].strip()
+                finish_reason = choice.get("finish_reason")
+        except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+            raise RuntimeError(f"Некорректный ответ LLM: {e}") from e
+        if not content:
+            raise RuntimeError("LLM вернула пустой ответ")
+
+        # Обрезанный по max_tokens ответ возвращается, но не кэшируется
+        if finish_reason == CACHEABLE_FINISH_REASON:
+            self._cache_put(cache_key, model, content)
+        return content
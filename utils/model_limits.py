@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Лимиты длины ответа моделей OpenRouter.
+
+max_tokens в запросе не может превышать лимит ответа модели: иначе провайдер
+отклоняет запрос или молча обрезает ответ. Процессоры берут отсюда лимит,
+чтобы подобрать размер частей и пакетов.
+
+Использование:
+    from utils.model_limits import max_output_tokens
+
+    limit = max_output_tokens("openai/gpt-4o")   # 16384
+"""
+
+from typing import Dict
+
+# Лимит ответа для моделей, которых нет в таблице (токенов)
+DEFAULT_MAX_TOKENS = 4000
+
+# Известные лимиты ответа моделей (токенов)
+MODEL_MAX_OUTPUT_TOKENS: Dict[str, int] = {
+    "anthropic/claude-3.5-sonnet": 8192,
+    "anthropic/claude-3.5-haiku": 8192,
+    "openai/gpt-4o": 16384,
+    "openai/gpt-4o-mini": 16384,
+}
+
+
+def max_output_tokens(model: str, default: int = DEFAULT_MAX_TOKENS) -> int:
+    """Возвращает лимит ответа модели или default, если модель неизвестна"""
+    return MODEL_MAX_OUTPUT_TOKENS.get(model, default)
@@ -15,13 +15,16 @@
 
 import os
 import time
-import json
+import threading
 import requests
 from typing import Optional, Dict, List, Any, Generator
 from dataclasses import dataclass
 from pathlib import Path
 
 from .config_loader import ConfigLoader, get_config
+from .fast_json import json_dumps
+from .rate_limiter import TokenBucketLimiter
+from .sse import iter_sse_deltas
 
 
 @dataclass
@@ -115,10 +118,14 @@ class OpenRouterClient:
             **or_config['headers']
         }
 
-        # Статистика
+        # Лимиты RPM_LIMIT/TPM_LIMIT на все потоки, использующие клиент (0 — без лимита)
+        self.rate_limiter = TokenBucketLimiter.from_env(self.config.get)
+
+        # Статистика; клиент общий для потоков процессоров, счетчики меняются под блокировкой
         self.total_requests = 0
         self.total_tokens = 0
         self.total_cost = 0.0
+        self._stats_lock = threading.Lock()
 
     def _make_request(
         self,
@@ -154,22 +161,26 @@ class OpenRouterClient:
             "temperature": temperature,
             **kwargs
         }
+        # Тело сериализуется один раз и переиспользуется во всех повторах
+        body = json_dumps(payload)
 
         last_error = None
 
         for attempt in range(self.MAX_RETRIES):
+            self.rate_limiter.acquire()
             try:
                 response = requests.post(
                     f"{self.base_url}/chat/completions",
                     headers=self.headers,
-                    json=payload,
+                    data=body,
                     timeout=120,
                     stream=stream
                 )
 
                 # Успешный ответ
                 if response.status_code == 200:
-                    self.total_requests += 1
+                    with self._stats_lock:
+                        self.total_requests += 1
                     return response
 
                 # Обработка ошибок
@@ -179,12 +190,17 @@ class OpenRouterClient:
                 except:
                     pass
 
-                # Rate limit - ждём дольше
+                # Rate limit - ждём, сколько просит сервер, иначе экспоненциально
                 if response.status_code == 429:
-                    retry_after = response.headers.get('Retry-After', 60)
-                    wait_time = int(retry_after) if retry_after.isdigit() else 60
-                    print(f"⚠️ Rate limited. Ждём {wait_time} секунд...")
-                    time.sleep(wait_time)
+                    last_error = "Rate limited"
+                    if attempt < self.MAX_RETRIES - 1:
+                        retry_after = response.headers.get('Retry-After', '')
+                        if retry_after.isdigit():
+                            wait_time = int(retry_after)
+                        else:
+                            wait_time = self.RETRY_DELAY * (2 ** attempt)
+                        print(f"⚠️ Rate limited. Ждём {wait_time} секунд...")
+                        time.sleep(wait_time)
                     continue
 
                 # Ошибка авторизации - не retry
@@ -246,7 +262,8 @@ class OpenRouterClient:
 
         # Обновляем статистику
         if 'usage' in data:
-            self.total_tokens += data['usage'].get('total_tokens', 0)
+            with self._stats_lock:
+                self.total_tokens += data['usage'].get('total_tokens', 0)
 
         return content
 
@@ -272,8 +289,13 @@ class OpenRouterClient:
         Returns:
             Текст ответа
         """
+        # Системный промпт обычно общий для серии запросов: cache_control позволяет
+        # провайдеру (Anthropic через OpenRouter) переиспользовать его как префикс
         messages = [
-            {"role": "system", "content": system},
+            {
+                "role": "system",
+                "content": [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+            },
             {"role": "user", "content": user}
         ]
         response = self._make_request(messages, model, max_tokens, temperature, **kwargs)
@@ -282,7 +304,8 @@ class OpenRouterClient:
         content = data['choices'][0]['message']['content']
 
         if 'usage' in data:
-            self.total_tokens += data['usage'].get('total_tokens', 0)
+            with self._stats_lock:
+                self.total_tokens += data['usage'].get('total_tokens', 0)
 
         return content
 
@@ -325,7 +348,8 @@ class OpenRouterClient:
         response_model = data.get('model', model or self.default_model)
 
         if usage:
-            self.total_tokens += usage.get('total_tokens', 0)
+            with self._stats_lock:
+                self.total_tokens += usage.get('total_tokens', 0)
 
         return ChatResponse(
             content=content,
@@ -352,21 +376,8 @@ class OpenRouterClient:
         messages = [{"role": "user", "content": user_message}]
         response = self._make_request(messages, model, max_tokens, temperature, stream=True, **kwargs)
 
-        for line in response.iter_lines():
-            if line:
-                line = line.decode('utf-8')
-                if line.startswith('data: '):
-                    data_str = line[6:]
-                    if data_str == '[DONE]':
-                        break
-                    try:
-                        data = json.loads(data_str)
-                        if 'choices' in data and len(data['choices']) > 0:
-                            delta = data['choices'][0].get('delta', {})
-                            if 'content' in delta:
-                                yield delta['content']
-                    except json.JSONDecodeError:
-                        continue
+        with response:
+            yield from iter_sse_deltas(response)
 
     def get_stats(self) -> Dict[str, Any]:
         """Возвращает статистику использования."""
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Вывод сообщений процессоров о ходе обработки частей.
+
+Рабочие потоки пишут в логгер модуля процессора, а не через print: записи
+копятся в MemoryHandler и выводятся в stdout пачками, предупреждения и ошибки —
+сразу. Обработчик подключается при создании процессора, поэтому сообщения
+видны и при вызове процессора из другого кода (например, full_pipeline),
+а не только из его CLI.
+
+Использование:
+    from utils.progress_log import attach_progress_handler, flush_progress
+
+    logger = logging.getLogger(__name__)
+    attach_progress_handler(logger)     # в __init__ процессора
+    logger.info("🔄 Обрабатываю часть %d/%d...", i, total)
+    flush_progress(logger)              # перед выводом итоговой статистики
+"""
+
+import sys
+import logging
+import logging.handlers
+
+# Сколько записей копится перед выводом
+PROGRESS_BUFFER_SIZE = 64
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """StreamHandler, который пишет в текущий sys.stdout (его могут подменить после настройки)"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _ProgressHandler(logging.handlers.MemoryHandler):
+    """Буфер сообщений о частях; отличается от сторонних обработчиков по типу"""
+
+
+def attach_progress_handler(logger: logging.Logger, level: int = logging.INFO) -> logging.Handler:
+    """
+    Подключает к логгеру буферизованный вывод в stdout, если он еще не подключен.
+
+    Уровень задается только при первом подключении: так CLI может заранее
+    выбрать подробность вывода, а созданный позже процессор ее не сбросит.
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, _ProgressHandler):
+            return handler
+    target = _StdoutHandler()
+    target.setFormatter(logging.Formatter('%(message)s'))
+    handler = _ProgressHandler(PROGRESS_BUFFER_SIZE, flushLevel=logging.WARNING, target=target)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return handler
+
+
+def flush_progress(logger: logging.Logger):
+    """Выводит накопленные сообщения (например, перед итоговой статистикой)"""
+    for handler in logger.handlers:
+        handler.flush()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Общий ограничитель частоты запросов к LLM API (token bucket).
+
+Лимиты задаются одинаково для всех процессоров и клиента OpenRouter:
+    RPM_LIMIT — запросов в минуту (по умолчанию 40)
+    TPM_LIMIT — токенов в минуту (по умолчанию 0)
+Значение 0 отключает соответствующее ограничение.
+
+Использование:
+    from utils.rate_limiter import TokenBucketLimiter
+
+    limiter = TokenBucketLimiter.from_env()
+    limiter.acquire(estimated_tokens)
+"""
+
+import os
+import time
+import threading
+from typing import Callable, Optional, Tuple
+
+RPM_LIMIT_VAR = 'RPM_LIMIT'
+TPM_LIMIT_VAR = 'TPM_LIMIT'
+DEFAULT_RPM_LIMIT = 40
+DEFAULT_TPM_LIMIT = 0
+
+
+def rate_limits_from_env(getenv: Callable[[str], Optional[str]] = os.getenv) -> Tuple[int, int]:
+    """
+    Читает лимиты (rpm, tpm) из переменных RPM_LIMIT и TPM_LIMIT.
+
+    getenv — источник значений: os.getenv или ConfigLoader.get.
+    """
+    rpm = getenv(RPM_LIMIT_VAR)
+    tpm = getenv(TPM_LIMIT_VAR)
+    rpm = DEFAULT_RPM_LIMIT if rpm in (None, '') else int(rpm)
+    tpm = DEFAULT_TPM_LIMIT if tpm in (None, '') else int(tpm)
+    return max(0, rpm), max(0, tpm)
+
+
+class TokenBucketLimiter:
+    """
+    Проактивный ограничитель частоты запросов к API
+
+    Ведет два ведра емкостью в минутный лимит: запросов и токенов. Емкость
+    восполняется пропорционально прошедшему времени, а перед запросом
+    списывается оценка его стоимости; ждать приходится ровно столько,
+    сколько нужно до восполнения. Лимит 0 отключает соответствующее ведро.
+    Один экземпляр безопасно делится между потоками.
+    """
+
+    def __init__(self, rpm_limit: int, tpm_limit: int = 0):
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self._avail_req_capacity = float(rpm_limit)
+        self._avail_tok_capacity = float(tpm_limit)
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, getenv: Callable[[str], Optional[str]] = os.getenv) -> "TokenBucketLimiter":
+        """Создает ограничитель по RPM_LIMIT и TPM_LIMIT"""
+        return cls(*rate_limits_from_env(getenv))
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_update
+        self._last_update = now
+        if self.rpm_limit:
+            self._avail_req_capacity = min(self.rpm_limit, self._avail_req_capacity + elapsed * self.rpm_limit / 60)
+        if self.tpm_limit:
+            self._avail_tok_capacity = min(self.tpm_limit, self._avail_tok_capacity + elapsed * self.tpm_limit / 60)
+
+    def acquire(self, tokens: int = 0):
+        """Блокирует поток, пока в ведрах не хватит емкости на один запрос и tokens токенов"""
+        # Запрос крупнее всего минутного лимита иначе не прошел бы никогда
+        if self.tpm_limit:
+            tokens = min(tokens, self.tpm_limit)
+        while True:
+            with self._lock:
+                self._refill()
+                wait = 0.0
+                if self.rpm_limit and self._avail_req_capacity < 1:
+                    wait = (1 - self._avail_req_capacity) * 60 / self.rpm_limit
+                if self.tpm_limit and self._avail_tok_capacity < tokens:
+                    wait = max(wait, (tokens - self._avail_tok_capacity) * 60 / self.tpm_limit)
+                if wait == 0:
+                    if self.rpm_limit:
+                        self._avail_req_capacity -= 1
+                    if self.tpm_limit:
+                        self._avail_tok_capacity -= tokens
+                    return
+            time.sleep(wait)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Общий дисковый кэш ответов LLM (SQLite).
+
+Одна политика для всех процессоров:
+- кэш лежит в рабочем каталоге: LLM_CACHE_PATH (по умолчанию .llm_cache.sqlite);
+- при температуре выше CACHE_MAX_TEMPERATURE ответы стохастические и не кэшируются;
+- записи старше CACHE_TTL_SECONDS не используются;
+- кэшируются только ответы, которые модель закончила сама (finish_reason "stop").
+
+Кэш используют text_processor, smart_text_processor, summary_processor,
+promo_description_processor и utils.llm_session (questions и promo_experimental).
+
+Использование:
+    from utils.response_cache import ResponseCache, response_cache_key
+
+    cache = ResponseCache.open(ResponseCache.path_from_env(), temperature)  # None — кэш выключен
+    key = response_cache_key(model, temperature, prompt)
+    text = cache.get(key) if cache else None
+"""
+
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+CACHE_PATH_VAR = "LLM_CACHE_PATH"
+DEFAULT_CACHE_PATH = ".llm_cache.sqlite"
+CACHE_MAX_TEMPERATURE = 0.3
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Ответ, который модель закончила сама, а не обрезала по max_tokens или фильтру
+CACHEABLE_FINISH_REASON = "stop"
+
+
+def response_cache_key(model: str, temperature: float, prompt: str) -> str:
+    """Ключ кэша: sha256 от модели, температуры и полного текста промпта"""
+    return hashlib.sha256(f"{model}|{temperature}|{prompt}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Потокобезопасный SQLite-кэш ответов с ограниченным сроком жизни записей"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, model TEXT, created REAL, response TEXT)"
+        )
+
+    @staticmethod
+    def path_from_env(getenv: Callable[[str], Optional[str]] = os.getenv) -> Path:
+        """Путь к кэшу из LLM_CACHE_PATH (os.getenv, ConfigLoader.get или dict.get)"""
+        return Path(getenv(CACHE_PATH_VAR) or DEFAULT_CACHE_PATH)
+
+    @classmethod
+    def open(cls, path: Path, temperature: float) -> Optional["ResponseCache"]:
+        """Открывает кэш; при высокой температуре возвращает None"""
+        if temperature > CACHE_MAX_TEMPERATURE:
+            return None
+        return cls(path)
+
+    def get(self, key: str) -> Optional[str]:
+        """Возвращает ответ, если он есть и не устарел"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row and time.time() - row[1] <= CACHE_TTL_SECONDS:
+            return row[0]
+        return None
+
+    def put(self, key: str, model: str, response: str):
+        """Сохраняет ответ"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, created, response) VALUES (?, ?, ?, ?)",
+                (key, model, time.time(), response),
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Закрывает соединение с базой"""
+        with self._lock:
+            self._conn.close()
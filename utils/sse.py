@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Чтение потоковых ответов chat/completions (Server-Sent Events).
+
+При stream=True OpenRouter присылает ответ строками "data: {...}" с фрагментами
+delta.content и завершает поток строкой "data: [DONE]"; статистика usage
+приходит в последнем фрагменте, finish_reason — в последнем фрагменте с choices.
+
+Использование:
+    from utils.sse import iter_sse_deltas, read_sse_stream
+
+    text, usage, finish_reason = read_sse_stream(response)   # собрать ответ целиком
+
+    for delta in iter_sse_deltas(response):   # или обрабатывать по мере генерации
+        out.write(delta)
+"""
+
+from typing import Dict, Iterator, Optional, Tuple
+
+from .fast_json import json_loads
+
+
+def iter_sse_chunks(response) -> Iterator[Dict]:
+    """Отдает разобранные JSON-фрагменты потока до [DONE]; битые строки пропускаются"""
+    for line in response.iter_lines():
+        if not line or not line.startswith(b"data: "):
+            continue
+        data = line[6:]
+        if data == b"[DONE]":
+            break
+        try:
+            yield json_loads(data)
+        except ValueError:
+            continue
+
+
+def delta_content(chunk: Dict) -> Optional[str]:
+    """Текст фрагмента delta.content или None"""
+    choices = chunk.get("choices") or []
+    return choices[0].get("delta", {}).get("content") if choices else None
+
+
+def iter_sse_deltas(response) -> Iterator[str]:
+    """Отдает непустые фрагменты текста ответа по мере поступления"""
+    for chunk in iter_sse_chunks(response):
+        delta = delta_content(chunk)
+        if delta:
+            yield delta
+
+
+def read_sse_stream(response) -> Tuple[str, Optional[Dict], Optional[str]]:
+    """
+    Читает поток до конца и закрывает ответ.
+
+    Returns:
+        Текст ответа без крайних пробелов, статистика usage (None, если ее не было)
+        и finish_reason из последнего фрагмента, где он был
+    """
+    parts = []
+    usage = None
+    finish_reason = None
+    with response:
+        for chunk in iter_sse_chunks(response):
+            usage = chunk.get("usage") or usage
+            choices = chunk.get("choices") or []
+            if choices:
+                finish_reason = choices[0].get("finish_reason") or finish_reason
+            delta = delta_content(chunk)
+            if delta:
+                parts.append(delta)
+    return "".join(parts).strip(), usage, finish_reason
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Чтение начала текстовых файлов без загрузки их целиком.
+
+Процессоры, собирающие контекст из файлов пайплайна, обычно берут только
+первые N символов каждого файла: с диска читается и декодируется лишь
+ограниченный по байтам префикс (у очень больших файлов — через mmap).
+
+Использование:
+    from utils.text_files import read_text_prefix
+
+    text = read_text_prefix(Path("book.txt"), max_chars=15000)
+"""
+
+import mmap
+from pathlib import Path
+
+# Файлы крупнее этого порога читаются через mmap только на длину нужного префикса
+MMAP_THRESHOLD = 1 << 20
+
+
+def _decode_prefix(read_prefix, size: int, limit: int, max_chars: int) -> str:
+    """
+    Декодирует первые max_chars символов файла после ведущих пробелов.
+
+    read_prefix(n) возвращает первые n байт файла. Если ведущие пробелы съели
+    часть префикса, он удваивается, пока символов не хватит или файл не кончится.
+    """
+    while True:
+        text = read_prefix(limit).decode("utf-8", errors="ignore")
+        if limit >= size:
+            return text.strip()
+        text = text.lstrip()
+        if len(text) >= max_chars:
+            return text[:max_chars]
+        limit *= 2
+
+
+def read_text_prefix(fp: Path, max_chars: int) -> str:
+    """
+    Читает текст файла без крайних пробелов, но не больше max_chars символов.
+
+    Если файл заведомо длиннее нужного, с диска читается и декодируется только
+    ограниченный по байтам префикс (у очень больших файлов — через mmap).
+    """
+    if max_chars <= 0:
+        return ""
+    size = fp.stat().st_size
+    # В UTF-8 символ занимает не больше 4 байт
+    limit = max_chars * 4
+    if size <= limit:
+        return fp.read_text(encoding="utf-8", errors="ignore").strip()
+    with open(fp, "rb") as f:
+        if size > MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _decode_prefix(lambda n: mm[:n], size, limit, max_chars)
+
+        def read_prefix(n: int) -> bytes:
+            f.seek(0)
+            return f.read(n)
+
+        return _decode_prefix(read_prefix, size, limit, max_chars)
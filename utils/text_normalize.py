@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Нормализация текста для ключей кэша ответов LLM.
+
+Части текста, которые отличаются только невидимыми символами, формой Unicode
+или лишними пробелами, получают один ключ. Что еще сводится к одному ключу,
+выбирает вызывающий процессор: это зависит от того, переносит ли ответ
+разметку и типографику исходного текста.
+
+Использование:
+    from utils.text_normalize import normalize_for_cache
+
+    key_text = normalize_for_cache(chunk)  # переносы строк сохраняются
+    key_text = normalize_for_cache(chunk, keep_line_breaks=False, fold_typography=True)
+"""
+
+import re
+import unicodedata
+
+# Невидимые символы, которые часто остаются после PDF/EPUB: мягкий перенос, нулевой ширины, BOM
+_INVISIBLE_RE = re.compile('[\u00ad\u200b\u200c\u200d\u2060\ufeff]')
+_WS_RUN_RE = re.compile(r'\s+')
+# Пробелы и табы внутри строки; пробелы по краям строк; пустые строки между абзацами
+_HSPACE_RUN_RE = re.compile(r'[^\S\n]+')
+_LINE_EDGE_SPACE_RE = re.compile(r' ?\n ?')
+_PARAGRAPH_BREAK_RE = re.compile(r'\n{2,}')
+# Типографские варианты кавычек, тире и буквы ё
+_TYPOGRAPHY_TABLE = str.maketrans({
+    '«': '"', '»': '"', '“': '"', '”': '"', '„': '"',
+    '—': '-', '–': '-', '‑': '-',
+    'ё': 'е', 'Ё': 'Е',
+})
+
+
+def normalize_for_cache(
+    text: str,
+    keep_line_breaks: bool = True,
+    fold_typography: bool = False
+) -> str:
+    """
+    Нормализует текст части для ключа кэша.
+
+    Всегда убирает невидимые символы, приводит Unicode к NFC и схлопывает
+    пробелы и табы внутри строк.
+
+    Args:
+        text: Текст части
+        keep_line_breaks: Сохранять переносы строк и границы абзацев (серии пустых
+            строк сводятся к одной). False — любые пробельные серии становятся одним
+            пробелом; подходит, только если ответ не зависит от разбивки текста
+        fold_typography: Сводить кавычки, тире и ё/е к одному виду; подходит, только
+            если ответ не воспроизводит типографику исходного текста
+
+    Returns:
+        Нормализованный текст (только для ключа, не для отправки в LLM)
+    """
+    text = unicodedata.normalize('NFC', _INVISIBLE_RE.sub('', text))
+    if fold_typography:
+        text = text.translate(_TYPOGRAPHY_TABLE)
+    if not keep_line_breaks:
+        return _WS_RUN_RE.sub(' ', text).strip()
+    text = _LINE_EDGE_SPACE_RE.sub('\n', _HSPACE_RUN_RE.sub(' ', text))
+    return _PARAGRAPH_BREAK_RE.sub('\n\n', text).strip()
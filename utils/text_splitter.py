@@ -12,7 +12,7 @@
 """
 
 import re
-from typing import List, Optional, Callable
+from typing import Iterator, List, Optional, Callable
 from dataclasses import dataclass
 
 
@@ -74,6 +74,60 @@ def split_text_into_chunks(
         # Для LLM-обработки
         chunks = split_text_into_chunks(text, preset='llm_processing')
     """
+    return list(iter_text_chunks(
+        text,
+        max_chars=max_chars,
+        preserve_paragraphs=preserve_paragraphs,
+        split_pattern=split_pattern,
+        sentence_pattern=sentence_pattern,
+        preset=preset
+    ))
+
+
+def _iter_split(pattern: str, text: str) -> Iterator[str]:
+    """Ленивый аналог re.split: выдаёт куски текста между совпадениями по одному."""
+    regex = re.compile(pattern)
+    if regex.groups:
+        # re.split включает в результат группы — сохраняем его поведение
+        yield from regex.split(text)
+        return
+    pos = 0
+    for match in regex.finditer(text):
+        yield text[pos:match.start()]
+        pos = match.end()
+    yield text[pos:]
+
+
+def iter_text_chunks(
+    text: str,
+    max_chars: int = 3000,
+    preserve_paragraphs: bool = True,
+    split_pattern: Optional[str] = None,
+    sentence_pattern: Optional[str] = None,
+    preset: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Выдаёт чанки текста по одному, с сохранением семантических границ.
+
+    Абзацы выделяются лениво, поэтому для первых чанков (например, образца
+    для определения темы) не нужно разбирать весь текст.
+    Параметры и результат совпадают с split_text_into_chunks.
+
+    Args:
+        text: Исходный текст для разбиения
+        max_chars: Максимальное количество символов в чанке
+        preserve_paragraphs: Сохранять ли границы абзацев
+        split_pattern: Кастомный паттерн для разделения (по умолчанию абзацы)
+        sentence_pattern: Кастомный паттерн для разделения предложений
+        preset: Имя предустановки ('tts_alibaba', 'tts_sber', 'llm_processing', etc.)
+                Если указано, остальные параметры игнорируются
+
+    Yields:
+        Чанки текста в исходном порядке
+
+    Examples:
+        first = next(iter_text_chunks(text, max_chars=2000), None)
+    """
     # Применяем пресет если указан
     if preset and preset in PRESETS:
         config = PRESETS[preset]
@@ -86,22 +140,22 @@ def split_text_into_chunks(
     text = text.strip()
 
     if not text:
-        return []
+        return
 
     # Если текст меньше лимита - возвращаем как есть
     if len(text) <= max_chars:
-        return [text]
+        yield text
+        return
 
     # Определяем паттерны
     para_pattern = split_pattern or r'\n\s*\n'
     sent_pattern = sentence_pattern or r'(?<=[.!?])\s+'
 
-    chunks = []
     current_chunk = ""
 
     if preserve_paragraphs:
         # Разбиваем на абзацы
-        paragraphs = re.split(para_pattern, text)
+        paragraphs = _iter_split(para_pattern, text)
 
         for paragraph in paragraphs:
             paragraph = paragraph.strip()
@@ -129,7 +183,7 @@ def split_text_into_chunks(
                                 temp_chunk = f"{temp_chunk} {word}".strip()
                             else:
                                 if temp_chunk:
-                                    chunks.append(temp_chunk)
+                                    yield temp_chunk
                                 temp_chunk = word
 
                         if temp_chunk:
@@ -137,7 +191,7 @@ def split_text_into_chunks(
                                 current_chunk = f"{current_chunk} {temp_chunk}".strip()
                             else:
                                 if current_chunk:
-                                    chunks.append(current_chunk)
+                                    yield current_chunk
                                 current_chunk = temp_chunk
                     else:
                         # Предательство нормальной длины
@@ -148,7 +202,7 @@ def split_text_into_chunks(
                                 current_chunk = sentence
                         else:
                             if current_chunk:
-                                chunks.append(current_chunk)
+                                yield current_chunk
                             current_chunk = sentence
             else:
                 # Абзац нормальной длины
@@ -159,7 +213,7 @@ def split_text_into_chunks(
                         current_chunk = paragraph
                 else:
                     if current_chunk:
-                        chunks.append(current_chunk)
+                        yield current_chunk
                     current_chunk = paragraph
     else:
         # Простое разбиение без сохранения абзацев
@@ -172,14 +226,12 @@ def split_text_into_chunks(
                     current_chunk = word
             else:
                 if current_chunk:
-                    chunks.append(current_chunk)
+                    yield current_chunk
                 current_chunk = word
 
     # Добавляем последний чанк
     if current_chunk:
-        chunks.append(current_chunk)
-
-    return chunks
+        yield current_chunk
 
 
 def split_by_sentences(